@@ -12,13 +12,10 @@ from colour import Color
 from PyQt5 import QtCore, QtGui
 from PyQt5.QtCore import (
     QMutex,
-    QProcess,
     QSettings,
-    Qt,
     QTimer,
     pyqtSignal,
     pyqtSlot,
-    qInfo,
 )
 from PyQt5.QtWidgets import (
     QApplication,
@@ -41,7 +38,7 @@ from PyQt5.QtWidgets import (
 from PyQt5.uic import loadUiType
 
 from bitcointx.wallet import CCoinExtKey
-from bitcointx.core import CTransaction, b2lx, x, lx
+from bitcointx.core import CTransaction, b2lx, b2x, x, lx
 from bitcointx.rpc import JSONRPCError
 from bitcointx import ChainParams
 from cli.lib.constants import (
@@ -49,8 +46,7 @@ from cli.lib.constants import (
     CONTRACT_COLLATERAL_INP_INDEX, CONTRACT_PRINCIPAL_INP_INDEX,
     CONTRACT_COLLATERAL_OUT_INDEX,
 )
-from cli.lib.types import Amount, PlanData, ElementsRPCCaller, DataLookupError
-from cli.cli_common import load_data_with_checking_hash
+from cli.lib.types import Amount, ElementsRPCCaller, DataLookupError
 from elementstx.core import (
     Uint256, calculate_asset, generate_asset_entropy, CAsset
 )
@@ -60,7 +56,34 @@ from cli.lib.rpc_utils import (
 from cli.lib.generator import generate_abl_contract_for_lateral_stage
 from cli.lib.utils import SafeDerivation
 
+from .block_prefetch import IndexCatchup
+from .chain_backend import ChainBackendError, make_chain_backend  # noqa
+from .cli_pool import CLIProcessPool  # noqa
+from .contract_store import (  # noqa
+    ContractStep,
+    ContractStore,
+    ContractTxCache,
+    TrackedStep,
+    get_contract_id,
+    iter_vstages,
+)
 from .demo_config import link_to_esplora
+from .file_cache import (  # noqa
+    contract_data_cache,
+    contract_tx_cache,
+    plan_cache,
+)
+from .jobs import FAILED, add_jobs_panel  # noqa
+from .mempool import MempoolMonitor  # noqa
+from .roles import get_app  # noqa
+from .stats import add_stats_panel, call_stats, cli_command_name  # noqa
+from .watch_folder import (  # noqa
+    PipelineStep,
+    PlansPipelineMixin,
+    write_setup_metrics,
+)
+from .wallet_sync import WalletSync  # noqa
+from .watchdog import StallWatchdog  # noqa
 
 RED_STYLE_PROGRESS_BAR = """
 QProgressBar{
@@ -103,13 +126,17 @@ class PlanMonitor(QTimer):
     block_high_updated = pyqtSignal(int)
     contract_tx_changed = pyqtSignal()
 
-    def __init__(self, rpc):
-        super(PlanMonitor, self).__init__()
+    def __init__(self, rpc, interval=2000, parent=None):
+        super(PlanMonitor, self).__init__(parent)
         self._rpc = rpc
         self._current_block = None
-        self.setInterval(2000)
+        self.setInterval(interval)
         self.start()
 
+    @property
+    def current_block(self):
+        return self._current_block
+
     def timerEvent(self, event):
         try:
             block_high = self._rpc.getblockcount()
@@ -129,10 +156,16 @@ class GuiRPCCaller:
     def __getattr__(self, name):
         self.mutex.lock()
         try:
-            return self._coin_api.__getattr__(name)
+            method = self._coin_api.__getattr__(name)
         finally:
             self.mutex.unlock()
 
+        def timed_call(*args, **kwargs):
+            with call_stats.timed("rpc", name):
+                return method(*args, **kwargs)
+
+        return timed_call
+
 
 def get_dict_from_settings(settings, group_key, default):
     if group_key in settings.childGroups():
@@ -150,22 +183,148 @@ def get_dict_from_settings(settings, group_key, default):
     return param
 
 
-class LoanApp(QApplication):
+def get_application_path():
+    if getattr(sys, "frozen", False):
+        return pathlib.Path(sys.executable).parent.absolute()
+    return pathlib.Path(__file__).parent.parent.absolute()
+
+
+def start_watchdog(app, name):
+    # stalls of the GUI thread longer than this are reported, 0 disables
+    stall_threshold = int(
+        app.common_settings.value("watchdog/threshold_ms", 500)
+    )
+    if stall_threshold <= 0:
+        return None
+    watchdog = StallWatchdog(
+        app.path / "stalls",
+        name,
+        threshold=stall_threshold / 1000,
+        parent=app,
+    )
+    app.aboutToQuit.connect(watchdog.stop)
+    watchdog.start()
+    return watchdog
+
+
+class NodeConnection:
+    """
+    The RPC connection to a node and what is polled from it, shared by the
+    roles of the process that use the same node
+    """
+
+    _nodes = {}
+
+    @classmethod
+    def get(cls, role, rpc_kwargs):
+        key = tuple(sorted(rpc_kwargs.items()))
+        node = cls._nodes.get(key)
+        if node is None:
+            node = cls._nodes[key] = cls(role, rpc_kwargs)
+        return node
+
+    def __init__(self, role, rpc_kwargs):
+        # the chain backend is set up with the settings of the first role
+        self._role = role
+        self.rpc = GuiRPCCaller(**rpc_kwargs)
+        self.assetlabels = self.rpc.dumpassetlabels()
+        self._block_monitor = None
+        self._wallet_sync = None
+        self._mempool_monitor = None
+        self._chain_backend = None
+        self._index_catchup = None
+
+    @property
+    def block_monitor(self):
+        if self._block_monitor is None:
+            self._block_monitor = PlanMonitor(
+                self.rpc,
+                int(self._role.common_settings.value(
+                    "block_monitor/interval_ms", 1000)),
+                parent=QApplication.instance(),
+            )
+        return self._block_monitor
+
+    @property
+    def wallet_sync(self):
+        if self._wallet_sync is None:
+            self._wallet_sync = WalletSync(
+                self.rpc,
+                self._role.common_settings.value(
+                    "blockchain_network", "elements"
+                ),
+                int(self._role.common_settings.value(
+                    "wallet_sync/interval_ms", 2000)),
+                parent=QApplication.instance(),
+            )
+        return self._wallet_sync
+
+    @property
+    def mempool_monitor(self):
+        if self._mempool_monitor is None:
+            self._mempool_monitor = MempoolMonitor(
+                self.rpc,
+                int(self._role.common_settings.value(
+                    "mempool/interval_ms", 1000)),
+                parent=QApplication.instance(),
+            )
+        return self._mempool_monitor
+
+    @property
+    def chain_backend(self):
+        if self._chain_backend is None:
+            self._chain_backend = make_chain_backend(self._role)
+        return self._chain_backend
+
+    def start_index_catchup(self, tip_height):
+        """
+        The running catch-up of the chain backend with the tip, it is
+        started if the backend is too far behind. None if it is not needed
+        or was cancelled, the backend falls back to the RPC then.
+        """
+        catchup = self._index_catchup
+        if catchup is not None:
+            if catchup.isRunning():
+                return catchup
+            if catchup.is_cancelled():
+                return None
+        if not self.chain_backend.needs_catchup(tip_height):
+            return None
+        app = QApplication.instance()
+        catchup = IndexCatchup(
+            self.chain_backend,
+            tip_height,
+            int(self._role.common_settings.value(
+                "spend_index/prefetch_jobs", 4)),
+            parent=app,
+        )
+        if self._index_catchup is None:
+            app.aboutToQuit.connect(self.stop_index_catchup)
+        self._index_catchup = catchup
+        catchup.start()
+        return catchup
+
+    def stop_index_catchup(self):
+        if self._index_catchup is not None:
+            self._index_catchup.cancel()
+            self._index_catchup.wait()
+
+
+class LoanRoleMixin:
+    """
+    The settings of the role (creditor, debtor...) and the node it uses.
+    It is the LoanApp of the role, or one of the roles in the LoanHost.
+    """
+
     suffix = ""
     config_name = "Loan"
     grab_msg = ""
     revoke_msg = ""
 
-    def __init__(self, **kwargs):
-        super(LoanApp, self).__init__(sys.argv)
-        if getattr(sys, "frozen", False):
-            application_path = pathlib.Path(sys.executable).parent.absolute()
-        else:
-            application_path = pathlib.Path(__file__).parent.parent.absolute()
-        self.path = application_path
-        QSettings.setPath(
-            QSettings.IniFormat, QSettings.UserScope, str(self.path)
-        )
+    def init_role(self, path, **kwargs):
+        self.path = path
+        self._contract_store = None
+        self._contract_txs = None
         self.settings = QSettings(
             QSettings.IniFormat,
             QSettings.UserScope,
@@ -176,9 +335,49 @@ class LoanApp(QApplication):
             QSettings.IniFormat, QSettings.UserScope, "config", "common",
         )
         rpc_param = get_dict_from_settings(self.settings, "rpc", kwargs)
-        self.rpc = GuiRPCCaller(**rpc_param)
+        self.node = NodeConnection.get(self, rpc_param)
+        self.rpc = self.node.rpc
+        self.rpc_kwargs = rpc_param
         self.rpc_param = list(rpc_param.values()).pop()
-        self.assetlabels = self.rpc.dumpassetlabels()
+        self.assetlabels = self.node.assetlabels
+
+    @property
+    def contract_store(self):
+        if self._contract_store is None:
+            self._contract_store = ContractStore(
+                self.path / f"{self.config_name.lower()}_contracts.sqlite"
+            )
+        return self._contract_store
+
+    @property
+    def contract_txs(self):
+        if self._contract_txs is None:
+            self._contract_txs = ContractTxCache(
+                self.contract_store,
+                self.rpc,
+                int(self.common_settings.value(
+                    "contract_txs/cache_size", 64)),
+            )
+        return self._contract_txs
+
+    @property
+    def block_monitor(self):
+        return self.node.block_monitor
+
+    @property
+    def wallet_sync(self):
+        return self.node.wallet_sync
+
+    @property
+    def mempool_monitor(self):
+        return self.node.mempool_monitor
+
+    @property
+    def chain_backend(self):
+        return self.node.chain_backend
+
+    def start_index_catchup(self, tip_height):
+        return self.node.start_index_catchup(tip_height)
 
     def get_asset_name(self, asset_hex_in):
         for name, asset_hex in self.assetlabels.items():
@@ -190,6 +389,61 @@ class LoanApp(QApplication):
         return self.assetlabels.get(asset_name, asset_name)
 
 
+class LoanApp(QApplication, LoanRoleMixin):
+    def __init__(self, **kwargs):
+        super(LoanApp, self).__init__(sys.argv)
+        path = get_application_path()
+        QSettings.setPath(QSettings.IniFormat, QSettings.UserScope, str(path))
+        self.init_role(path, **kwargs)
+        self.watchdog = start_watchdog(self, self.config_name.lower())
+
+
+class HostedRole(LoanRoleMixin):
+    """A role in the LoanHost, named as its LoanApp class"""
+
+    def __init__(self, app_class, path, **kwargs):
+        self.suffix = app_class.suffix
+        self.config_name = app_class.config_name
+        self.grab_msg = app_class.grab_msg
+        self.revoke_msg = app_class.revoke_msg
+        self.main = None
+        self.init_role(path, **kwargs)
+
+
+class LoanHost(QApplication):
+    """
+    Runs the windows of several roles in one process. The roles that use
+    the same node share the RPC connection, the block monitor, the wallet
+    sync and the chain backend, the plan files are loaded once.
+    """
+
+    def __init__(self):
+        super(LoanHost, self).__init__(sys.argv)
+        self.path = get_application_path()
+        QSettings.setPath(
+            QSettings.IniFormat, QSettings.UserScope, str(self.path)
+        )
+        self.common_settings = QSettings(
+            QSettings.IniFormat, QSettings.UserScope, "config", "common",
+        )
+        self.roles = []
+        # the role whose window is being created
+        self.current_role = None
+        self.watchdog = start_watchdog(self, "host")
+
+    def add_role(self, app_class, window_class, **kwargs):
+        role = HostedRole(app_class, self.path, **kwargs)
+        self.roles.append(role)
+        self.current_role = role
+        try:
+            role.main = window_class()
+        finally:
+            self.current_role = None
+        role.main.loan_role = role
+        role.main.show()
+        return role
+
+
 class StageLayout(QWidget):
     def __init__(self, *arg):
         super(StageLayout, self).__init__(*arg)
@@ -206,9 +460,9 @@ class StageLayout(QWidget):
         for idx in range(self.gbox.rowCount()):
             new_color = next(row_colors)
             color = QtGui.QColor.fromRgb(
-                new_color.red * 255,
-                new_color.green * 255,
-                new_color.blue * 255,
+                round(new_color.red * 255),
+                round(new_color.green * 255),
+                round(new_color.blue * 255),
             )
             painter.setPen(color)
             painter.setBrush(color)
@@ -277,7 +531,7 @@ class EarlyButton(QPushButton):
         size = self.height() * 5 // 7
         painter.drawPixmap(
             QtCore.QRect(
-                self.width() - size, (self.height() - size) / 2, size, size
+                self.width() - size, (self.height() - size) // 2, size, size
             ),
             image,
         )
@@ -288,13 +542,15 @@ class GrabButton(QPushButton):
         super(GrabButton, self).paintEvent(event)
         painter = QtGui.QPainter(self)
         painter.setPen(QtGui.QPen(QtCore.Qt.black))
-        painter.drawLine(0, self.height() / 2, self.width(), self.height() / 2)
+        painter.drawLine(
+            0, self.height() // 2, self.width(), self.height() // 2
+        )
         image_path = pathlib.Path(__file__).parent.absolute() / "red.png"
         image = QtGui.QPixmap(f"{image_path}")
         size = self.height() * 6 // 14
         painter.drawPixmap(
             QtCore.QRect(
-                self.width() - size, (self.height() - size) / 2, size, size
+                self.width() - size, (self.height() - size) // 2, size, size
             ),
             image,
         )
@@ -370,8 +626,73 @@ class GrabWidget(QWidget):
         QMessageBox.information(self, "Plan", info)
 
 
-def get_short_name(name):
-    app = QApplication.instance()
+def make_stage_layout(repayment_plan, current_vstage=None):
+    """The diagram of the stages of the plan, `current_vstage` highlighted"""
+    mywidget = StageLayout()
+    gbox = mywidget.gbox
+    gray = Color("#848484")
+    white = Color("#FAFAFA")
+    first_lstage = repayment_plan.first_lateral_stage
+    num_vstages = sum(vs.num_vstages_recursive(only_branched=False)
+                      for vs in first_lstage.vertical_stages)
+
+    colors = white.range_to(gray, num_vstages)
+
+    def show_stages(layout, lstage, plan_color,
+                    row=0, column=0, prev=None):
+        current_plan_colors = [
+            next(colors, "light gray") for _ in lstage.vertical_stages[1:]
+        ]
+        current_plan_colors.append(plan_color)
+        num_branched = 0
+        for vstage, color in zip(
+            reversed(lstage.vertical_stages), current_plan_colors
+        ):
+            stage_widget = StageWidget(
+                vstage,
+                prev if vstage.index_m == 0 else None,
+                current_vstage == vstage,
+                color,
+            )
+            gbox.addWidget(
+                stage_widget,
+                # row
+                vstage.index_m + row,
+                # column
+                column + vstage.parent_lateral_stage.level_n + 1,
+            )
+            if vstage.next_lateral_stage is not None:
+                show_stages(
+                    layout,
+                    vstage.next_lateral_stage,
+                    color,
+                    vstage.index_m + row + 1,
+                    column + num_branched,
+                    stage_widget,
+                )
+
+            num_branched += vstage.num_vstages_recursive(
+                only_branched=True)
+
+        grab_widget = GrabWidget(lstage.vertical_stages[-1], "red",)
+        gbox.addWidget(
+            grab_widget,
+            # row
+            lstage.vertical_stages[-1].index_m + row + 1,
+            # column
+            column + lstage.level_n + 1,
+        )
+
+    show_stages(gbox, repayment_plan.first_lateral_stage,
+                next(colors, "light gray"))
+    for idx in range(gbox.rowCount()):
+        label = QLabel()
+        label.setText(f"period {idx +1}")
+        gbox.addWidget(label, idx, 0)
+    return mywidget
+
+
+def get_short_name(app, name):
     alias_name = app.get_asset_name(name)
     if len(alias_name) > 32:
         alias_name = f"{alias_name[:7]}...{alias_name[-7:]}"
@@ -382,15 +703,12 @@ class BalanceWidget(QWidget, LoaderUI):
     def __init__(self, *arg):
         super(BalanceWidget, self).__init__(*arg)
         self.setupUi(__file__)
-        app = QApplication.instance()
-        self._rpc = app.rpc
+        app = get_app(self)
+        self._wallet = app.wallet_sync
         self.list_asset = list(app.assetlabels.keys())
         app.main.add_asset.connect(self.add_asset)
-        self._timer = QTimer(self)
-        self._timer.setInterval(1000)
-        self._timer.start()
-        self._timer.timeout.connect(self.update_balance)
-        self._timer.timeout.emit()
+        self._wallet.changed.connect(self.update_balance)
+        self.update_balance()
 
     def add_asset(self, asset_hex):
         if not asset_hex:
@@ -400,17 +718,15 @@ class BalanceWidget(QWidget, LoaderUI):
         self.update_balance()
 
     def add_assets(self):
+        app = get_app(self)
         for asset_hex in self.list_asset:
             idx = self.balance_list.count()
-            asset_label = QLabel(f"{get_short_name(asset_hex)}: ")
+            asset_label = QLabel(f"{get_short_name(app, asset_hex)}: ")
             asset_label.setToolTip(asset_hex)
             self.balance_list.setWidget(
                 idx, QFormLayout.LabelRole, asset_label
             )
-            try:
-                balance = self._rpc.getbalance("*", 0, False, asset_hex,)
-            except JSONRPCError:
-                return
+            balance = self._wallet.balance(app.get_asset_by_name(asset_hex))
             self.balance_list.setWidget(
                 idx, QFormLayout.FieldRole, QLabel(f"{Amount(balance)}")
             )
@@ -431,8 +747,8 @@ class PlanSummary(QWidget, LoaderUI):
         super(PlanSummary, self).__init__(*arg)
         self.setupUi(__file__)
         _translate = QtCore.QCoreApplication.translate
-        with open(plan_path) as f:
-            plandata = PlanData(**json.loads(f.read()))
+        app = get_app(self)
+        plandata = plan_cache.get(plan_path)
 
         self._plan_name = pathlib.Path(plan_path).stem
 
@@ -450,10 +766,10 @@ class PlanSummary(QWidget, LoaderUI):
         self.periods.setText(f"{plandata.N}")
         principal_asset = plandata.principal_asset.to_hex()
         collateral_asset = plandata.collateral_asset.to_hex()
-        self.collateral_asset.setText(get_short_name(collateral_asset))
+        self.collateral_asset.setText(get_short_name(app, collateral_asset))
         self.collateral_asset.setToolTip(collateral_asset)
         self.collateral_amount.setText(f"{plandata.collateral_amount} sat")
-        self.principal_asset.setText(get_short_name(principal_asset))
+        self.principal_asset.setText(get_short_name(app, principal_asset))
         self.principal_asset.setToolTip(principal_asset)
         self.principal_amount.setText(f"{plandata.principal_amount} sat")
 
@@ -461,13 +777,12 @@ class PlanSummary(QWidget, LoaderUI):
         self.contractButton.clicked.connect(self.add_contract_data)
         self.contract_data = None
         self.signButton.clicked.connect(lambda: self.create_sign.emit())
-        app = QApplication.instance()
         app.main.add_asset.emit("")
         app.main.add_asset.emit(principal_asset)
         app.main.add_asset.emit(collateral_asset)
 
     def add_contract_data(self):
-        app = QApplication.instance()
+        app = get_app(self)
         fileName, _ = QFileDialog.getOpenFileName(
             self,
             "Open Contract Data",
@@ -502,12 +817,19 @@ class PlanStatus(QWidget):
 
     def __init__(self, plan_widget, *arg):
         super(PlanStatus, self).__init__(*arg)
-        app = QApplication.instance()
+        app = get_app(self)
         self._rpc = app.rpc
+        self._backend = app.chain_backend
+        # outputs whose spends were looked for in the blocks, and the block
+        # heights when the spends were first seen
+        self._checked_spends = set()
+        self._spends_seen = {}
         self._bitcoin_asset = CAsset(lx(app.assetlabels["bitcoin"]))
         self._plan_widget = plan_widget
         self._repayment_plan = plan_widget.repayment_plan
         self._current_block_label = None
+        self._not_found_label = None
+        self._pending_txid = None
 
         self.link_to_esplora = app.common_settings.value("link")
 
@@ -524,7 +846,15 @@ class PlanStatus(QWidget):
                                          self.blockchain_network)
 
         self._current_block = None
-        self.horizontalLayout = QVBoxLayout(self)
+        # the payments can appear with the new contract steps, and can be
+        # spent from the wallet
+        self._payments_changed = True
+        app.wallet_sync.changed.connect(self.wallet_changed)
+        layout = QVBoxLayout(self)
+        self.add_catchup_info(layout)
+        # `clear()` empties this layout, the catch-up progress stays
+        self.horizontalLayout = QVBoxLayout()
+        layout.addLayout(self.horizontalLayout)
 
         if self._plan_widget.contract_data is None:
             self.add_stage_info(None)
@@ -532,6 +862,7 @@ class PlanStatus(QWidget):
 
         with ChainParams(self.blockchain_network):
             self.read_contract_data()
+            self.restore_contract()
             self.track_contract(None)
             self.check_contract_finished()
 
@@ -540,12 +871,170 @@ class PlanStatus(QWidget):
         self.add_current_block_info()
         self.add_stage_info(None)
         self.last_stage = False
+        app.mempool_monitor.changed.connect(self.mempool_changed)
+        self.mempool_changed()
+
+    def add_catchup_info(self, layout):
+        self._catchup = None
+        self._catchup_widget = QWidget(self)
+        hbox = QHBoxLayout(self._catchup_widget)
+        hbox.setContentsMargins(0, 0, 0, 0)
+        hbox.addWidget(QLabel("Catching up with the chain:"))
+        self._catchup_bar = QProgressBar()
+        self._catchup_bar.setFormat("%v of %m blocks")
+        hbox.addWidget(self._catchup_bar)
+        cancel_button = QPushButton("Cancel")
+        cancel_button.clicked.connect(self.cancel_catchup)
+        hbox.addWidget(cancel_button)
+        self._catchup_widget.hide()
+        layout.addWidget(self._catchup_widget)
+
+    def wait_for_catchup(self, current_block):
+        """
+        True if the chain backend is catching up with the tip, the
+        contract is tracked when it is done
+        """
+        catchup = get_app(self).start_index_catchup(current_block)
+        if catchup is None:
+            return False
+        if catchup is not self._catchup:
+            self._catchup = catchup
+            catchup.progress.connect(self.catchup_progress)
+            catchup.finished.connect(self.catchup_finished)
+            self._catchup_bar.setRange(0, 0)
+            self._catchup_widget.show()
+        return True
+
+    @pyqtSlot(int, int)
+    def catchup_progress(self, num, total):
+        self._catchup_bar.setRange(0, total)
+        self._catchup_bar.setValue(num)
+
+    @pyqtSlot()
+    def cancel_catchup(self):
+        if self._catchup is not None:
+            self._catchup.cancel()
+
+    @pyqtSlot()
+    def catchup_finished(self):
+        self._catchup_widget.hide()
+        with ChainParams(self.blockchain_network):
+            self.track_contract(self._current_block)
+            self.check_contract_finished()
+            if self._payments_changed:
+                self.check_payment_exists()
 
     def read_contract_data(self):
-        data = load_data_with_checking_hash(self._plan_widget.contract_data)
+        data = contract_data_cache.get(self._plan_widget.contract_data)
         self._start_block = data["start-block-num"]
         self._shared_blinding_xkey = CCoinExtKey(data["shared-blinding-xkey"])
         self._tx = data["tx"]
+        self._incomplete_tx = contract_tx_cache.get(
+            self._plan_widget.contract_data, self.blockchain_network
+        )
+
+    def restore_contract(self):
+        """Restore the contract steps that were already found"""
+        app = get_app(self)
+        self._store = app.contract_store
+        self._contract_txs = app.contract_txs
+        self._contract_id = get_contract_id(self._tx, self._start_block)
+        self._vstages = list(
+            iter_vstages(self._repayment_plan.first_lateral_stage)
+        )
+        stored = self._store.load(self._contract_id)
+        if stored is None or not stored.steps:
+            return
+
+        # the steps are valid if none of their blocks was reorged
+        block_hashes = {
+            step.block_num: step.block_hash for step in stored.steps
+        }
+        for block_num, stored_hash in block_hashes.items():
+            try:
+                block_hash = self._rpc.getblockhash(block_num)
+            except JSONRPCError:
+                block_hash = None
+            if block_hash != stored_hash:
+                self._store.forget(self._contract_id)
+                return
+
+        contract_steps = []
+        for step in stored.steps:
+            tx = CTransaction.deserialize(x(step.tx))
+            if not contract_steps:
+                contract_tx = tx
+            contract_steps.append(TrackedStep.from_tx(tx, step.block_num))
+
+        self.init_contract_plan(
+            contract_tx,
+            CAsset(lx(stored.creditor_control_asset)),
+            CAsset(lx(stored.debtor_control_asset)),
+        )
+        self._contract_steps = contract_steps
+        self._vstage_list = [
+            self._vstages[step.vstage]
+            for step in stored.steps
+            if step.vstage is not None
+        ]
+        self._has_payment = stored.has_payment
+
+    def init_contract_plan(self, contract_tx, creditor_control_asset,
+                           debtor_control_asset):
+        self._creditor_control_asset = creditor_control_asset
+        self._debtor_control_asset = debtor_control_asset
+
+        unblind_result = contract_tx.vout[
+            CONTRACT_COLLATERAL_OUT_INDEX
+        ].unblind_confidential_pair(
+            self._shared_blinding_xkey.derive_path(
+                LOCKED_COLLATERAL_PATH
+            ).priv,
+            contract_tx.wit.vtxoutwit[
+                CONTRACT_COLLATERAL_OUT_INDEX
+            ].rangeproof,
+        )
+        if unblind_result.error:
+            raise RuntimeError(
+                f"Unblindable contract tx data: {unblind_result.error}")
+
+        with SafeDerivation():
+            generate_abl_contract_for_lateral_stage(
+                self._repayment_plan.first_lateral_stage,
+                self._shared_blinding_xkey,
+                self._start_block,
+                creditor_control_asset,
+                debtor_control_asset,
+                self._bitcoin_asset,
+                unblind_result.get_descriptor()
+            )
+
+    def store_steps(self, first_step, txs):
+        """Store the steps from `first_step`, `txs` are their transactions"""
+        steps = []
+        for step, tx in enumerate(txs, first_step):
+            vstage = None
+            if step < len(self._vstage_list):
+                vstage = next(
+                    num for num, vs in enumerate(self._vstages)
+                    if vs is self._vstage_list[step]
+                )
+            try:
+                block_hash = self._rpc.getblockhash(tx.block_num)
+            except JSONRPCError:
+                # will be tracked again from the start block next time
+                self._store.forget(self._contract_id)
+                return
+            steps.append(
+                ContractStep(
+                    b2lx(tx.GetTxid()),
+                    b2x(tx.serialize()),
+                    tx.block_num,
+                    block_hash,
+                    vstage,
+                )
+            )
+        self._store.add_steps(self._contract_id, first_step, steps)
 
     def add_timeout_info(self, vstage):
         if self._current_block is None:
@@ -570,16 +1059,10 @@ class PlanStatus(QWidget):
             bar.setFormat(f"current block: {self._current_block}" f"{msg}")
             bar.setValue(bar.maximum())
             bar.setStyleSheet(RED_STYLE_PROGRESS_BAR)
-            if self.last_stage:
-                self.can_grab.emit(True)
-                self.can_revoke.emit(False)
-            else:
-                self.can_grab.emit(False)
-                self.can_revoke.emit(True)
+            self.set_actions(self.last_stage, not self.last_stage)
         else:
             bar.setFormat(f"current block: %v")
-            self.can_grab.emit(False)
-            self.can_revoke.emit(False)
+            self.set_actions(False, False)
 
         bar.setValue(int(self._current_block))
         self._bar = bar
@@ -590,6 +1073,66 @@ class PlanStatus(QWidget):
     def add_not_found(self):
         label = QLabel()
         label.setText(f"Contract TX not found in blockchain")
+        label.setOpenExternalLinks(True)
+        self._not_found_label = label
+        self.horizontalLayout.addWidget(label)
+
+    def set_actions(self, can_grab, can_revoke):
+        # the last step is already spent by a transaction in the mempool
+        pending = self.find_pending_spend() is not None
+        self.can_grab.emit(can_grab and not pending)
+        self.can_revoke.emit(can_revoke and not pending)
+
+    def find_pending_spend(self):
+        """
+        The txid of the transaction in the mempool that spends the last
+        contract step, or the contract input before the contract tx is
+        found: the next stage that is not confirmed yet
+        """
+        if not hasattr(self, "_incomplete_tx"):
+            return None
+        mempool = get_app(self).mempool_monitor
+        if not hasattr(self, "_contract_steps"):
+            prevout = self._incomplete_tx.vin[self.tracked_input()].prevout
+            return mempool.spend_of(b2lx(prevout.hash), prevout.n)
+        if hasattr(self, "_finished_txid"):
+            return None
+        step = self._contract_steps[-1]
+        for n in step.spendable_outs:
+            txid = mempool.spend_of(step.txid, n)
+            if txid is not None:
+                return txid
+        return None
+
+    @pyqtSlot()
+    def mempool_changed(self):
+        pending_txid = self.find_pending_spend()
+        if pending_txid == self._pending_txid:
+            return
+        self._pending_txid = pending_txid
+        if hasattr(self, "_contract_steps"):
+            self._change_status()
+        elif self._not_found_label is not None:
+            if pending_txid is None:
+                self._not_found_label.setText(
+                    "Contract TX not found in blockchain"
+                )
+            else:
+                self._not_found_label.setText(
+                    f"Contract TX is in the mempool, not confirmed yet: "
+                    f"{self.linked_txid(pending_txid)}"
+                )
+
+    def linked_txid(self, txid):
+        return f'<a href="{self.link_to_esplora}/tx/{txid}">{txid}</a>'
+
+    def add_pending_info(self, txid):
+        label = QLabel()
+        label.setText(
+            f"Pending contract Txid (not confirmed yet): "
+            f"{self.linked_txid(txid)}"
+        )
+        label.setOpenExternalLinks(True)
         self.horizontalLayout.addWidget(label)
 
     @pyqtSlot()
@@ -601,7 +1144,7 @@ class PlanStatus(QWidget):
             self.add_stage_info(None)
             return
 
-        if not hasattr(self, "_contract_tx_list"):
+        if not hasattr(self, "_contract_steps"):
             return
 
         self.clear()
@@ -616,16 +1159,16 @@ class PlanStatus(QWidget):
             self.can_revoke.emit(False)
             return
 
-        last_contract_txid = b2lx(self._contract_tx_list[-1].GetTxid())
-        self.add_last_contract_tx_info(last_contract_txid)
-
-        contract_txid = b2lx(self._contract_tx_list[0].GetTxid())
-        self.add_contract_tx_info(contract_txid)
+        self.add_last_contract_tx_info(self._contract_steps[-1].txid)
+        self.add_contract_tx_info(self._contract_steps[0].txid)
+        pending_txid = self.find_pending_spend()
+        if pending_txid is not None:
+            self.add_pending_info(pending_txid)
 
         vstage = self._vstage_list[-1]
         lstage = vstage.parent_lateral_stage
 
-        app = QApplication.instance()
+        app = get_app(self)
 
         if vstage.index_m == len(lstage.vertical_stages) - 1:
             self._msg = app.grab_msg
@@ -636,73 +1179,15 @@ class PlanStatus(QWidget):
 
         self.add_stage_info(vstage)
         self.add_timeout_info(vstage)
-        app.main.stage_found.emit()
+        if pending_txid is None:
+            app.main.stage_found.emit()
 
     def add_stage_info(self, current_vstage):
-        mywidget = StageLayout()
-        gbox = mywidget.gbox
-        gray = Color("#848484")
-        white = Color("#FAFAFA")
-        first_lstage = self._repayment_plan.first_lateral_stage
-        num_vstages = sum(vs.num_vstages_recursive(only_branched=False)
-                          for vs in first_lstage.vertical_stages)
-
-        colors = white.range_to(gray, num_vstages)
-
-        def show_stages(layout, lstage, plan_color,
-                        row=0, column=0, prev=None):
-            current_plan_colors = [
-                next(colors, "light gray") for _ in lstage.vertical_stages[1:]
-            ]
-            current_plan_colors.append(plan_color)
-            num_branched = 0
-            for vstage, color in zip(
-                reversed(lstage.vertical_stages), current_plan_colors
-            ):
-                stage_widget = StageWidget(
-                    vstage,
-                    prev if vstage.index_m == 0 else None,
-                    current_vstage == vstage,
-                    color,
-                )
-                gbox.addWidget(
-                    stage_widget,
-                    # row
-                    vstage.index_m + row,
-                    # column
-                    column + vstage.parent_lateral_stage.level_n + 1,
-                )
-                if vstage.next_lateral_stage is not None:
-                    show_stages(
-                        layout,
-                        vstage.next_lateral_stage,
-                        color,
-                        vstage.index_m + row + 1,
-                        column + num_branched,
-                        stage_widget,
-                    )
-
-                num_branched += vstage.num_vstages_recursive(
-                    only_branched=True)
-
-            grab_widget = GrabWidget(lstage.vertical_stages[-1], "red",)
-            gbox.addWidget(
-                grab_widget,
-                # row
-                lstage.vertical_stages[-1].index_m + row + 1,
-                # column
-                column + lstage.level_n + 1,
-            )
-
-        show_stages(gbox, self._repayment_plan.first_lateral_stage,
-                    next(colors, "light gray"))
-        for idx in range(gbox.rowCount()):
-            label = QLabel()
-            label.setText(f"period {idx +1}")
-            gbox.addWidget(label, idx, 0)
         scroll = QScrollArea()
         # scroll.setFixedHeight(250)
-        scroll.setWidget(mywidget)
+        scroll.setWidget(
+            make_stage_layout(self._repayment_plan, current_vstage)
+        )
         self.horizontalLayout.addWidget(scroll)
 
     def add_finish_info(self):
@@ -774,7 +1259,8 @@ class PlanStatus(QWidget):
         with ChainParams("elements"):
             self.track_contract(block)
             self.check_contract_finished()
-            self.check_payment_exists()
+            if self._payments_changed:
+                self.check_payment_exists()
 
         if hasattr(self, "_bar"):
             self._bar.setValue(int(block))
@@ -785,20 +1271,17 @@ class PlanStatus(QWidget):
                 )
                 self._bar.setValue(self._bar.maximum())
                 self._bar.setStyleSheet(RED_STYLE_PROGRESS_BAR)
-                if self.last_stage:
-                    self.can_grab.emit(True)
-                    self.can_revoke.emit(False)
-                else:
-                    self.can_grab.emit(False)
-                    self.can_revoke.emit(True)
+                self.set_actions(self.last_stage, not self.last_stage)
 
     def check_contract_finished(self):
-        if hasattr(self, "_contract_tx_list"):
-            if len(self._contract_tx_list) > len(self._vstage_list):
+        if hasattr(self, "_contract_steps"):
+            if len(self._contract_steps) > len(self._vstage_list):
                 assert (
-                    len(self._contract_tx_list) == len(self._vstage_list) + 1
+                    len(self._contract_steps) == len(self._vstage_list) + 1
                 )
-                finished_txid = b2lx(self._contract_tx_list[-1].GetTxid())
+                finished_txid = self._contract_steps[-1].txid
+                if not hasattr(self, "_finished_txid"):
+                    self._store.set_finished(self._contract_id, finished_txid)
                 self._finished_txid = finished_txid
                 self._change_status()
                 parent = self.parent()
@@ -818,31 +1301,33 @@ class PlanStatus(QWidget):
         if current_block <= self._start_block:
             return
 
-        if not hasattr(self, "_contract_tx_list"):
-            incomplete_contract_tx = CTransaction.deserialize(x(self._tx))
-            collateral_inp = incomplete_contract_tx.vin[
-                CONTRACT_COLLATERAL_INP_INDEX
-            ]
-            principal_inp = incomplete_contract_tx.vin[
-                CONTRACT_PRINCIPAL_INP_INDEX
-            ]
+        if self.wait_for_catchup(current_block):
+            return
 
-            # Facilitator blanks out the input of the other party,
-            # check that one of these inputs is blanked out,
-            # and use other input for finding the contract tx in blockchain
-            if collateral_inp.prevout.hash == b'\x00'*32:
-                idx = CONTRACT_PRINCIPAL_INP_INDEX
-            elif principal_inp.prevout.hash == b'\x00'*32:
-                idx = CONTRACT_COLLATERAL_INP_INDEX
-            else:
-                raise RuntimeError("Uknown contract tx data")
+        if not hasattr(self, "_contract_steps"):
+            incomplete_contract_tx = self._incomplete_tx
+            idx = self.tracked_input()
+            prevout = incomplete_contract_tx.vin[idx].prevout
+            from_block = self._start_block
+            try:
+                self._backend.track(b2lx(prevout.hash))
+                outspend = self._backend.get_outspend(
+                    b2lx(prevout.hash), prevout.n
+                )
+            except ChainBackendError:
+                outspend = None
+            if outspend is not None:
+                if not outspend.spent:
+                    return
+                if outspend.block_height is not None:
+                    from_block = max(from_block, outspend.block_height)
 
             try:
                 contract_tx = track_tx_by_prevouts(
-                    b2lx(incomplete_contract_tx.vin[idx].prevout.hash),
+                    b2lx(prevout.hash),
                     self._rpc,
-                    prev_txout_index=incomplete_contract_tx.vin[idx].prevout.n,
-                    from_block=self._start_block,
+                    prev_txout_index=prevout.n,
+                    from_block=from_block,
                     to_block=current_block
                 )
             except (JSONRPCError, DataLookupError):
@@ -863,93 +1348,207 @@ class PlanStatus(QWidget):
                     contract_hash
                 )
             )
-            self._creditor_control_asset = creditor_control_asset
-
             debtor_control_asset = calculate_asset(
                 generate_asset_entropy(
                     contract_tx.vin[CONTRACT_COLLATERAL_INP_INDEX].prevout,
                     contract_hash
                 )
             )
-            self._debtor_control_asset = debtor_control_asset
-
-            unblind_result = contract_tx.vout[
-                CONTRACT_COLLATERAL_OUT_INDEX
-            ].unblind_confidential_pair(
-                self._shared_blinding_xkey.derive_path(
-                    LOCKED_COLLATERAL_PATH
-                ).priv,
-                contract_tx.wit.vtxoutwit[
-                    CONTRACT_COLLATERAL_OUT_INDEX
-                ].rangeproof,
+            self.init_contract_plan(
+                contract_tx, creditor_control_asset, debtor_control_asset
             )
-            if unblind_result.error:
-                raise RuntimeError(
-                    f"Unblindable contract tx data: {unblind_result.error}")
-
-            with SafeDerivation():
-                generate_abl_contract_for_lateral_stage(
-                    self._repayment_plan.first_lateral_stage,
-                    self._shared_blinding_xkey,
-                    self._start_block,
-                    creditor_control_asset,
-                    debtor_control_asset,
-                    self._bitcoin_asset,
-                    unblind_result.get_descriptor()
-                )
 
             try:
                 contract_tx_list, vstage_list = track_contract_txs(
                     b2lx(contract_tx.vin[idx].prevout.hash),
                     self._rpc,
                     prev_txout_index=contract_tx.vin[idx].prevout.n,
-                    from_block=self._start_block,
+                    from_block=from_block,
                     to_block=current_block,
                     plan=self._repayment_plan
                 )
             except (JSONRPCError, DataLookupError):
                 return
 
-            self._contract_tx_list = contract_tx_list
+            self._contract_steps = [
+                TrackedStep.from_tx(tx, tx.block_num)
+                for tx in contract_tx_list
+            ]
+            for tx in contract_tx_list:
+                self._contract_txs.put(tx)
             self._vstage_list = vstage_list
+            self._store.save_contract(
+                self._contract_id,
+                self._start_block,
+                b2lx(creditor_control_asset.data),
+                b2lx(debtor_control_asset.data),
+            )
+            self.store_steps(0, contract_tx_list)
+            self._payments_changed = True
             self._change_status()
         else:
-            contract_tx = self._contract_tx_list[-1]
-            idx = CONTRACT_COLLATERAL_INP_INDEX
+            # every step found by its spender is followed at once
+            while self.follow_contract(current_block):
+                pass
+
+    def follow_contract(self, current_block):
+        """
+        Look for the steps after the last one, returns True if any were
+        found by the spender the backend told, so there can be more
+        """
+        last_step = self._contract_steps[-1]
+        new_spends = self.find_new_spends(last_step, current_block)
+        if not new_spends:
+            return False
+
+        try:
+            found = self.steps_of_spenders(last_step, new_spends)
+        except (JSONRPCError, DataLookupError):
+            return False
+        if found is not None:
+            contract_tx_list, vstage_list = found
+            # the blocks of the spenders were looked at
+            self._checked_spends.update(new_spends)
+        else:
+            prevout_txid, prevout_n = last_step.prevouts[
+                CONTRACT_COLLATERAL_INP_INDEX
+            ]
             try:
                 contract_tx_list, vstage_list = track_contract_txs(
-                    b2lx(contract_tx.vin[idx].prevout.hash),
+                    prevout_txid,
                     self._rpc,
-                    prev_txout_index=contract_tx.vin[idx].prevout.n,
-                    from_block=contract_tx.block_num,
+                    prev_txout_index=prevout_n,
+                    from_block=last_step.block_num,
                     to_block=current_block,
                     plan=self._repayment_plan
                 )
             except (JSONRPCError, DataLookupError):
-                return
-
-            assert (
-                self._contract_tx_list[-1].GetTxid() ==
-                contract_tx_list[0].GetTxid()
+                return False
+
+            assert last_step.txid == b2lx(contract_tx_list[0].GetTxid())
+            contract_tx_list = contract_tx_list[1:]
+            vstage_list = vstage_list[1:]
+
+            # the spend might be in the block after `current_block` if it
+            # was seen at that height, it is checked with the next block then
+            self._checked_spends.update(
+                outpoint for outpoint in new_spends
+                if self._spends_seen.get(outpoint, current_block) <
+                current_block
             )
-
-            self._contract_tx_list.extend(contract_tx_list[1:])
-            self._vstage_list.extend(vstage_list[1:])
-
-            if len(contract_tx_list) > 1:
-                self._change_status()
+        first_new_step = len(self._contract_steps)
+        for tx in contract_tx_list:
+            self._contract_steps.append(TrackedStep.from_tx(tx, tx.block_num))
+            self._contract_txs.put(tx)
+        self._vstage_list.extend(vstage_list)
+
+        if not contract_tx_list:
+            return False
+        self.store_steps(first_new_step, contract_tx_list)
+        self._payments_changed = True
+        self._change_status()
+        return found is not None
+
+    def steps_of_spenders(self, step, new_spends):
+        """
+        The steps after `step` and their vertical stages, looked for only in
+        the block of the transaction that spent the collateral output, or
+        None if the backend does not tell the spenders
+        """
+        if any(
+            outspend is None or outspend.block_height is None
+            for outspend in new_spends.values()
+        ):
+            return None
+        for (txid, n), outspend in new_spends.items():
+            # the next step spends the collateral with the same input
+            if outspend.vin != CONTRACT_COLLATERAL_INP_INDEX:
+                continue
+            contract_tx_list, vstage_list = track_contract_txs(
+                txid,
+                self._rpc,
+                prev_txout_index=n,
+                from_block=outspend.block_height,
+                to_block=outspend.block_height,
+                plan=self._repayment_plan
+            )
+            if contract_tx_list and \
+                    b2lx(contract_tx_list[0].GetTxid()) == outspend.txid:
+                return contract_tx_list, vstage_list
+        return [], []
+
+    def tracked_input(self):
+        incomplete_contract_tx = self._incomplete_tx
+        collateral_inp = incomplete_contract_tx.vin[
+            CONTRACT_COLLATERAL_INP_INDEX
+        ]
+        principal_inp = incomplete_contract_tx.vin[
+            CONTRACT_PRINCIPAL_INP_INDEX
+        ]
+
+        # Facilitator blanks out the input of the other party,
+        # check that one of these inputs is blanked out,
+        # and use other input for finding the contract tx in blockchain
+        if collateral_inp.prevout.hash == b'\x00'*32:
+            return CONTRACT_PRINCIPAL_INP_INDEX
+        if principal_inp.prevout.hash == b'\x00'*32:
+            return CONTRACT_COLLATERAL_INP_INDEX
+        raise RuntimeError("Uknown contract tx data")
+
+    def find_new_spends(self, step, current_block):
+        """
+        The outputs of the step transaction that were spent since the last
+        check, with their spenders if the backend tells them. The next
+        contract step spends one of them, so the blocks need to be looked
+        at only if there are any
+        """
+        txid = step.txid
+        self._backend.track(txid)
+        new_spends = {}
+        for n in step.spendable_outs:
+            if (txid, n) in self._checked_spends:
+                continue
+            try:
+                outspend = self._backend.get_outspend(txid, n)
+            except ChainBackendError:
+                # can not tell, scan the blocks
+                return {(txid, n): None}
+            if outspend.spent:
+                self._spends_seen.setdefault((txid, n), current_block)
+                new_spends[(txid, n)] = outspend
+        return new_spends
 
     def check_payment_exists(self):
-        if hasattr(self, "_contract_tx_list") and \
+        if hasattr(self, "_contract_steps") and \
                 hasattr(self, "_creditor_control_asset"):
+            try:
+                contract_tx_list = [
+                    self._contract_txs.get(self._contract_id, step)
+                    for step in self._contract_steps
+                ]
+            except JSONRPCError:
+                # checked again on the next change
+                return
             payments_list = find_all_payments(
-                self._contract_tx_list, self._creditor_control_asset,
-                self._rpc
+                contract_tx_list, self._creditor_control_asset, self._rpc
             )
         else:
             payments_list = []
 
-        self.have_payment.emit(bool(payments_list))
+        self._payments_changed = False
+        has_payment = bool(payments_list)
+        if hasattr(self, "_store") and \
+                has_payment != getattr(self, "_has_payment", False):
+            self._store.set_has_payment(self._contract_id, has_payment)
+        self._has_payment = has_payment
+        self.have_payment.emit(has_payment)
+
+    @pyqtSlot()
+    def wallet_changed(self):
+        if not hasattr(self, "_contract_steps"):
+            return
+        with ChainParams(self.blockchain_network):
+            self.check_payment_exists()
 
     def clear(self):
         if hasattr(self, "_bar"):
@@ -977,7 +1576,7 @@ class cached_property(object):
         return value
 
 
-class CommonMainWindow(QMainWindow):
+class CommonMainWindow(QMainWindow, PlansPipelineMixin):
     plan_changed = pyqtSignal(str)
     contract_data_changed = pyqtSignal(str)
     sign_save = pyqtSignal(str)
@@ -990,7 +1589,8 @@ class CommonMainWindow(QMainWindow):
         self._plan_path = None
         self._contract_data = None
         self._monitor = None
-        app = QApplication.instance()
+        self.init_pipeline()
+        app = get_app(self)
         self.rpc_param = app.rpc_param
 
         self.blockchain_network = app.common_settings.value(
@@ -1009,54 +1609,70 @@ class CommonMainWindow(QMainWindow):
         self.balance = BalanceWidget(self)
         self.balance_place.addWidget(self.balance)
 
-    def call(self, app, args, message, done_func=None, box_message=None):
+    def call(self, app, args, message, done_func=None, box_message=None,
+             key=None, notify=True):
+        """
+        Run the CLI tool in the jobs panel, `key` is the plan of the
+        contract the tool changes, the jobs of one contract run in turn.
+        `done_func` updates the window after the tool succeeded, it is not
+        called if another plan is shown meanwhile. The output or the errors
+        of the tool are shown in a message box unless `notify` is False.
+        """
         args.extend(["--network", self.blockchain_network])
 
-        process = QProcess(self)
-        QApplication.setOverrideCursor(Qt.WaitCursor)
-
-        def process_finished(status_int, status):
-            QApplication.restoreOverrideCursor()
-            if status_int:
-                result = process.readAllStandardError().data().decode("utf-8")
-                QMessageBox.critical(self, "Error", result)
-            else:
-                output = process.readAllStandardOutput().data().decode("utf-8")
-                self.statusbar.showMessage(f"{message}", 5000)
+        def job_finished(job):
+            if job.state == FAILED:
+                if notify:
+                    QMessageBox.critical(
+                        self, "Error", f"{job.description}:\n{job.stderr}"
+                    )
+                return
+            self.statusbar.showMessage(f"{message}", 5000)
+            if notify:
                 QMessageBox.information(
                     self,
                     "Info",
                     f"{box_message if box_message is not None else ''}\n"
-                    f"{output}\n",
+                    f"{job.stdout}\n",
                 )
-                if done_func is not None:
-                    done_func()
+            if done_func is not None and (
+                key is None or key == self._plan_path
+            ):
+                done_func()
 
-        args = [str(arg) for arg in args]
-        qInfo(f"CLI: {app} {' '.join(args)}\n")
-        process.finished.connect(process_finished)
-        process.start(app, args)
+        self.jobs_panel.submit(
+            app, args, cli_command_name(app, args), key, job_finished
+        )
 
     @pyqtSlot()
     def open_plan(self):
-        app = QApplication.instance()
+        app = get_app(self)
         fileName, _ = QFileDialog.getOpenFileName(
             self, "Open Plan", str(app.path), filter="*.plan"
         )
         if fileName:
             try:
-                with open(fileName) as f:
-                    PlanData(**json.loads(f.read()))
+                plan_cache.get(fileName)
             except (json.decoder.JSONDecodeError, TypeError):
                 QMessageBox.critical(self, "Error", "It is not Plan file")
             else:
                 self.update_plan_info(fileName)
 
+    def disconnect_monitor(self):
+        """Stop following the blocks with the current plan status"""
+        if self._monitor is None:
+            return
+        self._monitor.block_high_updated.disconnect(
+            self.plan_status.change_block
+        )
+        self._monitor.contract_tx_changed.disconnect(
+            self.plan_status.change_status
+        )
+        self._monitor = None
+
     def update_plan_info(self, plan_file):
         self._plan_path = plan_file
-        if self._monitor is not None:
-            self._monitor.stop()
-            self._monitor = None
+        self.disconnect_monitor()
         self.plan_changed.emit(plan_file)
         if not hasattr(self, "plan_place"):
             return
@@ -1079,11 +1695,9 @@ class CommonMainWindow(QMainWindow):
         self.plan_status_place.addWidget(self.plan_status)
 
     def contract_data_change(self, data_file):
-        app = QApplication.instance()
+        app = get_app(self)
         self._contract_data = data_file
-        if self._monitor is not None:
-            self._monitor.stop()
-        self._monitor = PlanMonitor(app.rpc)
+        self.disconnect_monitor()
         if not hasattr(self, "plan_status_place"):
             return
         for idx in range(self.plan_status_place.count()):
@@ -1093,15 +1707,20 @@ class CommonMainWindow(QMainWindow):
             self.plan_status_place.removeItem(item)
         self.plan_status = PlanStatus(self.plan, self)
         self.plan_status_place.addWidget(self.plan_status)
+        # the monitor is shared with the other windows of the node
+        self._monitor = app.block_monitor
         self._monitor.block_high_updated.connect(self.plan_status.change_block)
         self._monitor.contract_tx_changed.connect(
             self.plan_status.change_status
         )
         self.contract_data_changed.emit(data_file)
-        self._monitor.contract_tx_changed.emit()
+        self.plan_status.change_status()
+        if self._monitor.current_block is not None:
+            # the monitor reports only the changes of the block height
+            self.plan_status.change_block(self._monitor.current_block)
 
     def click_sign_button(self):
-        app = QApplication.instance()
+        app = get_app(self)
         fileName = self.get_filename(f"{app.suffix}signature")
         self._sign_path = fileName
         self.sign_save.emit(fileName)
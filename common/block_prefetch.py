@@ -0,0 +1,70 @@
+# Copyright (c) 2020-2021 Rugged Bytes IT-Services GmbH
+# Distributed under the MIT software license, see the accompanying
+# file COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from PyQt5.QtCore import QThread, pyqtSignal, qInfo
+
+from .chain_backend import ChainBackendError
+
+
+def prefetch_blocks(make_block_source, heights, max_workers=4):
+    """
+    Fetch the blocks at `heights` with `max_workers` threads, each with
+    its own block source, and yield them in order as they arrive
+    """
+    local = threading.local()
+
+    def fetch(height):
+        if not hasattr(local, "source"):
+            local.source = make_block_source()
+        return local.source.get_block(height)
+
+    heights = iter(heights)
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        try:
+            for height in islice(heights, max_workers * 2):
+                pending.append(executor.submit(fetch, height))
+            while pending:
+                block = pending.popleft().result()
+                for height in islice(heights, 1):
+                    pending.append(executor.submit(fetch, height))
+                yield block
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+class IndexCatchup(QThread):
+    """Ingests the blocks the spend index is behind the tip by"""
+
+    progress = pyqtSignal(int, int)
+
+    def __init__(self, backend, tip_height, max_workers=4, parent=None):
+        super(IndexCatchup, self).__init__(parent)
+        self._backend = backend
+        self._tip_height = tip_height
+        self._max_workers = max_workers
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def is_cancelled(self):
+        return self._cancelled.is_set()
+
+    def run(self):
+        try:
+            self._backend.catch_up(
+                self._tip_height,
+                self.progress.emit,
+                self._cancelled.is_set,
+                self._max_workers,
+            )
+        except ChainBackendError as e:
+            qInfo(f"Spend index catch-up failed: {e}\n")
@@ -0,0 +1,182 @@
+# Copyright (c) 2020-2021 Rugged Bytes IT-Services GmbH
+# Distributed under the MIT software license, see the accompanying
+# file COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+import http.client
+import json
+import queue
+from collections import namedtuple
+from urllib.parse import urlsplit
+
+from bitcointx.rpc import JSONRPCError
+
+from .demo_config import link_to_esplora
+
+# `spent` is True only if the spending transaction is in a block.
+# `txid` and `block_height` are None if the backend can not tell them.
+Outspend = namedtuple("Outspend", "spent txid vin block_height")
+
+UNSPENT = Outspend(False, None, None, None)
+
+
+class ChainBackendError(Exception):
+    pass
+
+
+class RPCBackend:
+    """
+    Uses the node RPC only, `gettxout` tells if the output is spent,
+    but not by which transaction
+    """
+
+    def __init__(self, rpc):
+        self._rpc = rpc
+
+    def track(self, txid):
+        pass
+
+    def needs_catchup(self, tip_height):
+        return False
+
+    def get_tip_height(self):
+        try:
+            return self._rpc.getblockcount()
+        except JSONRPCError as e:
+            raise ChainBackendError(f"{e}")
+
+    def get_outspend(self, txid, vout):
+        try:
+            txout = self._rpc.gettxout(txid, vout, False)
+        except JSONRPCError as e:
+            raise ChainBackendError(f"{e}")
+        if txout is not None:
+            return UNSPENT
+        return Outspend(True, None, None, None)
+
+
+class EsploraBackend:
+    """
+    Uses the Esplora REST API, keeps up to `max_connections` HTTP
+    connections open for reuse, can be used from several threads
+    """
+
+    def __init__(self, url, max_connections=4, timeout=10):
+        parts = urlsplit(url)
+        self._connection_class = (
+            http.client.HTTPSConnection
+            if parts.scheme == "https"
+            else http.client.HTTPConnection
+        )
+        self._netloc = parts.netloc
+        self._path = parts.path.rstrip("/")
+        self._timeout = timeout
+        self._pool = queue.LifoQueue(maxsize=max_connections)
+
+    def track(self, txid):
+        pass
+
+    def needs_catchup(self, tip_height):
+        return False
+
+    def _get_connection(self):
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            return self._connection_class(self._netloc, timeout=self._timeout)
+
+    def _put_connection(self, connection):
+        try:
+            self._pool.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def request(self, path):
+        # the pooled connection might have been closed by the server,
+        # try once more on a new one
+        for attempt in range(2):
+            connection = self._get_connection()
+            try:
+                connection.request("GET", self._path + path)
+                response = connection.getresponse()
+                body = response.read()
+            except (http.client.HTTPException, OSError) as e:
+                connection.close()
+                if attempt:
+                    raise ChainBackendError(f"{path}: {e}")
+                continue
+            self._put_connection(connection)
+            if response.status != 200:
+                raise ChainBackendError(
+                    f"{path}: {response.status} {body.decode('utf-8')}"
+                )
+            return body
+
+    def get_tip_height(self):
+        return int(self.request("/blocks/tip/height"))
+
+    def get_tx_hex(self, txid):
+        return self.request(f"/tx/{txid}/hex").decode("utf-8")
+
+    def get_tx(self, txid):
+        return json.loads(self.request(f"/tx/{txid}"))
+
+    def get_outspend(self, txid, vout):
+        outspend = json.loads(self.request(f"/tx/{txid}/outspend/{vout}"))
+        if not outspend["spent"] or not outspend["status"]["confirmed"]:
+            return UNSPENT
+        return Outspend(
+            True,
+            outspend["txid"],
+            outspend["vin"],
+            outspend["status"]["block_height"],
+        )
+
+
+def make_chain_backend(app):
+    """
+    The backend is chosen with `chain_backend` in the common config,
+    `rpc` (default), `esplora` or `index`. The Esplora API url is
+    `esplora_api`, the spend index keeps only the spends of the tracked
+    contracts unless `spend_index/pruned` is false. The blocks for the index
+    are fetched serialized, from the node REST interface if
+    `spend_index/rest_url` is set, or as JSON if `spend_index/block_source`
+    is `json`.
+    """
+    from . import GuiRPCCaller
+    from .raw_block import RawBlockSource
+    from .spend_index import IndexBackend, RPCBlockSource, SpendIndex
+
+    name = app.common_settings.value("chain_backend", "rpc")
+    if name == "esplora":
+        url = app.common_settings.value(
+            "esplora_api", f"{link_to_esplora}/api"
+        )
+        return EsploraBackend(url)
+    if name == "index":
+        pruned = app.common_settings.value("spend_index/pruned", "true")
+        index = SpendIndex(
+            app.path / f"{app.config_name.lower()}_spends.sqlite",
+            pruned=str(pruned).lower() != "false",
+        )
+        rest_url = app.common_settings.value("spend_index/rest_url")
+        use_json = (
+            app.common_settings.value("spend_index/block_source") == "json"
+        )
+
+        def make_block_source(rpc=None):
+            # the threads catching up with the tip need their own connections
+            if rpc is None:
+                rpc = GuiRPCCaller(**app.rpc_kwargs)
+            if use_json:
+                return RPCBlockSource(rpc)
+            return RawBlockSource(rpc, rest_url)
+
+        return IndexBackend(
+            index,
+            make_block_source(app.rpc),
+            RPCBackend(app.rpc),
+            make_block_source,
+        )
+    if name != "rpc":
+        raise ValueError(f"Unknown chain backend {name}")
+    return RPCBackend(app.rpc)
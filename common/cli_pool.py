@@ -0,0 +1,155 @@
+# Copyright (c) 2020-2021 Rugged Bytes IT-Services GmbH
+# Distributed under the MIT software license, see the accompanying
+# file COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+import time
+from collections import deque
+
+from PyQt5.QtCore import QObject, QProcess, QThread, pyqtSignal, qInfo
+
+from .stats import call_stats, cli_command_name
+
+
+class CLIProcessPool(QObject):
+    """
+    Runs CLI tool invocations as separate processes, at most `max_jobs`
+    of them at the same time. Each submitted job carries a `tag` that
+    is passed back with the result, so the caller can match them.
+    The jobs with the same `key`, for example the plan of the contract
+    they change, are run one after another in the order they were
+    submitted. Failed jobs are resubmitted up to `retries` times before
+    the failure is reported with `job_finished`. The output of the jobs
+    is passed on with `job_output` as it comes.
+    """
+
+    job_started = pyqtSignal(object)
+    job_output = pyqtSignal(object, str, str)
+    job_retrying = pyqtSignal(object, str)
+    job_cancelled = pyqtSignal(object)
+    job_finished = pyqtSignal(object, int, str, str)
+    all_finished = pyqtSignal()
+
+    def __init__(self, max_jobs=None, parent=None):
+        super(CLIProcessPool, self).__init__(parent)
+        if max_jobs is None:
+            max_jobs = QThread.idealThreadCount()
+        self.max_jobs = max(1, max_jobs)
+        self._queue = deque()
+        self._running = {}
+        self._started = {}
+        self._output = {}
+        self._cancelled = set()
+
+    @property
+    def pending(self):
+        return len(self._queue) + len(self._running)
+
+    def set_max_jobs(self, max_jobs):
+        self.max_jobs = max(1, max_jobs)
+        self._start_next()
+
+    def submit(self, program, args, tag=None, retries=0, key=None):
+        self._queue.append(
+            (program, [str(arg) for arg in args], tag, retries, key)
+        )
+        self._start_next()
+
+    def cancel(self, tag):
+        """Drop the job if it waits, kill its process if it runs"""
+        for job in self._queue:
+            if job[2] is tag:
+                self._queue.remove(job)
+                self.job_cancelled.emit(tag)
+                self._check_all_finished()
+                return True
+        for process, job in self._running.items():
+            if job[2] is tag:
+                self._cancelled.add(process)
+                process.kill()
+                return True
+        return False
+
+    def _start_next(self):
+        busy_keys = {job[4] for job in self._running.values()}
+        for job in list(self._queue):
+            if len(self._running) >= self.max_jobs:
+                break
+            program, args, tag, _, key = job
+            if key is not None and key in busy_keys:
+                continue
+            busy_keys.add(key)
+            self._queue.remove(job)
+            process = QProcess(self)
+            self._running[process] = job
+            self._started[process] = time.perf_counter()
+            self._output[process] = ([], [])
+
+            process.readyReadStandardOutput.connect(
+                lambda p=process: self._read_output(p, "stdout")
+            )
+            process.readyReadStandardError.connect(
+                lambda p=process: self._read_output(p, "stderr")
+            )
+            process.finished.connect(
+                lambda status_int, _, p=process: self._process_done(
+                    p, status_int
+                )
+            )
+            process.errorOccurred.connect(
+                lambda error, p=process: self._process_error(p, error)
+            )
+            qInfo(f"CLI: {program} {' '.join(args)}\n")
+            self.job_started.emit(tag)
+            process.start(program, args)
+
+    def _read_output(self, process, channel):
+        if process not in self._running:
+            return
+        if channel == "stdout":
+            data = process.readAllStandardOutput()
+            chunks = self._output[process][0]
+        else:
+            data = process.readAllStandardError()
+            chunks = self._output[process][1]
+        text = data.data().decode("utf-8", errors="replace")
+        if text:
+            chunks.append(text)
+            self.job_output.emit(self._running[process][2], channel, text)
+
+    def _process_error(self, process, error):
+        # `finished` is not emitted if the process could not be started
+        if error == QProcess.FailedToStart:
+            self._process_done(process, -1)
+
+    def _process_done(self, process, status_int):
+        if process not in self._running:
+            return
+        self._read_output(process, "stdout")
+        self._read_output(process, "stderr")
+        program, args, tag, retries, key = self._running.pop(process)
+        call_stats.observe(
+            "cli",
+            cli_command_name(program, args),
+            time.perf_counter() - self._started.pop(process),
+            status_int == 0,
+        )
+        output, error = ("".join(chunks) for chunks in
+                         self._output.pop(process))
+        if status_int and not error:
+            error = process.errorString()
+        process.deleteLater()
+        if process in self._cancelled:
+            self._cancelled.discard(process)
+            self.job_cancelled.emit(tag)
+        elif status_int and retries > 0:
+            self.job_retrying.emit(tag, error)
+            # ahead of the queue, before the later jobs with the same key
+            self._queue.appendleft((program, args, tag, retries - 1, key))
+        else:
+            self.job_finished.emit(tag, status_int, output, error)
+        self._start_next()
+        self._check_all_finished()
+
+    def _check_all_finished(self):
+        if not self._running and not self._queue:
+            self.all_finished.emit()
@@ -0,0 +1,373 @@
+# Copyright (c) 2020-2021 Rugged Bytes IT-Services GmbH
+# Distributed under the MIT software license, see the accompanying
+# file COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+"""
+Consolidation of the wallet UTXOs. The UTXO set is read with one
+`listunspent`, the smallest UTXOs of every asset are swept into one output,
+and the sweeps of several assets share a transaction up to `max_inputs`
+inputs, with one fee paid in L-BTC.
+"""
+
+import math
+from collections import defaultdict, namedtuple
+from decimal import Decimal
+
+from PyQt5.QtCore import Qt, pyqtSlot
+from PyQt5.QtWidgets import (
+    QApplication,
+    QDialog,
+    QMessageBox,
+    QTableWidgetItem,
+)
+
+from . import LoaderUI, get_short_name
+from .roles import get_app
+
+COIN = 100000000
+
+# the virtual sizes of the parts of an Elements transaction, an input
+# spending a P2SH-P2WPKH output and a blinded output with its proofs
+TX_VSIZE = 11
+INPUT_VSIZE = 91
+OUTPUT_VSIZE = 1200
+FEE_OUTPUT_VSIZE = 10
+
+Utxo = namedtuple("Utxo", "txid vout amount")
+
+# `utxos` are the inputs of the sweep, `amount` is their sum
+Sweep = namedtuple("Sweep", "asset utxos amount")
+
+Batch = namedtuple("Batch", "sweeps vsize fee")
+
+ConsolidationPlan = namedtuple(
+    "ConsolidationPlan",
+    "batches fee num_utxos num_inputs unbatched_vsize vsize saved_vsize",
+)
+
+
+def tx_vsize(num_inputs, num_outputs):
+    return (
+        TX_VSIZE + num_inputs * INPUT_VSIZE + num_outputs * OUTPUT_VSIZE
+        + FEE_OUTPUT_VSIZE
+    )
+
+
+def group_utxos(unspent):
+    """The spendable UTXOs per asset, the smallest first"""
+    utxos = defaultdict(list)
+    for utxo in unspent:
+        if not utxo.get("spendable", True):
+            continue
+        utxos[utxo["asset"]].append(
+            Utxo(
+                utxo["txid"],
+                utxo["vout"],
+                int(Decimal(utxo["amount"]) * COIN),
+            )
+        )
+    for asset_utxos in utxos.values():
+        asset_utxos.sort(key=lambda utxo: utxo.amount)
+    return dict(utxos)
+
+
+def plan_sweeps(utxos, keep=1, max_inputs=50):
+    """
+    Sweep the smallest UTXOs of every asset so that `keep` are left, the
+    largest `keep - 1` are not touched. A sweep has at most `max_inputs`
+    inputs, more UTXOs of an asset are swept into more outputs.
+    """
+    sweeps = []
+    for asset, asset_utxos in sorted(utxos.items()):
+        num = len(asset_utxos) - keep + 1
+        if num < 2:
+            continue
+        swept = asset_utxos[:num]
+        chunks = [
+            swept[num:num + max_inputs]
+            for num in range(0, len(swept), max_inputs)
+        ]
+        if len(chunks[-1]) == 1:
+            # one UTXO is not a sweep, take another from the previous one
+            chunks[-1].insert(0, chunks[-2].pop())
+        sweeps.extend(
+            Sweep(asset, chunk, sum(utxo.amount for utxo in chunk))
+            for chunk in chunks
+        )
+    return sweeps
+
+
+def batch_fee(sweeps, fee_rate):
+    num_inputs = sum(len(sweep.utxos) for sweep in sweeps)
+    vsize = tx_vsize(num_inputs, len(sweeps))
+    return vsize, math.ceil(vsize * fee_rate)
+
+
+def plan_batches(sweeps, utxos, fee_asset, fee_rate, max_inputs=50):
+    """
+    Pack the sweeps into transactions of at most `max_inputs` inputs, the
+    largest sweeps first. Every transaction pays the fee from an L-BTC
+    sweep: the swept L-BTC UTXOs are shared between the transactions,
+    and the smallest L-BTC UTXO that is not swept and pays the fee is
+    added where they are not enough.
+    """
+    fee_swept = sorted(
+        (u for s in sweeps if s.asset == fee_asset for u in s.utxos),
+        key=lambda utxo: utxo.amount,
+    )
+    free = [u for u in utxos.get(fee_asset, []) if u not in set(fee_swept)]
+    batches = []
+    for sweep in sorted(sweeps, key=lambda s: -len(s.utxos)):
+        if sweep.asset == fee_asset:
+            continue
+        for batch in batches:
+            num_inputs = sum(len(s.utxos) for s in batch) + len(sweep.utxos)
+            # one input is left for the fee
+            if num_inputs < max_inputs:
+                batch.append(sweep)
+                break
+        else:
+            batches.append([sweep])
+
+    fee_inputs = []
+    for batch in batches:
+        vsize, fee = batch_fee(batch, fee_rate)
+        fee += math.ceil((INPUT_VSIZE + OUTPUT_VSIZE) * fee_rate)
+        for pool in (fee_swept, free):
+            fee_utxo = next((u for u in pool if u.amount > fee), None)
+            if fee_utxo is not None:
+                pool.remove(fee_utxo)
+                break
+        else:
+            raise ValueError(
+                f"no L-BTC UTXO to pay the fee of {len(batches)}"
+                f" transactions, allow more inputs per transaction"
+            )
+        fee_inputs.append([fee_utxo])
+    # the rest of the swept L-BTC fills the transactions, then its own
+    for batch, inputs in zip(batches, fee_inputs):
+        room = max_inputs - sum(len(s.utxos) for s in batch) - len(inputs)
+        inputs.extend(fee_swept[:room])
+        del fee_swept[:room]
+    while len(fee_swept) > 1:
+        batches.append([])
+        fee_inputs.append(fee_swept[:max_inputs])
+        del fee_swept[:max_inputs]
+    if fee_swept and batches:
+        # one UTXO is not a sweep: add it where there is room, or take
+        # another swept one from the last transaction
+        inputs = fee_inputs[-1]
+        if sum(len(s.utxos) for s in batches[-1]) + len(inputs) < max_inputs:
+            inputs.append(fee_swept.pop())
+        elif len(inputs) > 1:
+            batches.append([])
+            fee_inputs.append([inputs.pop(), fee_swept.pop()])
+
+    result = []
+    for batch, inputs in zip(batches, fee_inputs):
+        batch.append(
+            Sweep(fee_asset, inputs, sum(utxo.amount for utxo in inputs))
+        )
+        vsize, fee = batch_fee(batch, fee_rate)
+        if batch[-1].amount <= fee:
+            raise ValueError("the L-BTC UTXOs do not pay the fee")
+        result.append(Batch(batch, vsize, fee))
+    return result
+
+
+def separate_vsize(sweep, fee_asset):
+    """The size of the transaction of the sweep alone"""
+    if sweep.asset == fee_asset:
+        return tx_vsize(len(sweep.utxos), 1)
+    return tx_vsize(len(sweep.utxos) + 1, 2)
+
+
+def plan_consolidation(unspent, fee_asset, fee_rate, keep=1, max_inputs=50):
+    """
+    Plan the consolidation of the `listunspent` result: the transactions,
+    their size and fee, the size of the transactions if every asset was
+    swept separately, and the size the later transactions save by
+    spending fewer UTXOs
+    """
+    utxos = group_utxos(unspent)
+    sweeps = plan_sweeps(utxos, keep, max_inputs - 1)
+    batches = plan_batches(sweeps, utxos, fee_asset, fee_rate, max_inputs)
+    batched_sweeps = [s for batch in batches for s in batch.sweeps]
+    num_inputs = sum(len(s.utxos) for s in batched_sweeps)
+    return ConsolidationPlan(
+        batches,
+        sum(batch.fee for batch in batches),
+        sum(len(asset_utxos) for asset_utxos in utxos.values()),
+        num_inputs,
+        sum(separate_vsize(s, fee_asset) for s in batched_sweeps),
+        sum(batch.vsize for batch in batches),
+        (num_inputs - len(batched_sweeps)) * INPUT_VSIZE,
+    )
+
+
+def send_batch(rpc, batch, fee_asset):
+    """Sweep the UTXOs of the batch to new addresses, returns the txid"""
+    inputs = []
+    outputs = {}
+    output_assets = {}
+    for sweep in batch.sweeps:
+        inputs.extend(
+            {"txid": utxo.txid, "vout": utxo.vout} for utxo in sweep.utxos
+        )
+        amount = sweep.amount
+        if sweep.asset == fee_asset:
+            amount -= batch.fee
+        address = rpc.getnewaddress()
+        outputs[address] = Decimal(amount) / COIN
+        output_assets[address] = sweep.asset
+    outputs["fee"] = Decimal(batch.fee) / COIN
+    tx = rpc.createrawtransaction(inputs, outputs, 0, False, output_assets)
+    tx = rpc.blindrawtransaction(tx)
+    signed = rpc.signrawtransactionwithwallet(tx)
+    if not signed["complete"]:
+        raise ValueError(f"not signed: {signed.get('errors')}")
+    return rpc.sendrawtransaction(signed["hex"])
+
+
+class ConsolidateDialog(QDialog, LoaderUI):
+    """
+    Shows how the UTXOs of the wallet would be consolidated, and sends the
+    consolidating transactions
+    """
+
+    COLUMNS = ("Tx", "Asset", "Inputs", "Amount", "Size, vB", "Fee")
+
+    def __init__(self, parent=None):
+        super(ConsolidateDialog, self).__init__(parent)
+        self.setupUi(__file__)
+        app = get_app(self)
+        self._plan = None
+        self._unspent = []
+        self.FeeRatedoubleSpinBox.setValue(
+            float(app.settings.value("consolidation/fee_rate", 1.0))
+        )
+        self.KeepspinBox.setValue(
+            int(app.settings.value("consolidation/keep", 1))
+        )
+        self.MaxInputsspinBox.setValue(
+            int(app.settings.value("consolidation/max_inputs", 50))
+        )
+        self.planTable.setColumnCount(len(self.COLUMNS))
+        self.planTable.setHorizontalHeaderLabels(self.COLUMNS)
+        self.FeeRatedoubleSpinBox.valueChanged.connect(self.replan)
+        self.KeepspinBox.valueChanged.connect(self.replan)
+        self.MaxInputsspinBox.valueChanged.connect(self.replan)
+        self.analyse()
+
+    @pyqtSlot(name="on_AnalyseButton_clicked")
+    def analyse(self):
+        """Read the UTXO set of the wallet and plan its consolidation"""
+        app = get_app(self)
+        try:
+            self._unspent = app.rpc.listunspent(1)
+        except Exception as e:
+            self._unspent = []
+            self.summaryLabel.setText(f"Error: {e}")
+        self.replan()
+
+    def replan(self):
+        app = get_app(self)
+        fee_rate = self.FeeRatedoubleSpinBox.value()
+        keep = self.KeepspinBox.value()
+        max_inputs = self.MaxInputsspinBox.value()
+        app.settings.setValue("consolidation/fee_rate", fee_rate)
+        app.settings.setValue("consolidation/keep", keep)
+        app.settings.setValue("consolidation/max_inputs", max_inputs)
+        self._plan = None
+        self.planTable.setRowCount(0)
+        self.ConsolidateButton.setEnabled(False)
+        try:
+            self._plan = plan_consolidation(
+                self._unspent,
+                app.assetlabels["bitcoin"],
+                fee_rate,
+                keep,
+                max_inputs,
+            )
+        except Exception as e:
+            self.summaryLabel.setText(f"Error: {e}")
+            return
+        self.show_plan(self._plan)
+
+    def show_plan(self, plan):
+        app = get_app(self)
+        rows = [
+            (num, sweep, batch)
+            for num, batch in enumerate(plan.batches)
+            for sweep in batch.sweeps
+        ]
+        self.planTable.setRowCount(len(rows))
+        for row, (num, sweep, batch) in enumerate(rows):
+            first = sweep is batch.sweeps[0]
+            values = (
+                f"{num + 1}" if first else "",
+                get_short_name(app, sweep.asset),
+                f"{len(sweep.utxos)}",
+                f"{sweep.amount}",
+                f"{batch.vsize}" if first else "",
+                f"{batch.fee}" if first else "",
+            )
+            for column, value in enumerate(values):
+                item = QTableWidgetItem(value)
+                if column > 1:
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                self.planTable.setItem(row, column, item)
+        self.planTable.resizeColumnsToContents()
+        if not plan.batches:
+            self.summaryLabel.setText(
+                f"{plan.num_utxos} UTXOs, nothing to consolidate"
+            )
+            return
+        self.summaryLabel.setText(
+            f"{plan.num_inputs} of {plan.num_utxos} UTXOs in"
+            f" {len(plan.batches)} transactions of {plan.vsize} vB"
+            f" ({plan.unbatched_vsize} vB one asset per transaction),"
+            f" fee {plan.fee} sat.\n"
+            f"The later transactions will be {plan.saved_vsize} vB smaller"
+            f" in total."
+        )
+        self.ConsolidateButton.setEnabled(True)
+
+    @pyqtSlot(name="on_ConsolidateButton_clicked")
+    def consolidate(self):
+        app = get_app(self)
+        txids = []
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        try:
+            for batch in self._plan.batches:
+                txids.append(
+                    send_batch(app.rpc, batch, app.assetlabels["bitcoin"])
+                )
+        except Exception as e:
+            QApplication.restoreOverrideCursor()
+            QMessageBox.critical(
+                self, "Consolidation Error",
+                f"{len(txids)} transactions were sent, then: {e}",
+            )
+        else:
+            QApplication.restoreOverrideCursor()
+            QMessageBox.information(
+                self, "Info",
+                "Consolidation transactions were sent:\n" + "\n".join(txids),
+            )
+        app.wallet_sync.refresh()
+        self.analyse()
+
+
+def wallet_menu(window):
+    """The "Wallet" menu of the window, added if it has none"""
+    for action in window.menuBar().actions():
+        if action.menu() is not None and action.text() == "Wallet":
+            return action.menu()
+    return window.menuBar().addMenu("Wallet")
+
+
+def add_consolidate_action(window):
+    action = wallet_menu(window).addAction("Consolidate coins...")
+    action.triggered.connect(lambda: ConsolidateDialog(window).exec())
+    return action
@@ -0,0 +1,252 @@
+# Copyright (c) 2020-2021 Rugged Bytes IT-Services GmbH
+# Distributed under the MIT software license, see the accompanying
+# file COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+import hashlib
+import sqlite3
+from collections import OrderedDict, namedtuple
+
+from bitcointx.core import CTransaction, b2lx, x
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS contracts (
+    contract_id TEXT PRIMARY KEY,
+    start_block INTEGER NOT NULL,
+    creditor_control_asset TEXT NOT NULL,
+    debtor_control_asset TEXT NOT NULL,
+    finished_txid TEXT,
+    has_payment INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS contract_steps (
+    contract_id TEXT NOT NULL,
+    step INTEGER NOT NULL,
+    txid TEXT NOT NULL,
+    tx TEXT NOT NULL,
+    block_num INTEGER NOT NULL,
+    block_hash TEXT NOT NULL,
+    vstage INTEGER,
+    PRIMARY KEY (contract_id, step)
+);
+"""
+
+# `vstage` is the position of the vertical stage of the step in the
+# `iter_vstages()` order, None for the step that finished the contract
+ContractStep = namedtuple(
+    "ContractStep", "txid tx block_num block_hash vstage"
+)
+
+StoredContract = namedtuple(
+    "StoredContract",
+    "start_block creditor_control_asset debtor_control_asset "
+    "finished_txid has_payment steps",
+)
+
+
+class TrackedStep:
+    """
+    The part of a contract transaction the tracking needs: the txid, the
+    block, the outpoints it spends and its outputs that can be spent.
+    The whole transaction is read with `ContractTxCache` when needed.
+    """
+
+    __slots__ = ("txid", "block_num", "prevouts", "spendable_outs")
+
+    def __init__(self, txid, block_num, prevouts, spendable_outs):
+        self.txid = txid
+        self.block_num = block_num
+        self.prevouts = prevouts
+        self.spendable_outs = spendable_outs
+
+    @classmethod
+    def from_tx(cls, tx, block_num):
+        return cls(
+            b2lx(tx.GetTxid()),
+            block_num,
+            tuple((b2lx(inp.prevout.hash), inp.prevout.n) for inp in tx.vin),
+            tuple(
+                n for n, txout in enumerate(tx.vout)
+                if txout.scriptPubKey
+                and not txout.scriptPubKey.is_unspendable()
+            ),
+        )
+
+
+def iter_vstages(lstage):
+    for vstage in lstage.vertical_stages:
+        yield vstage
+        if vstage.next_lateral_stage is not None:
+            yield from iter_vstages(vstage.next_lateral_stage)
+
+
+def get_contract_id(tx_str, start_block):
+    """The contract is identified by its incomplete transaction"""
+    preimage = f"{start_block}:{tx_str}".encode("utf-8")
+    return hashlib.sha256(preimage).hexdigest()
+
+
+class ContractStore:
+    """
+    The contract steps found in the blockchain, so the contract does not
+    have to be tracked from its start block every time it is opened
+    """
+
+    def __init__(self, path):
+        self._db = sqlite3.connect(str(path))
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def load(self, contract_id):
+        row = self._db.execute(
+            "SELECT start_block, creditor_control_asset, debtor_control_asset,"
+            " finished_txid, has_payment FROM contracts"
+            " WHERE contract_id = ?",
+            (contract_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        steps = [
+            ContractStep(*step)
+            for step in self._db.execute(
+                "SELECT txid, tx, block_num, block_hash, vstage"
+                " FROM contract_steps WHERE contract_id = ? ORDER BY step",
+                (contract_id,),
+            )
+        ]
+        start_block, creditor_asset, debtor_asset, finished, payment = row
+        return StoredContract(
+            start_block, creditor_asset, debtor_asset, finished,
+            bool(payment), steps,
+        )
+
+    def contract_ids(self):
+        return [
+            contract_id for contract_id, in
+            self._db.execute("SELECT contract_id FROM contracts")
+        ]
+
+    def contract_positions(self):
+        """
+        The position of the last vertical stage of every contract, None if
+        no stage was found yet, and whether the contract is finished
+        """
+        return {
+            contract_id: (vstage, finished_txid is not None)
+            for contract_id, finished_txid, vstage in self._db.execute(
+                "SELECT contract_id, finished_txid,"
+                " (SELECT vstage FROM contract_steps AS s"
+                "  WHERE s.contract_id = c.contract_id"
+                "  AND vstage IS NOT NULL ORDER BY step DESC LIMIT 1)"
+                " FROM contracts AS c"
+            )
+        }
+
+    def save_contract(self, contract_id, start_block, creditor_control_asset,
+                      debtor_control_asset):
+        with self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO contracts (contract_id, start_block,"
+                " creditor_control_asset, debtor_control_asset)"
+                " VALUES (?, ?, ?, ?)",
+                (
+                    contract_id,
+                    start_block,
+                    creditor_control_asset,
+                    debtor_control_asset,
+                ),
+            )
+            self._db.execute(
+                "DELETE FROM contract_steps WHERE contract_id = ?",
+                (contract_id,),
+            )
+
+    def add_steps(self, contract_id, first_step, steps):
+        """
+        Returns False if the contract is not stored, e.g. it was forgotten,
+        then its steps are not stored either
+        """
+        with self._db:
+            saved = self._db.execute(
+                "SELECT 1 FROM contracts WHERE contract_id = ?",
+                (contract_id,),
+            ).fetchone()
+            if saved is None:
+                return False
+            self._db.executemany(
+                "INSERT OR REPLACE INTO contract_steps (contract_id, step,"
+                " txid, tx, block_num, block_hash, vstage)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (contract_id, first_step + num, *step)
+                    for num, step in enumerate(steps)
+                ],
+            )
+        return True
+
+    def get_tx(self, contract_id, txid):
+        row = self._db.execute(
+            "SELECT tx FROM contract_steps WHERE contract_id = ? AND txid = ?",
+            (contract_id, txid),
+        ).fetchone()
+        return row[0] if row is not None else None
+
+    def set_finished(self, contract_id, finished_txid):
+        with self._db:
+            self._db.execute(
+                "UPDATE contracts SET finished_txid = ? WHERE contract_id = ?",
+                (finished_txid, contract_id),
+            )
+
+    def set_has_payment(self, contract_id, has_payment):
+        with self._db:
+            self._db.execute(
+                "UPDATE contracts SET has_payment = ? WHERE contract_id = ?",
+                (int(has_payment), contract_id),
+            )
+
+    def forget(self, contract_id):
+        with self._db:
+            self._db.execute(
+                "DELETE FROM contracts WHERE contract_id = ?", (contract_id,)
+            )
+            self._db.execute(
+                "DELETE FROM contract_steps WHERE contract_id = ?",
+                (contract_id,),
+            )
+
+
+class ContractTxCache:
+    """
+    The whole contract transactions, for the tracked steps. The least
+    recently used are dropped, they are read from the store again, or
+    from the node if the step is not stored.
+    """
+
+    def __init__(self, store, rpc, size=64):
+        self._store = store
+        self._rpc = rpc
+        self._size = size
+        self._txs = OrderedDict()
+
+    def put(self, tx):
+        txid = b2lx(tx.GetTxid())
+        self._txs[txid] = tx
+        self._txs.move_to_end(txid)
+        while len(self._txs) > self._size:
+            self._txs.popitem(last=False)
+
+    def get(self, contract_id, step):
+        tx = self._txs.get(step.txid)
+        if tx is not None:
+            self._txs.move_to_end(step.txid)
+            return tx
+        tx_hex = self._store.get_tx(contract_id, step.txid)
+        if tx_hex is None:
+            tx_hex = self._rpc.getrawtransaction(
+                step.txid, False, self._rpc.getblockhash(step.block_num)
+            )
+        tx = CTransaction.deserialize(x(tx_hex))
+        object.__setattr__(tx, "block_num", step.block_num)
+        self.put(tx)
+        return tx
@@ -0,0 +1,68 @@
+# Copyright (c) 2020-2021 Rugged Bytes IT-Services GmbH
+# Distributed under the MIT software license, see the accompanying
+# file COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+import json
+import os
+import threading
+
+from bitcointx import ChainParams
+from bitcointx.core import CTransaction, x
+
+from cli.cli_common import load_data_with_checking_hash
+from cli.lib.types import PlanData
+
+
+class FileCache:
+    """
+    The data loaded from the files, shared by all the windows of the
+    process. The file is loaded again only if its size, mtime or inode
+    changed. The other arguments of `get` are passed to the loader, the
+    data is kept for each of them.
+    """
+
+    def __init__(self, load):
+        self._load = load
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def get(self, path, *args):
+        path = os.path.abspath(path)
+        key = file_key(path)
+        with self._lock:
+            entry = self._entries.get((path, args))
+        if entry is not None and entry[0] == key:
+            return entry[1]
+        value = self._load(path, *args)
+        # the file could be rewritten while it was loaded
+        if file_key(path) == key:
+            with self._lock:
+                self._entries[(path, args)] = (key, value)
+        return value
+
+
+def file_key(path):
+    st = os.stat(path)
+    return (st.st_size, st.st_mtime_ns, st.st_ino)
+
+
+def load_plan_data(path):
+    with open(path) as f:
+        return PlanData(**json.loads(f.read()))
+
+
+plan_cache = FileCache(load_plan_data)
+# the checked contract data of the Creditor or the Debtor; shared, so not to
+# be changed
+contract_data_cache = FileCache(load_data_with_checking_hash)
+
+
+def load_contract_tx(path, network):
+    data = contract_data_cache.get(path)
+    with ChainParams(network):
+        return CTransaction.deserialize(x(data["tx"]))
+
+
+# the incomplete contract transaction of the contract data, deserialized
+# with the chain params of the network
+contract_tx_cache = FileCache(load_contract_tx)
@@ -0,0 +1,220 @@
+# Copyright (c) 2020-2021 Rugged Bytes IT-Services GmbH
+# Distributed under the MIT software license, see the accompanying
+# file COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+import pathlib
+import time
+
+from PyQt5.QtCore import Qt, QThread, pyqtSignal
+from PyQt5.QtGui import QTextCursor
+from PyQt5.QtWidgets import (
+    QDockWidget,
+    QHBoxLayout,
+    QPlainTextEdit,
+    QPushButton,
+    QSplitter,
+    QTableWidget,
+    QTableWidgetItem,
+    QVBoxLayout,
+    QWidget,
+)
+
+from .cli_pool import CLIProcessPool
+from .roles import get_app
+from .stats import view_menu
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = (
+    "queued", "running", "done", "failed", "cancelled"
+)
+
+
+class Job:
+    """One run of a CLI tool with its output, the tag of the pool job"""
+
+    def __init__(self, program, args, description, key=None,
+                 finished_func=None):
+        self.program = program
+        self.args = list(args)
+        self.description = description
+        self.key = key
+        self.finished_func = finished_func
+        self.state = QUEUED
+        self.output = []
+        # the standard output and errors of the finished tool
+        self.stdout = ""
+        self.stderr = ""
+        self.started = None
+        self.elapsed = None
+
+    @property
+    def finished(self):
+        return self.state in (DONE, FAILED, CANCELLED)
+
+
+class JobsPanel(QDockWidget):
+    """
+    The CLI jobs of the window: they run at the same time up to the
+    `jobs/max_jobs` of the role, one at a time for the same contract.
+    The output of the selected job is shown as it comes.
+    """
+
+    COLUMNS = ("Job", "Contract", "State", "Time, s")
+
+    job_done = pyqtSignal(object)
+
+    def __init__(self, parent=None):
+        super(JobsPanel, self).__init__("Jobs", parent)
+        self.setObjectName("jobsPanel")
+        app = get_app(self)
+        self._jobs = []
+        self._pool = CLIProcessPool(
+            int(app.settings.value(
+                "jobs/max_jobs", QThread.idealThreadCount()
+            )),
+            self,
+        )
+        self._pool.job_started.connect(self._job_started)
+        self._pool.job_output.connect(self._job_output)
+        self._pool.job_cancelled.connect(self._job_cancelled)
+        self._pool.job_finished.connect(self._job_finished)
+
+        widget = QWidget(self)
+        vbox = QVBoxLayout(widget)
+        splitter = QSplitter(Qt.Horizontal, widget)
+        self.table = QTableWidget(0, len(self.COLUMNS), splitter)
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.table.setSelectionMode(QTableWidget.SingleSelection)
+        self.table.itemSelectionChanged.connect(self._show_output)
+        self.output = QPlainTextEdit(splitter)
+        self.output.setReadOnly(True)
+        vbox.addWidget(splitter)
+        hbox = QHBoxLayout()
+        hbox.addStretch()
+        self.cancel_button = QPushButton("Cancel", widget)
+        self.cancel_button.clicked.connect(self.cancel_selected)
+        hbox.addWidget(self.cancel_button)
+        self.retry_button = QPushButton("Retry", widget)
+        self.retry_button.clicked.connect(self.retry_selected)
+        hbox.addWidget(self.retry_button)
+        clear_button = QPushButton("Clear finished", widget)
+        clear_button.clicked.connect(self.clear_finished)
+        hbox.addWidget(clear_button)
+        vbox.addLayout(hbox)
+        self.setWidget(widget)
+        self._update_buttons()
+
+    def submit(self, program, args, description, key=None,
+               finished_func=None):
+        """
+        Run the CLI tool, `key` is the contract the job changes, usually
+        its plan file. `finished_func` is called with the job when it is
+        done or failed.
+        """
+        job = Job(program, args, description, key, finished_func)
+        self._jobs.append(job)
+        self.table.insertRow(self.table.rowCount())
+        self._update_row(job)
+        self._pool.submit(program, job.args, job, key=key)
+        return job
+
+    def selected_job(self):
+        rows = self.table.selectionModel().selectedRows()
+        if not rows:
+            return None
+        return self._jobs[rows[0].row()]
+
+    def select_job(self, job):
+        self.table.selectRow(self._jobs.index(job))
+
+    def cancel_selected(self):
+        job = self.selected_job()
+        if job is not None and not job.finished:
+            self._pool.cancel(job)
+
+    def retry_selected(self):
+        job = self.selected_job()
+        if job is not None and job.state in (FAILED, CANCELLED):
+            self.select_job(
+                self.submit(
+                    job.program, job.args, job.description, job.key,
+                    job.finished_func,
+                )
+            )
+
+    def clear_finished(self):
+        for row in reversed(range(len(self._jobs))):
+            if self._jobs[row].finished:
+                del self._jobs[row]
+                self.table.removeRow(row)
+        self._show_output()
+
+    def _job_started(self, job):
+        job.state = RUNNING
+        job.started = time.perf_counter()
+        self._update_row(job)
+
+    def _job_output(self, job, channel, text):
+        job.output.append(text)
+        if self.selected_job() is job:
+            self.output.moveCursor(QTextCursor.End)
+            self.output.insertPlainText(text)
+
+    def _job_cancelled(self, job):
+        self._finish(job, CANCELLED)
+
+    def _job_finished(self, job, status_int, output, error):
+        job.stdout = output
+        job.stderr = error
+        if status_int and error and error not in "".join(job.output):
+            job.output.append(error)
+        self._finish(job, FAILED if status_int else DONE)
+
+    def _finish(self, job, state):
+        job.state = state
+        if job.started is not None:
+            job.elapsed = time.perf_counter() - job.started
+        self._update_row(job)
+        if state == FAILED:
+            self.show()
+            self.raise_()
+            self.select_job(job)
+        elif self.selected_job() is job:
+            self._show_output()
+        if state in (DONE, FAILED) and job.finished_func is not None:
+            job.finished_func(job)
+        self.job_done.emit(job)
+
+    def _update_row(self, job):
+        row = self._jobs.index(job)
+        values = (
+            job.description,
+            pathlib.Path(job.key).stem if job.key else "",
+            job.state,
+            f"{job.elapsed:.1f}" if job.elapsed is not None else "",
+        )
+        for column, value in enumerate(values):
+            self.table.setItem(row, column, QTableWidgetItem(value))
+        self._update_buttons()
+
+    def _show_output(self):
+        job = self.selected_job()
+        self.output.setPlainText("".join(job.output) if job else "")
+        self.output.moveCursor(QTextCursor.End)
+        self._update_buttons()
+
+    def _update_buttons(self):
+        job = self.selected_job()
+        self.cancel_button.setEnabled(job is not None and not job.finished)
+        self.retry_button.setEnabled(
+            job is not None and job.state in (FAILED, CANCELLED)
+        )
+
+
+def add_jobs_panel(window):
+    panel = JobsPanel(window)
+    window.addDockWidget(Qt.BottomDockWidgetArea, panel)
+    panel.hide()
+    view_menu(window).addAction(panel.toggleViewAction())
+    return panel
@@ -0,0 +1,76 @@
+# Copyright (c) 2020-2021 Rugged Bytes IT-Services GmbH
+# Distributed under the MIT software license, see the accompanying
+# file COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+import time
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+from bitcointx.rpc import JSONRPCError
+
+
+class MempoolMonitor(QObject):
+    """
+    The outputs spent by the transactions in the mempool of the node.
+    Every `interval` ms the txids of the mempool are compared with the
+    last ones, only the transactions that arrived are read, and `changed`
+    is emitted if any arrived or left, mined or dropped.
+    """
+
+    changed = pyqtSignal()
+
+    def __init__(self, rpc, interval=1000, parent=None):
+        super(MempoolMonitor, self).__init__(parent)
+        self._rpc = rpc
+        self._txids = set()
+        # (txid, n): the txid of the mempool transaction that spends it
+        self._spends = {}
+        self._prevouts = {}
+        self._arrived = {}
+        self._timer = QTimer(self)
+        self._timer.setInterval(interval)
+        self._timer.timeout.connect(self.sync)
+        self._timer.start()
+        self.sync()
+
+    def spend_of(self, txid, n):
+        return self._spends.get((txid, n))
+
+    def arrived(self, txid):
+        """The time the transaction was first seen in the mempool"""
+        return self._arrived.get(txid)
+
+    def sync(self):
+        try:
+            txids = set(self._rpc.getrawmempool())
+        except JSONRPCError:
+            return
+
+        left = self._txids - txids
+        arrived = txids - self._txids
+        if not left and not arrived:
+            return
+
+        for txid in left:
+            for prevout in self._prevouts.pop(txid, ()):
+                if self._spends.get(prevout) == txid:
+                    del self._spends[prevout]
+            self._arrived.pop(txid, None)
+        now = time.time()
+        for txid in arrived:
+            try:
+                tx = self._rpc.getrawtransaction(txid, True)
+            except JSONRPCError:
+                # left the mempool meanwhile
+                txids.discard(txid)
+                continue
+            prevouts = tuple(
+                (inp["txid"], inp["vout"]) for inp in tx["vin"]
+                if "txid" in inp
+            )
+            self._prevouts[txid] = prevouts
+            for prevout in prevouts:
+                self._spends[prevout] = txid
+            self._arrived[txid] = now
+        self._txids = txids
+        self.changed.emit()
@@ -0,0 +1,116 @@
+# Copyright (c) 2020-2021 Rugged Bytes IT-Services GmbH
+# Distributed under the MIT software license, see the accompanying
+# file COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+"""
+Renders the stage diagrams of the plans to SVG and PNG files without
+showing a window, with the same layout as the plan status of the role
+windows. The plans are rendered in parallel in a pool of processes, each
+with its own QApplication on the offscreen platform.
+"""
+
+import multiprocessing
+import os
+import pathlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from PyQt5.QtCore import QRect, QSize, Qt
+from PyQt5.QtGui import QImage, QPainter
+from PyQt5.QtSvg import QSvgGenerator
+from PyQt5.QtWidgets import QApplication
+
+from . import make_stage_layout
+from .file_cache import load_plan_data
+
+FORMATS = ("svg", "png")
+
+_app = None
+
+
+def init_worker():
+    global _app
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    if QApplication.instance() is None:
+        _app = QApplication(["plan_diagram"])
+
+
+def layout_plan(plan_file):
+    """The stage diagram of the plan, laid out at its preferred size"""
+    repayment_plan = load_plan_data(plan_file).to_repayment_plan()
+    widget = make_stage_layout(repayment_plan)
+    widget.setAttribute(Qt.WA_DontShowOnScreen)
+    # the arrows between the stages are drawn from the mapped positions
+    # of the stage buttons, so the widget has to be shown to be laid out
+    widget.show()
+    widget.resize(widget.sizeHint())
+    widget.layout().activate()
+    return widget
+
+
+def render_svg(widget, out_file, title):
+    size = widget.size()
+    generator = QSvgGenerator()
+    generator.setFileName(str(out_file))
+    generator.setSize(size)
+    generator.setViewBox(QRect(0, 0, size.width(), size.height()))
+    generator.setTitle(title)
+    painter = QPainter(generator)
+    widget.render(painter)
+    painter.end()
+
+
+def render_png(widget, out_file, scale):
+    size = widget.size()
+    image = QImage(
+        QSize(size.width() * scale, size.height() * scale),
+        QImage.Format_ARGB32,
+    )
+    image.fill(Qt.white)
+    painter = QPainter(image)
+    painter.scale(scale, scale)
+    widget.render(painter)
+    painter.end()
+    if not image.save(str(out_file)):
+        raise OSError(f"Can not write {out_file}")
+
+
+def render_plan(plan_file, out_dir, formats=FORMATS, scale=1):
+    """Render the plan, returns the names of the written files"""
+    init_worker()
+    plan_file = pathlib.Path(plan_file)
+    widget = layout_plan(plan_file)
+    written = []
+    try:
+        for fmt in formats:
+            out_file = pathlib.Path(out_dir) / f"{plan_file.stem}.{fmt}"
+            if fmt == "svg":
+                render_svg(widget, out_file, plan_file.stem)
+            else:
+                render_png(widget, out_file, scale)
+            written.append(str(out_file))
+    finally:
+        widget.close()
+        widget.deleteLater()
+    return written
+
+
+def render_plans(plan_files, out_dir, formats=FORMATS, scale=1, jobs=None):
+    """
+    Render the plans in `jobs` processes, yields (plan file, written
+    files, error) as the plans are done
+    """
+    # the workers must not inherit the state of Qt from this process
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(
+        max_workers=jobs, mp_context=context, initializer=init_worker
+    ) as executor:
+        futures = {
+            executor.submit(render_plan, plan_file, out_dir, formats, scale):
+            plan_file
+            for plan_file in plan_files
+        }
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result(), None
+            except Exception as e:
+                yield futures[future], [], e
@@ -0,0 +1,249 @@
+# Copyright (c) 2020-2021 Rugged Bytes IT-Services GmbH
+# Distributed under the MIT software license, see the accompanying
+# file COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+"""
+Projection of the payments the Creditor receives from all the contracts
+when the Debtors pay on schedule, and of the collateral the Creditor can
+grab if they stop paying, per window of blocks. The repayment trees of the
+plans are flattened to arrays once, and the projection of all the contracts
+is a few vectorized passes over them, one per period.
+"""
+
+import pathlib
+from collections import namedtuple
+
+import numpy as np
+
+from .contract_store import get_contract_id, iter_vstages
+from .file_cache import FileCache, contract_data_cache, plan_cache
+
+# the arrays are indexed by the position of the vertical stage in the
+# `iter_vstages()` order, as the stages are stored in the contract store
+FlatPlan = namedtuple(
+    "FlatPlan",
+    "period payment early forfeited next_vstage late_vstage "
+    "num_blocks_in_period principal_amount principal_asset "
+    "collateral_amount collateral_asset",
+)
+
+Projection = namedtuple(
+    "Projection",
+    "first_block window_blocks num_contracts principal_assets inflows "
+    "collateral_assets at_risk",
+)
+
+
+def flatten_plan(repayment_plan, principal_asset, collateral_asset):
+    """
+    For every vertical stage: the period its payment window ends in, the
+    payment due on schedule, the early full payment, the collateral the
+    Creditor grabs if the Debtor stops paying in its lateral stage, and
+    the positions of the stages the regular payment and the late payment
+    lead to, -1 after the final payment and after the last late one
+    """
+    vstages = list(iter_vstages(repayment_plan.first_lateral_stage))
+    positions = {id(vstage): num for num, vstage in enumerate(vstages)}
+    period = np.empty(len(vstages), np.int64)
+    payment = np.empty(len(vstages), np.int64)
+    early = np.empty(len(vstages), np.int64)
+    forfeited = np.empty(len(vstages), np.int64)
+    next_vstage = np.full(len(vstages), -1, np.int64)
+    late_vstage = np.full(len(vstages), -1, np.int64)
+    for num, vstage in enumerate(vstages):
+        lstage = vstage.parent_lateral_stage
+        period[num] = lstage.level_n + vstage.index_m + 1
+        early[num] = vstage.early_repayment_amount
+        forfeited[num] = lstage.vertical_stages[-1].amount_C_forfeited
+        if vstage.next_lateral_stage is None:
+            payment[num] = vstage.early_repayment_amount
+        else:
+            payment[num] = vstage.regular_repayment_amount
+            next_vstage[num] = positions[
+                id(vstage.next_lateral_stage.vertical_stages[0])
+            ]
+        if vstage.index_m + 1 < len(lstage.vertical_stages):
+            late_vstage[num] = positions[
+                id(lstage.vertical_stages[vstage.index_m + 1])
+            ]
+    first_vstage = vstages[0]
+    return FlatPlan(
+        period, payment, early, forfeited, next_vstage, late_vstage,
+        repayment_plan.num_blocks_in_period, int(first_vstage.B),
+        principal_asset, int(first_vstage.plan.C), collateral_asset,
+    )
+
+
+def load_flat_plan(path, load_plan=plan_cache.get):
+    plandata = load_plan(path)
+    return flatten_plan(
+        plandata.to_repayment_plan(),
+        plandata.principal_asset.to_hex(),
+        plandata.collateral_asset.to_hex(),
+    )
+
+
+def load_contract_key(path):
+    data = contract_data_cache.get(path)
+    start_block = data["start-block-num"]
+    return get_contract_id(data["tx"], start_block), start_block
+
+
+flat_plan_cache = FileCache(load_flat_plan)
+contract_key_cache = FileCache(load_contract_key)
+
+
+def scan_contracts(plans_dir, data_suffix=".cdata"):
+    """
+    The contracts in the directory, the plans with the contract data next
+    to them, as {contract id: (flat plan, start block)}
+    """
+    contracts = {}
+    for plan_file in pathlib.Path(plans_dir).glob("*.plan"):
+        data_file = plan_file.with_suffix(data_suffix)
+        if not data_file.exists():
+            continue
+        try:
+            contract_id, start_block = contract_key_cache.get(data_file)
+            contracts[contract_id] = (
+                flat_plan_cache.get(plan_file), start_block
+            )
+        except Exception:
+            continue
+    return contracts
+
+
+class Portfolio:
+    """
+    The flattened plans of the contracts concatenated into one set of
+    arrays. They are concatenated again only if the contracts or their
+    plans change, when the contracts advance only their current stages
+    are updated.
+    """
+
+    def __init__(self):
+        self._contracts = {}
+        self._key = None
+        self._concat({})
+
+    def __len__(self):
+        return len(self._contracts)
+
+    def set_contracts(self, contracts):
+        """`contracts` maps the contract ids to (flat plan, start block)"""
+        key = tuple(
+            (contract_id, id(flat), start_block)
+            for contract_id, (flat, start_block) in sorted(contracts.items())
+        )
+        if key == self._key:
+            return False
+        self._key = key
+        self._contracts = dict(contracts)
+        self._concat(self._contracts)
+        return True
+
+    def _concat(self, contracts):
+        self._ids = list(contracts)
+        flats = [flat for flat, _ in contracts.values()]
+        self.principal_assets = sorted({f.principal_asset for f in flats})
+        self.collateral_assets = sorted({f.collateral_asset for f in flats})
+        sizes = np.array([len(f.period) for f in flats], np.int64)
+        self._offset = np.cumsum(sizes) - sizes
+        self._start_block = np.array(
+            [start_block for _, start_block in contracts.values()], np.int64
+        )
+        self._num_blocks = np.array(
+            [f.num_blocks_in_period for f in flats], np.int64
+        )
+        self._principal = np.array(
+            [self.principal_assets.index(f.principal_asset) for f in flats],
+            np.int64,
+        )
+        self._collateral = np.array(
+            [self.collateral_assets.index(f.collateral_asset) for f in flats],
+            np.int64,
+        )
+
+        def concat(field):
+            return np.concatenate(
+                [getattr(f, field) for f in flats] or [np.empty(0, np.int64)]
+            )
+
+        self._period = concat("period")
+        self._payment = concat("payment")
+        self._forfeited = concat("forfeited")
+        # the positions of the next stages are global after the shift
+        next_vstage = concat("next_vstage")
+        shift = np.repeat(self._offset, sizes)
+        self._next = np.where(next_vstage < 0, -1, next_vstage + shift)
+        # until the contract store has their stages, the contracts are at
+        # their first stage
+        self._current = self._offset.copy()
+        self.num_tracked = 0
+
+    def set_positions(self, positions):
+        """
+        Update the current stages from the `contract_positions()` of the
+        contract store, the finished contracts are left out. The store has
+        the stages found when the contract was last tracked, `num_tracked`
+        is the number of the contracts it has any for.
+        """
+        vstage = np.zeros(len(self._ids), np.int64)
+        self.num_tracked = 0
+        for num, contract_id in enumerate(self._ids):
+            position, finished = positions.get(contract_id, (None, False))
+            if finished:
+                vstage[num] = -1
+            elif position is not None:
+                vstage[num] = position
+            if finished or position is not None:
+                self.num_tracked += 1
+        current = np.where(vstage < 0, -1, self._offset + vstage)
+        if np.array_equal(current, self._current):
+            return False
+        self._current = current
+        return True
+
+    def project(self, current_block, window_blocks, num_windows):
+        """
+        The scheduled payments per principal asset and the collateral per
+        collateral asset the Creditor can grab if the payments due in the
+        window are missed, as arrays of (assets, windows). The window of a
+        payment is the one its payment window ends in, the overdue payments
+        are in the first window.
+        """
+        inflows = np.zeros(len(self.principal_assets) * num_windows, np.int64)
+        at_risk = np.zeros(len(self.collateral_assets) * num_windows, np.int64)
+        contracts = np.flatnonzero(self._current >= 0)
+        current = self._current[contracts]
+        num_contracts = len(contracts)
+        # every pass moves all the contracts one payment along the schedule
+        while len(contracts):
+            deadline = (
+                self._start_block[contracts]
+                + self._period[current] * self._num_blocks[contracts]
+            )
+            window = np.maximum((deadline - current_block) // window_blocks, 0)
+            inside = window < num_windows
+            c, w, v = contracts[inside], window[inside], current[inside]
+            inflows += np.bincount(
+                self._principal[c] * num_windows + w,
+                weights=self._payment[v], minlength=len(inflows),
+            ).astype(np.int64)
+            at_risk += np.bincount(
+                self._collateral[c] * num_windows + w,
+                weights=self._forfeited[v], minlength=len(at_risk),
+            ).astype(np.int64)
+            # the deadlines only grow along the schedule
+            current = self._next[v]
+            keep = current >= 0
+            contracts, current = c[keep], current[keep]
+        return Projection(
+            current_block,
+            window_blocks,
+            num_contracts,
+            self.principal_assets,
+            inflows.reshape(-1, num_windows),
+            self.collateral_assets,
+            at_risk.reshape(-1, num_windows),
+        )
@@ -0,0 +1,246 @@
+# Copyright (c) 2020-2021 Rugged Bytes IT-Services GmbH
+# Distributed under the MIT software license, see the accompanying
+# file COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+"""
+Reads the transaction ids and the spent outpoints straight from the
+serialized Elements blocks. The transactions are not deserialized: the
+rangeproofs, surjection proofs and witnesses are skipped over in the
+memoryview of the block, and the txid is hashed from the slices of it.
+"""
+
+import hashlib
+import http.client
+import struct
+from urllib.parse import urlsplit
+
+from .chain_backend import ChainBackendError
+from .spend_index import Block, BlockTx
+
+DYNAFED_HF_MASK = 0x80000000
+OUTPOINT_ISSUANCE_FLAG = 1 << 31
+OUTPOINT_PEGIN_FLAG = 1 << 30
+OUTPOINT_INDEX_MASK = 0x3FFFFFFF
+NULL_INDEX = 0xFFFFFFFF
+
+_uint32 = struct.Struct("<I")
+
+
+class BlockParseError(ChainBackendError):
+    pass
+
+
+class Reader:
+    __slots__ = ("buf", "pos")
+
+    def __init__(self, buf, pos=0):
+        self.buf = buf
+        self.pos = pos
+
+    def skip(self, size):
+        self.pos += size
+        if self.pos > len(self.buf):
+            raise BlockParseError("unexpected end of data")
+
+    def read(self, size):
+        start = self.pos
+        self.skip(size)
+        return self.buf[start:self.pos]
+
+    def uint32(self):
+        start = self.pos
+        self.skip(4)
+        return _uint32.unpack_from(self.buf, start)[0]
+
+    def varint(self):
+        start = self.pos
+        self.skip(1)
+        prefix = self.buf[start]
+        if prefix < 0xFD:
+            return prefix
+        size = {0xFD: 2, 0xFE: 4, 0xFF: 8}[prefix]
+        return int.from_bytes(self.read(size), "little")
+
+    def skip_varbytes(self):
+        self.skip(self.varint())
+
+    def skip_stack(self):
+        for _ in range(self.varint()):
+            self.skip_varbytes()
+
+    def skip_confidential(self, explicit_size):
+        """Skip confidential asset, value or nonce"""
+        start = self.pos
+        self.skip(1)
+        prefix = self.buf[start]
+        if prefix == 0:
+            return
+        if prefix == 1:
+            self.skip(explicit_size)
+        else:
+            self.skip(32)
+
+
+def sha256d(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part)
+    return hashlib.sha256(h.digest()).digest()
+
+
+def b2lx(data):
+    return bytes(data[::-1]).hex()
+
+
+def skip_dynafed_params_entry(r):
+    serialize_type = r.read(1)[0]
+    if serialize_type == 0:
+        return
+    r.skip_varbytes()  # signblockscript
+    r.skip(4)  # signblock witness limit
+    if serialize_type == 1:
+        r.skip(32)  # elided root
+    elif serialize_type == 2:
+        r.skip_varbytes()  # fedpeg program
+        r.skip_varbytes()  # fedpegscript
+        r.skip_stack()  # extension space
+    else:
+        raise BlockParseError(f"unknown dynafed params type {serialize_type}")
+
+
+def skip_header(r, signed_blocks):
+    version = r.uint32()
+    r.skip(32 + 32 + 4 + 4)  # prev, merkle root, time, height
+    if version & DYNAFED_HF_MASK:
+        skip_dynafed_params_entry(r)  # current
+        skip_dynafed_params_entry(r)  # proposed
+        r.skip_stack()  # signblock witness
+    elif signed_blocks:
+        r.skip_varbytes()  # challenge
+        r.skip_varbytes()  # solution
+    else:
+        r.skip(4 + 4)  # bits, nonce
+
+
+def read_tx(r):
+    """The txid and the list of the (txid, vout) spent by the transaction"""
+    start = r.pos
+    r.skip(4)  # version
+    flags = r.read(1)[0]
+    body_start = r.pos
+    inputs = []
+    num_inputs = r.varint()
+    for _ in range(num_inputs):
+        prev_hash = r.read(32)
+        prev_n = r.uint32()
+        r.skip_varbytes()  # scriptSig
+        r.skip(4)  # sequence
+        if prev_n == NULL_INDEX:
+            continue
+        if prev_n & OUTPOINT_ISSUANCE_FLAG:
+            r.skip(32 + 32)  # nonce, entropy
+            r.skip_confidential(8)  # amount
+            r.skip_confidential(8)  # inflation keys
+        if not prev_n & OUTPOINT_PEGIN_FLAG:
+            inputs.append((b2lx(prev_hash), prev_n & OUTPOINT_INDEX_MASK))
+    num_outputs = r.varint()
+    for _ in range(num_outputs):
+        r.skip_confidential(32)  # asset
+        r.skip_confidential(8)  # value
+        r.skip_confidential(32)  # nonce
+        r.skip_varbytes()  # scriptPubKey
+    r.skip(4)  # locktime
+    body_end = r.pos
+
+    if flags & 1:
+        for _ in range(num_inputs):
+            r.skip_varbytes()  # issuance amount rangeproof
+            r.skip_varbytes()  # inflation keys rangeproof
+            r.skip_stack()  # script witness
+            r.skip_stack()  # pegin witness
+        for _ in range(num_outputs):
+            r.skip_varbytes()  # surjection proof
+            r.skip_varbytes()  # rangeproof
+
+    # txid is the hash of the serialization without the witness
+    txid = sha256d(
+        r.buf[start:start + 4], b"\x00", r.buf[body_start:body_end]
+    )
+    return b2lx(txid), inputs
+
+
+def read_block_txs(buf, signed_blocks):
+    r = Reader(buf)
+    skip_header(r, signed_blocks)
+    txs = [BlockTx(*read_tx(r)) for _ in range(r.varint())]
+    if r.pos != len(buf):
+        raise BlockParseError("extra data after the transactions")
+    return txs
+
+
+def parse_block(raw, height, block_hash):
+    """
+    Read the block from bytes. The header can be dynafed, signed or PoW,
+    the format that reads the whole block is the right one.
+    """
+    buf = memoryview(raw)
+    prev_hash = b2lx(buf[4:36])
+    for signed_blocks in (True, False):
+        try:
+            txs = read_block_txs(buf, signed_blocks)
+        except BlockParseError:
+            continue
+        return Block(height, block_hash, prev_hash, txs)
+    raise BlockParseError(f"can not parse block {block_hash}")
+
+
+class RawBlockSource:
+    """
+    Fetches the serialized blocks with `getblock <hash> 0`, or from the
+    REST interface of the node (`/rest/block/<hash>.bin`) if `rest_url`
+    is given, the node must be started with `-rest` then
+    """
+
+    def __init__(self, rpc, rest_url=None, timeout=30):
+        self._rpc = rpc
+        self._rest = None
+        if rest_url:
+            parts = urlsplit(rest_url)
+            self._rest = (parts.netloc, parts.path.rstrip("/"))
+        self._timeout = timeout
+        self._connection = None
+
+    def get_tip_height(self):
+        return self._rpc.getblockcount()
+
+    def get_raw_block(self, block_hash):
+        if self._rest is None:
+            return bytes.fromhex(self._rpc.getblock(block_hash, 0))
+
+        netloc, path = self._rest
+        for attempt in range(2):
+            if self._connection is None:
+                self._connection = http.client.HTTPConnection(
+                    netloc, timeout=self._timeout
+                )
+            try:
+                self._connection.request(
+                    "GET", f"{path}/rest/block/{block_hash}.bin"
+                )
+                response = self._connection.getresponse()
+                raw = response.read()
+            except (http.client.HTTPException, OSError):
+                self._connection.close()
+                self._connection = None
+                if attempt:
+                    raise
+                continue
+            if response.status != 200:
+                raise BlockParseError(
+                    f"{block_hash}: {response.status} {raw[:100]}"
+                )
+            return raw
+
+    def get_block(self, height):
+        block_hash = self._rpc.getblockhash(height)
+        return parse_block(self.get_raw_block(block_hash), height, block_hash)
@@ -0,0 +1,22 @@
+# Copyright (c) 2020-2021 Rugged Bytes IT-Services GmbH
+# Distributed under the MIT software license, see the accompanying
+# file COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+from PyQt5.QtWidgets import QApplication
+
+
+def get_app(obj=None):
+    """
+    The role the object belongs to. It is the LoanApp when the role runs
+    in its own process. In the LoanHost it is the role of the window the
+    object is in, or the role whose window is being created.
+    """
+    app = QApplication.instance()
+    if not hasattr(app, "roles"):
+        return app
+    while obj is not None:
+        role = getattr(obj, "loan_role", None)
+        if role is not None:
+            return role
+        obj = obj.parent()
+    return app.current_role
@@ -0,0 +1,215 @@
+# Copyright (c) 2020-2021 Rugged Bytes IT-Services GmbH
+# Distributed under the MIT software license, see the accompanying
+# file COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+"""
+Monte Carlo simulation of the repayment paths of the plans. In every
+period the Debtor pays the regular payment, pays the whole debt early, or
+is late, with the given probabilities. Being late in the last vertical
+stage of a lateral stage is a default, and the Creditor grabs the
+collateral. All the paths of a plan advance together, one period per
+vectorized pass over the flattened plan, and only the number of paths
+that ended in every stage is kept: the path to a stage is unique in the
+tree, so the amounts paid on it are known from the stage.
+"""
+
+import multiprocessing
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# the paths ending with the final payment, with an early full payment and
+# with the collateral grabbed
+ENDS = ("repaid", "early", "default")
+
+OUTCOMES = ("on schedule", "after late", "early", "default")
+
+CHUNK_PATHS = 1000000
+
+Distribution = namedtuple("Distribution", "values probabilities")
+
+SimulationResult = namedtuple(
+    "SimulationResult",
+    "num_paths outcomes creditor_yield collateral_loss mean_periods",
+)
+
+
+def period_probabilities(probabilities, num_periods):
+    """
+    The probabilities indexed by the period, from 1; the last given one is
+    used for the rest of the periods
+    """
+    probabilities = np.atleast_1d(np.asarray(probabilities, np.float64))
+    result = np.empty(num_periods + 1, np.float64)
+    result[0] = 0
+    result[1:] = probabilities[-1]
+    num = min(len(probabilities), num_periods)
+    result[1:num + 1] = probabilities[:num]
+    return result
+
+
+def simulate_paths(flat, pay, early, num_paths, seed=None):
+    """
+    Sample `num_paths` paths from the first stage, returns the number of
+    paths ending in every stage, as an array of (len(ENDS), stages)
+    """
+    rng = np.random.default_rng(seed)
+    num_periods = int(flat.period.max())
+    pay = period_probabilities(pay, num_periods)
+    early = period_probabilities(early, num_periods)
+    counts = np.zeros((len(ENDS), len(flat.period)), np.int64)
+    vstage = np.zeros(num_paths, np.int64)
+    # every pass is one period, so there are at most `num_periods` passes
+    while len(vstage):
+        period = flat.period[vstage]
+        draw = rng.random(len(vstage))
+        is_early = draw < early[period]
+        is_paid = ~is_early & (draw < early[period] + pay[period])
+        is_late = ~(is_early | is_paid)
+        is_final = flat.next_vstage[vstage] < 0
+        late_vstage = flat.late_vstage[vstage]
+        ends = (
+            (is_paid | is_early) & is_final,
+            is_early & ~is_final,
+            is_late & (late_vstage < 0),
+        )
+        for num, end in enumerate(ends):
+            counts[num] += np.bincount(
+                vstage[end], minlength=len(flat.period)
+            )
+        vstage = np.concatenate((
+            flat.next_vstage[vstage[is_paid & ~is_final]],
+            late_vstage[is_late & (late_vstage >= 0)],
+        ))
+    return counts
+
+
+def path_amounts(flat):
+    """
+    The principal paid before every stage on the path to it, and whether
+    the Debtor was late on that path
+    """
+    paid = np.zeros(len(flat.period), np.int64)
+    was_late = np.zeros(len(flat.period), bool)
+    # each pass settles the stages one period further from the start
+    for _ in range(int(flat.period.max())):
+        has_next = flat.next_vstage >= 0
+        paid[flat.next_vstage[has_next]] = (
+            paid[has_next] + flat.payment[has_next]
+        )
+        was_late[flat.next_vstage[has_next]] = was_late[has_next]
+        has_late = flat.late_vstage >= 0
+        paid[flat.late_vstage[has_late]] = paid[has_late]
+        was_late[flat.late_vstage[has_late]] = True
+    return paid, was_late
+
+
+def make_distribution(values, counts):
+    values, inverse = np.unique(values, return_inverse=True)
+    weights = np.bincount(inverse.ravel(), weights=counts.ravel())
+    return Distribution(values, weights / weights.sum())
+
+
+def summarize(flat, counts):
+    """The distributions of the outcomes of the counted paths"""
+    repaid, early, default = counts
+    num_paths = int(counts.sum())
+    paid, was_late = path_amounts(flat)
+    outcomes = {
+        "on schedule": repaid[~was_late].sum() / num_paths,
+        "after late": repaid[was_late].sum() / num_paths,
+        "early": early.sum() / num_paths,
+        "default": default.sum() / num_paths,
+    }
+    received = np.stack((paid + flat.payment, paid + flat.early, paid))
+    creditor_yield = make_distribution(
+        received / flat.principal_amount - 1, counts
+    )
+    lost = np.stack((np.zeros_like(paid), np.zeros_like(paid), flat.forfeited))
+    collateral_loss = make_distribution(lost, counts)
+    mean_periods = (counts * flat.period).sum() / num_paths
+    return SimulationResult(
+        num_paths, outcomes, creditor_yield, collateral_loss, mean_periods
+    )
+
+
+def mean(distribution):
+    return float(
+        (distribution.values * distribution.probabilities).sum()
+    )
+
+
+def quantile(distribution, q):
+    cumulative = np.cumsum(distribution.probabilities)
+    num = np.searchsorted(cumulative, q * cumulative[-1])
+    return distribution.values[min(num, len(distribution.values) - 1)]
+
+
+def split_paths(num_paths, chunk_paths=CHUNK_PATHS):
+    chunks = [chunk_paths] * (num_paths // chunk_paths)
+    if num_paths % chunk_paths:
+        chunks.append(num_paths % chunk_paths)
+    return chunks
+
+
+def simulate_plans(flats, num_paths, pay, early, jobs=None, seed=None,
+                   chunk_paths=CHUNK_PATHS):
+    """
+    Simulate `num_paths` paths of every plan in `jobs` processes, the paths
+    are split into chunks so that one plan uses all the processes too.
+    Returns the results in the order of `flats`.
+    """
+    tasks = [
+        (num, chunk)
+        for num in range(len(flats))
+        for chunk in split_paths(num_paths, chunk_paths)
+    ]
+    seeds = np.random.SeedSequence(seed).spawn(len(tasks))
+    args = [
+        (flats[num], pay, early, chunk, chunk_seed)
+        for (num, chunk), chunk_seed in zip(tasks, seeds)
+    ]
+    counts = [np.zeros((len(ENDS), len(flat.period)), np.int64)
+              for flat in flats]
+    if jobs == 1:
+        for (num, _), task_args in zip(tasks, args):
+            counts[num] += simulate_paths(*task_args)
+    else:
+        # the workers must not inherit the state of Qt from the GUI
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(
+            max_workers=jobs, mp_context=context
+        ) as executor:
+            futures = [
+                executor.submit(simulate_paths, *task_args)
+                for task_args in args
+            ]
+            for (num, _), future in zip(tasks, futures):
+                counts[num] += future.result()
+    return [summarize(flat, c) for flat, c in zip(flats, counts)]
+
+
+def format_result(result):
+    """The lines of the summary of the simulation of one plan"""
+    creditor_yield = result.creditor_yield
+    collateral_loss = result.collateral_loss
+    lines = [
+        f"paths: {result.num_paths}",
+        *(
+            f"{outcome}: {result.outcomes[outcome] * 100:.2f} %"
+            for outcome in OUTCOMES
+        ),
+        f"mean periods: {result.mean_periods:.2f}",
+        f"creditor yield: mean {mean(creditor_yield) * 100:.2f} %, "
+        + ", ".join(
+            f"p{round(q * 100)} {quantile(creditor_yield, q) * 100:.2f} %"
+            for q in (0.01, 0.05, 0.5, 0.95)
+        ),
+        f"debtor collateral loss: mean {mean(collateral_loss):.0f}, "
+        + ", ".join(
+            f"p{round(q * 100)} {quantile(collateral_loss, q):.0f}"
+            for q in (0.5, 0.95, 0.99)
+        ),
+    ]
+    return lines
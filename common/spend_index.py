@@ -0,0 +1,276 @@
+# Copyright (c) 2020-2021 Rugged Bytes IT-Services GmbH
+# Distributed under the MIT software license, see the accompanying
+# file COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+import sqlite3
+import threading
+from collections import namedtuple
+
+from bitcointx.rpc import JSONRPCError
+
+from .block_prefetch import prefetch_blocks
+from .chain_backend import UNSPENT, ChainBackendError, Outspend
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS spends (
+    txid TEXT NOT NULL,
+    vout INTEGER NOT NULL,
+    spending_txid TEXT NOT NULL,
+    vin INTEGER NOT NULL,
+    block_height INTEGER NOT NULL,
+    PRIMARY KEY (txid, vout)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS spends_height ON spends (block_height);
+CREATE TABLE IF NOT EXISTS blocks (
+    height INTEGER PRIMARY KEY,
+    hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tracked (
+    txid TEXT PRIMARY KEY
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS covered (
+    txid TEXT NOT NULL,
+    vout INTEGER NOT NULL,
+    PRIMARY KEY (txid, vout)
+) WITHOUT ROWID;
+"""
+
+# the blocks kept to detect reorgs
+KEEP_BLOCKS = 100
+
+# more blocks than this are ingested with `catch_up()` in the background
+CATCHUP_BLOCKS = 20
+
+# `inputs` are the (txid, vout) pairs of the outpoints spent by the tx
+BlockTx = namedtuple("BlockTx", "txid inputs")
+Block = namedtuple("Block", "height hash prev_hash txs")
+
+
+def block_from_json(height, block_hash, block):
+    return Block(
+        height,
+        block_hash,
+        block.get("previousblockhash"),
+        [
+            BlockTx(
+                tx["txid"],
+                [
+                    (inp["txid"], inp["vout"])
+                    for inp in tx["vin"]
+                    if "coinbase" not in inp
+                ],
+            )
+            for tx in block["tx"]
+        ],
+    )
+
+
+class RPCBlockSource:
+    """Fetches the blocks with `getblock` in the verbose JSON form"""
+
+    def __init__(self, rpc):
+        self._rpc = rpc
+
+    def get_tip_height(self):
+        return self._rpc.getblockcount()
+
+    def get_block(self, height):
+        block_hash = self._rpc.getblockhash(height)
+        return block_from_json(
+            height, block_hash, self._rpc.getblock(block_hash, 2)
+        )
+
+
+class SpendIndex:
+    """
+    Outpoint -> spending transaction index, fed by ingesting every block
+    once. In the pruned mode only the spends of the outputs of tracked
+    transactions are kept. The index starts from the tip at the time it
+    was created, so the outpoint is `covered` by the index only after
+    it was checked to be unspent at some point while the blocks were
+    ingested.
+    """
+
+    def __init__(self, path, pruned=True):
+        self.pruned = pruned
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.executescript(SCHEMA)
+        self._tracked = {
+            txid for txid, in self._db.execute("SELECT txid FROM tracked")
+        }
+
+    def tip(self):
+        """The height and the hash of the last ingested block"""
+        with self._lock:
+            return self._db.execute(
+                "SELECT height, hash FROM blocks ORDER BY height DESC LIMIT 1"
+            ).fetchone()
+
+    def track(self, txid):
+        if txid in self._tracked:
+            return
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR IGNORE INTO tracked (txid) VALUES (?)", (txid,)
+            )
+            self._tracked.add(txid)
+
+    def get(self, txid, vout):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT spending_txid, vin, block_height FROM spends"
+                " WHERE txid = ? AND vout = ?",
+                (txid, vout),
+            ).fetchone()
+        if row is None:
+            return None
+        return Outspend(True, *row)
+
+    def is_covered(self, txid, vout):
+        if self.pruned and txid not in self._tracked:
+            return False
+        with self._lock:
+            return self._db.execute(
+                "SELECT 1 FROM covered WHERE txid = ? AND vout = ?",
+                (txid, vout),
+            ).fetchone() is not None
+
+    def set_covered(self, txid, vout):
+        if self.pruned and txid not in self._tracked:
+            return
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR IGNORE INTO covered (txid, vout) VALUES (?, ?)",
+                (txid, vout),
+            )
+
+    def ingest(self, block):
+        """
+        Add the spends from the block, the block must be the next one
+        after the tip, returns False if it is not (the tip was reorged)
+        """
+        spends = []
+        for tx in block.txs:
+            for vin, (txid, vout) in enumerate(tx.inputs):
+                if self.pruned and txid not in self._tracked:
+                    continue
+                spends.append((txid, vout, tx.txid, vin, block.height))
+
+        with self._lock, self._db:
+            tip = self._db.execute(
+                "SELECT height, hash FROM blocks ORDER BY height DESC LIMIT 1"
+            ).fetchone()
+            if tip is not None and tip != (block.height - 1, block.prev_hash):
+                return False
+            self._db.executemany(
+                "INSERT OR REPLACE INTO spends (txid, vout, spending_txid,"
+                " vin, block_height) VALUES (?, ?, ?, ?, ?)",
+                spends,
+            )
+            self._db.execute(
+                "INSERT INTO blocks (height, hash) VALUES (?, ?)",
+                (block.height, block.hash),
+            )
+            self._db.execute(
+                "DELETE FROM blocks WHERE height <= ?",
+                (block.height - KEEP_BLOCKS,),
+            )
+        return True
+
+    def rollback(self):
+        """Forget the last ingested block"""
+        with self._lock, self._db:
+            tip = self._db.execute("SELECT MAX(height) FROM blocks").fetchone()
+            if tip[0] is None:
+                return
+            self._db.execute(
+                "DELETE FROM spends WHERE block_height >= ?", tip
+            )
+            self._db.execute("DELETE FROM blocks WHERE height >= ?", tip)
+            # the outputs might have been spent in the forgotten blocks
+            self._db.execute("DELETE FROM covered")
+
+
+class IndexBackend:
+    """
+    Answers from the spend index, after ingesting the blocks up to
+    the tip. The outpoints not covered by the index are checked with the
+    `fallback` backend once. `make_block_source` creates the block sources
+    for the threads that catch up with the tip.
+    """
+
+    def __init__(self, index, block_source, fallback, make_block_source):
+        self.index = index
+        self._source = block_source
+        self._fallback = fallback
+        self._make_block_source = make_block_source
+
+    def track(self, txid):
+        self.index.track(txid)
+
+    def get_tip_height(self):
+        return self._fallback.get_tip_height()
+
+    def needs_catchup(self, tip_height):
+        index_tip = self.index.tip()
+        return (
+            index_tip is not None
+            and tip_height - index_tip[0] > CATCHUP_BLOCKS
+        )
+
+    def catch_up(self, tip_height, progress, is_cancelled, max_workers):
+        """
+        Ingest the blocks up to `tip_height` fetched in parallel, stops
+        at the reorged block, `update()` will handle it
+        """
+        index_tip = self.index.tip()
+        if index_tip is None:
+            return
+        heights = range(index_tip[0] + 1, tip_height + 1)
+        blocks = prefetch_blocks(self._make_block_source, heights, max_workers)
+        try:
+            for num, block in enumerate(blocks, 1):
+                if is_cancelled() or not self.index.ingest(block):
+                    break
+                progress(num, len(heights))
+        except (JSONRPCError, OSError) as e:
+            raise ChainBackendError(f"{e}")
+        finally:
+            blocks.close()
+
+    def update(self):
+        try:
+            tip_height = self._source.get_tip_height()
+            index_tip = self.index.tip()
+            if index_tip is None:
+                # start from the current tip
+                self.index.ingest(self._source.get_block(tip_height))
+                return
+            if self.needs_catchup(tip_height):
+                raise ChainBackendError(
+                    f"spend index is {tip_height - index_tip[0]} blocks "
+                    f"behind, it needs to catch up"
+                )
+            height = index_tip[0] + 1
+            while height <= tip_height:
+                if self.index.ingest(self._source.get_block(height)):
+                    height += 1
+                else:
+                    self.index.rollback()
+                    height -= 1
+        except (JSONRPCError, OSError) as e:
+            raise ChainBackendError(f"{e}")
+
+    def get_outspend(self, txid, vout):
+        self.update()
+        outspend = self.index.get(txid, vout)
+        if outspend is not None:
+            return outspend
+        if self.index.is_covered(txid, vout):
+            return UNSPENT
+        outspend = self._fallback.get_outspend(txid, vout)
+        if not outspend.spent:
+            # the later spends will be ingested
+            self.index.set_covered(txid, vout)
+        return outspend
@@ -0,0 +1,298 @@
+# Copyright (c) 2020-2021 Rugged Bytes IT-Services GmbH
+# Distributed under the MIT software license, see the accompanying
+# file COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+import json
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+from PyQt5.QtCore import Qt, QTimer, qInfo
+from PyQt5.QtWidgets import (
+    QDockWidget,
+    QFileDialog,
+    QHBoxLayout,
+    QMessageBox,
+    QPushButton,
+    QTableWidget,
+    QTableWidgetItem,
+    QVBoxLayout,
+    QWidget,
+)
+
+from .roles import get_app
+
+# upper bounds of the latency buckets, in seconds
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+METRIC_NAMES = {
+    "rpc": ("loans_rpc_call", "method"),
+    "cli": ("loans_cli_process", "command"),
+}
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.errors = 0
+        self.sum = 0.0
+
+    def observe(self, seconds, ok):
+        for idx, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.buckets[idx] += 1
+                break
+        self.count += 1
+        self.sum += seconds
+        if not ok:
+            self.errors += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket where the quantile falls"""
+        rank = q * self.count
+        cumulative = 0
+        for bound, num in zip(LATENCY_BUCKETS, self.buckets):
+            cumulative += num
+            if cumulative >= rank:
+                return bound
+        return float("inf")
+
+
+class CallStats:
+    """
+    Counts and times the RPC calls (by method) and the CLI processes
+    (by tool and subcommand). Can be used from any thread.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def observe(self, kind, name, seconds, ok=True):
+        with self._lock:
+            histogram = self._histograms.get((kind, name))
+            if histogram is None:
+                histogram = self._histograms[(kind, name)] = LatencyHistogram()
+            histogram.observe(seconds, ok)
+
+    @contextmanager
+    def timed(self, kind, name):
+        start = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            self.observe(kind, name, time.perf_counter() - start, ok)
+
+    def snapshot(self):
+        with self._lock:
+            return [
+                (kind, name, histogram)
+                for (kind, name), histogram in sorted(self._histograms.items())
+            ]
+
+    def to_json(self):
+        return json.dumps(
+            [
+                {
+                    "kind": kind,
+                    "name": name,
+                    "count": histogram.count,
+                    "errors": histogram.errors,
+                    "sum": histogram.sum,
+                    "buckets": dict(zip(LATENCY_BUCKETS, histogram.buckets)),
+                }
+                for kind, name, histogram in self.snapshot()
+            ],
+            indent=4,
+        )
+
+    def to_prometheus(self):
+        lines = []
+        described = set()
+        for kind, name, histogram in self.snapshot():
+            metric, label = METRIC_NAMES[kind]
+            if kind not in described:
+                described.add(kind)
+                lines.append(f"# TYPE {metric}_seconds histogram")
+                lines.append(f"# TYPE {metric}_errors_total counter")
+            labels = f'{label}="{name}"'
+            cumulative = 0
+            for bound, num in zip(LATENCY_BUCKETS, histogram.buckets):
+                cumulative += num
+                lines.append(
+                    f'{metric}_seconds_bucket{{{labels},le="{bound}"}} '
+                    f"{cumulative}"
+                )
+            lines.append(
+                f'{metric}_seconds_bucket{{{labels},le="+Inf"}} '
+                f"{histogram.count}"
+            )
+            lines.append(f"{metric}_seconds_sum{{{labels}}} {histogram.sum}")
+            lines.append(
+                f"{metric}_seconds_count{{{labels}}} {histogram.count}"
+            )
+            lines.append(
+                f"{metric}_errors_total{{{labels}}} {histogram.errors}"
+            )
+        return "\n".join(lines) + "\n"
+
+    def export(self, target):
+        """
+        Write the stats to the file (JSON if the name ends with .json,
+        Prometheus text format otherwise), or send them to the local socket
+        if the target is "tcp:host:port" or "unix:path"
+        """
+        if target.endswith(".json"):
+            payload = self.to_json()
+        else:
+            payload = self.to_prometheus()
+
+        if target.startswith("tcp:"):
+            host, port = target[4:].rsplit(":", 1)
+            with socket.create_connection((host, int(port)), timeout=1) as s:
+                s.sendall(payload.encode("utf-8"))
+        elif target.startswith("unix:"):
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+                s.settimeout(1)
+                s.connect(target[5:])
+                s.sendall(payload.encode("utf-8"))
+        else:
+            with open(target, "w") as f:
+                f.write(payload)
+
+
+call_stats = CallStats()
+
+
+class StatsExporter(threading.Thread):
+    """
+    Exports the stats to the target in its own thread when asked, so a slow
+    file system or socket peer does not stall the window
+    """
+
+    def __init__(self, target):
+        super(StatsExporter, self).__init__(daemon=True)
+        self.target = target
+        self._requested = threading.Event()
+
+    def request(self):
+        self._requested.set()
+
+    def run(self):
+        while True:
+            self._requested.wait()
+            self._requested.clear()
+            try:
+                call_stats.export(self.target)
+            except OSError as e:
+                qInfo(f"Stats export to {self.target} failed: {e}\n")
+
+
+def cli_command_name(app, args):
+    tool = app.rsplit("/", 1)[-1]
+    if tool.endswith(".py"):
+        tool = tool[:-3]
+    return f"{tool} {args[0]}" if args else tool
+
+
+class StatsPanel(QDockWidget):
+    """Table of the call stats, refreshed periodically"""
+
+    COLUMNS = ("Kind", "Name", "Count", "Errors", "Mean ms", "p50 ms",
+               "p90 ms", "p99 ms")
+
+    def __init__(self, parent=None):
+        super(StatsPanel, self).__init__("Stats", parent)
+        self.setObjectName("statsPanel")
+        widget = QWidget(self)
+        vbox = QVBoxLayout(widget)
+        self.table = QTableWidget(0, len(self.COLUMNS), widget)
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        vbox.addWidget(self.table)
+        hbox = QHBoxLayout()
+        hbox.addStretch()
+        export_button = QPushButton("Export...", widget)
+        export_button.clicked.connect(self.export)
+        hbox.addWidget(export_button)
+        vbox.addLayout(hbox)
+        self.setWidget(widget)
+
+        app = get_app(self)
+        # optional target to export the stats to on every refresh, can be
+        # set for one run with LOANS_STATS_EXPORT, "{pid}" is replaced
+        target = os.environ.get(
+            "LOANS_STATS_EXPORT", app.common_settings.value("stats/export")
+        )
+        self._exporter = None
+        if target:
+            target = target.replace("{pid}", f"{os.getpid()}")
+            self._exporter = StatsExporter(target)
+            self._exporter.start()
+
+        self._timer = QTimer(self)
+        self._timer.setInterval(2000)
+        self._timer.timeout.connect(self.refresh)
+        self._timer.start()
+
+    def refresh(self):
+        if self._exporter is not None:
+            self._exporter.request()
+
+        if not self.isVisible():
+            return
+
+        snapshot = call_stats.snapshot()
+        self.table.setRowCount(len(snapshot))
+        for row, (kind, name, histogram) in enumerate(snapshot):
+            mean = histogram.sum / histogram.count if histogram.count else 0
+            values = (
+                kind,
+                name,
+                f"{histogram.count}",
+                f"{histogram.errors}",
+                f"{mean * 1000:.1f}",
+                *(
+                    f"{histogram.quantile(q) * 1000:g}"
+                    for q in (0.5, 0.9, 0.99)
+                ),
+            )
+            for column, value in enumerate(values):
+                self.table.setItem(row, column, QTableWidgetItem(value))
+
+    def export(self):
+        app = get_app(self)
+        file_name, _ = QFileDialog.getSaveFileName(
+            self, "Export Stats", str(app.path),
+            filter="Prometheus (*.prom);;JSON (*.json)",
+        )
+        if file_name:
+            try:
+                call_stats.export(file_name)
+            except OSError as e:
+                QMessageBox.critical(
+                    self, "Error", f"Stats export to {file_name} failed: {e}"
+                )
+
+
+def view_menu(window):
+    """The "View" menu of the window, added if it has none"""
+    for action in window.menuBar().actions():
+        if action.menu() is not None and action.text() == "View":
+            return action.menu()
+    return window.menuBar().addMenu("View")
+
+
+def add_stats_panel(window):
+    panel = StatsPanel(window)
+    window.addDockWidget(Qt.BottomDockWidgetArea, panel)
+    panel.hide()
+    view_menu(window).addAction(panel.toggleViewAction())
+    return panel
@@ -0,0 +1,205 @@
+# Copyright (c) 2020-2021 Rugged Bytes IT-Services GmbH
+# Distributed under the MIT software license, see the accompanying
+# file COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+from collections import defaultdict
+from decimal import Decimal
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+from bitcointx import ChainParams
+from bitcointx.core import CTransaction, b2lx, x
+from bitcointx.rpc import JSONRPCError
+
+COIN = Decimal(100000000)
+
+
+class Resync(Exception):
+    """The change can not be applied to the view, it is read again"""
+
+
+class WalletSync(QObject):
+    """
+    Keeps the view of the wallet UTXOs, locked or not, and the per-asset
+    balances. The view is read once with `listunspent`, then every
+    `interval` ms the wallet is asked with `listsinceblock` for the
+    transactions since the last seen block, and only the new, dropped or
+    reorged ones are applied to it: their outputs of the wallet are added
+    and the outputs they spend are removed, or the other way round.
+    An idle wallet costs one `listsinceblock` per interval.
+    """
+
+    changed = pyqtSignal()
+
+    def __init__(self, rpc, network, interval=2000, parent=None):
+        super(WalletSync, self).__init__(parent)
+        self._rpc = rpc
+        self._network = network
+        self._last_block = None
+        self._pending_txids = set()
+        # txid: (the wallet outputs it added, the UTXOs it spent), None
+        # for the transactions that were in the view when it was read
+        self._applied = {}
+        self.utxos = {}
+        self.balances = {}
+        self._timer = QTimer(self)
+        self._timer.setInterval(interval)
+        self._timer.timeout.connect(self.sync)
+        self._timer.start()
+        self.sync()
+
+    def balance(self, asset_hex):
+        return self.balances.get(asset_hex, 0)
+
+    def sync(self):
+        if self._last_block is None:
+            self.refresh()
+            return
+        try:
+            result = self._rpc.listsinceblock(self._last_block, 1, False, True)
+            is_changed = self.apply(result)
+        except (JSONRPCError, ValueError, Resync):
+            # read the view again on the next sync
+            self._last_block = None
+            return
+        self._last_block = result["lastblock"]
+        if is_changed:
+            self._update_balances()
+
+    def apply(self, result):
+        """Apply the `listsinceblock` result, returns True if it changed"""
+        confirmations = {
+            tx["txid"]: tx["confirmations"] for tx in result["transactions"]
+        }
+        in_wallet = {
+            txid for txid, num in confirmations.items() if num >= 0
+        }
+        # reorged or dropped from the mempool, they were in the view
+        gone = {tx["txid"] for tx in result.get("removed", [])}
+        gone |= self._pending_txids - in_wallet
+        # conflicted, listed every time
+        gone |= {
+            txid for txid in set(confirmations) - in_wallet
+            if txid in self._applied
+        }
+        is_changed = False
+        for txid in gone:
+            applied = self._applied.pop(txid, None)
+            if applied is None:
+                raise Resync(txid)
+            outputs, spent = applied
+            for outpoint in outputs:
+                self.utxos.pop(outpoint, None)
+            self.utxos.update(spent)
+            is_changed = True
+
+        new_txs = [
+            self.read_tx(txid) for txid in in_wallet
+            if txid not in self._applied
+        ]
+        # the outputs first, a new transaction can spend another one
+        for txid, outputs, prevouts in new_txs:
+            self.utxos.update(outputs)
+        for txid, outputs, prevouts in new_txs:
+            spent = {
+                outpoint: self.utxos.pop(outpoint) for outpoint in prevouts
+                if outpoint in self.utxos
+            }
+            self._applied[txid] = (outputs, spent)
+            is_changed = True
+        self._pending_txids = {
+            txid for txid, num in confirmations.items() if num == 0
+        }
+        return is_changed
+
+    def read_tx(self, txid):
+        """
+        The wallet outputs of the transaction as {(txid, vout): (asset,
+        amount)}, and the outpoints it spends. The outputs the wallet can
+        unblind are its own, the others are its own if they are listed.
+        """
+        wallet_tx = self._rpc.gettransaction(txid)
+        unblinded_hex = self._rpc.unblindrawtransaction(wallet_tx["hex"])
+        listed = {
+            detail["vout"] for detail in wallet_tx["details"]
+            if detail["category"] in ("receive", "generate", "immature")
+        }
+        with ChainParams(self._network):
+            tx = CTransaction.deserialize(x(wallet_tx["hex"]))
+            unblinded = CTransaction.deserialize(x(unblinded_hex["hex"]))
+        outputs = {}
+        for n, (txout, unblinded_txout) in enumerate(
+            zip(tx.vout, unblinded.vout)
+        ):
+            if not txout.scriptPubKey:
+                # the fee
+                continue
+            if txout.nValue.is_explicit() and n not in listed:
+                continue
+            if not unblinded_txout.nValue.is_explicit():
+                continue
+            outputs[(txid, n)] = (
+                unblinded_txout.nAsset.to_asset().to_hex(),
+                Decimal(unblinded_txout.nValue.to_amount()) / COIN,
+            )
+        prevouts = [
+            (b2lx(txin.prevout.hash), txin.prevout.n) for txin in tx.vin
+        ]
+        return txid, outputs, prevouts
+
+    def refresh(self):
+        """Read the whole view again"""
+        try:
+            last_block = self._rpc.getbestblockhash()
+            pending = self._rpc.listsinceblock(last_block, 1, False, True)
+            unspent = self._rpc.listunspent(0)
+            # listunspent leaves out the locked UTXOs
+            locked = [
+                (utxo["txid"], utxo["vout"])
+                for utxo in self._rpc.listlockunspent()
+            ]
+            locked_utxos = {
+                outpoint: self.locked_amount(*outpoint)
+                for outpoint in locked
+            }
+        except JSONRPCError:
+            # try again on the next sync
+            self._last_block = None
+            return
+
+        self.utxos = {
+            (utxo["txid"], utxo["vout"]): (utxo["asset"], utxo["amount"])
+            for utxo in unspent
+        }
+        self.utxos.update(
+            (outpoint, asset_amount)
+            for outpoint, asset_amount in locked_utxos.items()
+            if asset_amount is not None
+        )
+        self._pending_txids = {
+            tx["txid"] for tx in pending["transactions"]
+            if tx["confirmations"] == 0
+        }
+        self._applied = dict.fromkeys(self._pending_txids)
+        self._last_block = pending["lastblock"]
+        self._update_balances()
+
+    def locked_amount(self, txid, vout):
+        """The asset and amount of the locked UTXO, None if it is spent"""
+        if self._rpc.gettxout(txid, vout, True) is None:
+            return None
+        details = self._rpc.gettransaction(txid)["details"]
+        return next(
+            (
+                (detail["asset"], detail["amount"]) for detail in details
+                if detail["vout"] == vout and detail["amount"] > 0
+            ),
+            None,
+        )
+
+    def _update_balances(self):
+        balances = defaultdict(int)
+        for asset, amount in self.utxos.values():
+            balances[asset] += amount
+        self.balances = dict(balances)
+        self.changed.emit()
@@ -0,0 +1,210 @@
+# Copyright (c) 2020-2021 Rugged Bytes IT-Services GmbH
+# Distributed under the MIT software license, see the accompanying
+# file COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+import json
+import pathlib
+import time
+from collections import defaultdict, namedtuple
+
+from PyQt5.QtCore import (
+    QFileSystemWatcher,
+    QObject,
+    QTimer,
+    pyqtSignal,
+    pyqtSlot,
+    qInfo,
+)
+from PyQt5.QtWidgets import QFileDialog
+
+from .cli_pool import CLIProcessPool
+from .roles import get_app
+
+# The step is ready when the files with all `inputs` suffixes exist for
+# the plan, and none of the files with `outputs` suffixes exist yet
+PipelineStep = namedtuple("PipelineStep", "name inputs outputs")
+
+# The order in which the files appear while the contract is being set up
+SETUP_SUFFIXES = (
+    "plan",
+    "cinfo",
+    "dinfo",
+    "tx",
+    "cdata",
+    "ddata",
+    "csignature",
+    "dsignature",
+    "stx",
+)
+
+METRICS_NAME = "pipeline_metrics.json"
+
+
+def scan_plan_files(directory):
+    plan_files = defaultdict(set)
+    for path in pathlib.Path(directory).iterdir():
+        if path.suffix and path.is_file():
+            plan_files[path.stem].add(path.suffix[1:])
+    return plan_files
+
+
+def setup_times(directory, plan_name):
+    """
+    Seconds from the creation of the plan file to the appearance of each
+    of the files for this plan, judging by the modification times
+    """
+    directory = pathlib.Path(directory)
+    try:
+        start = (directory / f"{plan_name}.plan").stat().st_mtime
+    except FileNotFoundError:
+        return {}
+
+    times = {}
+    for suffix in SETUP_SUFFIXES[1:]:
+        try:
+            mtime = (directory / f"{plan_name}.{suffix}").stat().st_mtime
+        except FileNotFoundError:
+            continue
+        times[suffix] = round(mtime - start, 3)
+    return times
+
+
+def write_setup_metrics(directory, plan_name):
+    """
+    Record the setup times for the plan in `pipeline_metrics.json`
+    and return the end-to-end setup time (until the signed transaction
+    was created)
+    """
+    metrics_path = pathlib.Path(directory) / METRICS_NAME
+    try:
+        with open(metrics_path) as f:
+            metrics = json.load(f)
+    except (FileNotFoundError, json.decoder.JSONDecodeError):
+        metrics = {}
+
+    times = setup_times(directory, plan_name)
+    metrics[plan_name] = times
+    with open(metrics_path, "w") as f:
+        json.dump(metrics, f, indent=4, sort_keys=True)
+    return times.get("stx")
+
+
+class PlanFolderWatcher(QObject):
+    """
+    Watches the directory with the plans, and emits `step_ready` once for
+    every plan and pipeline step whose prerequisite files are complete,
+    following the `{plan_name}.{suffix}` convention for the file names
+    """
+
+    step_ready = pyqtSignal(str, str)
+
+    def __init__(self, directory, steps, parent=None):
+        super(PlanFolderWatcher, self).__init__(parent)
+        self.directory = pathlib.Path(directory)
+        self.started = time.time()
+        self._steps = steps
+        self._queued = set()
+        self._watcher = QFileSystemWatcher([str(self.directory)], self)
+        # a CLI tool writes several files at once, scan after it is done
+        self._scan_timer = QTimer(self)
+        self._scan_timer.setSingleShot(True)
+        self._scan_timer.setInterval(200)
+        self._scan_timer.timeout.connect(self.scan)
+        self._watcher.directoryChanged.connect(self._scan_timer.start)
+        self._scan_timer.start()
+
+    def scan(self):
+        for plan_name, suffixes in scan_plan_files(self.directory).items():
+            for step in self._steps:
+                if (plan_name, step.name) in self._queued:
+                    continue
+                if not all(suffix in suffixes for suffix in step.inputs):
+                    continue
+                if any(suffix in suffixes for suffix in step.outputs):
+                    continue
+                self._queued.add((plan_name, step.name))
+                self.step_ready.emit(
+                    str(self.directory / f"{plan_name}.plan"), step.name
+                )
+
+    def step_failed(self, plan_file, step_name):
+        """Allow the step to be queued again on the next change"""
+        self._queued.discard((pathlib.Path(plan_file).stem, step_name))
+
+    def stop(self):
+        self._scan_timer.stop()
+        self._watcher.removePath(str(self.directory))
+
+
+class PlansPipelineMixin:
+    """
+    Lets the main window of the role watch the plans directory, and run
+    the CLI tool for every pipeline step of the role that becomes ready.
+    The window defines run_pipeline_step(plan_file, step_name) for the
+    steps in `pipeline_steps`.
+    """
+
+    # steps that are run automatically when the plans directory is watched
+    pipeline_steps = ()
+
+    def init_pipeline(self):
+        self._plans_watcher = None
+        self.pipeline_pool = CLIProcessPool(parent=self)
+        self.pipeline_pool.job_finished.connect(self.pipeline_step_done)
+
+    @pyqtSlot(bool, name="on_actionWatchPlans_toggled")
+    def watch_plans(self, checked):
+        if self._plans_watcher is not None:
+            self._plans_watcher.stop()
+            self._plans_watcher.deleteLater()
+            self._plans_watcher = None
+        if not checked:
+            return
+
+        app = get_app(self)
+        plans_dir = QFileDialog.getExistingDirectory(
+            self, "Watch Plans Directory", str(app.path),
+        )
+        if not plans_dir:
+            self.actionWatchPlans.setChecked(False)
+            return
+
+        self._plans_watcher = PlanFolderWatcher(
+            plans_dir, self.pipeline_steps, self
+        )
+        self._plans_watcher.step_ready.connect(self.run_pipeline_step)
+        self.statusbar.showMessage(f"Watching {plans_dir}", 5000)
+
+    def created_before_watching(self, path):
+        return pathlib.Path(path).stat().st_mtime < self._plans_watcher.started
+
+    def validate_pipeline_data(self, plan_file, step_name, data_file):
+        """
+        Check the contract data as the manual signing does, the step fails
+        if it is not valid
+        """
+        try:
+            self.validate_contract_data(str(data_file))
+        except Exception as e:
+            self.pipeline_step_done(
+                (plan_file, step_name), 1, "", f"contract data error: {e}"
+            )
+            return False
+        return True
+
+    def pipeline_call(self, app, args, plan_file, step_name):
+        args.extend(["--network", self.blockchain_network])
+        self.pipeline_pool.submit(app, args, (plan_file, step_name))
+
+    def pipeline_step_done(self, tag, status_int, output, error):
+        plan_file, step_name = tag
+        plan_name = pathlib.Path(plan_file).stem
+        if status_int:
+            qInfo(f"{plan_name}: {step_name} failed: {error}\n")
+            self.statusbar.showMessage(
+                f"{plan_name}: {step_name} failed", 5000
+            )
+            if self._plans_watcher is not None:
+                self._plans_watcher.step_failed(plan_file, step_name)
+        else:
+            self.statusbar.showMessage(f"{plan_name}: {step_name} done", 5000)
@@ -0,0 +1,118 @@
+# Copyright (c) 2020-2021 Rugged Bytes IT-Services GmbH
+# Distributed under the MIT software license, see the accompanying
+# file COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+import pathlib
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+
+from PyQt5.QtCore import QObject, QTimer, qInfo
+
+HEARTBEAT_INTERVAL = 0.1
+
+
+def format_call_path(frame):
+    return "".join(traceback.format_stack(frame))
+
+
+class StallWatchdog(QObject):
+    """
+    Detects the stalls of the event loop of the GUI thread. The heartbeat
+    timer runs in the event loop, and the watchdog thread samples the stack
+    of the GUI thread while the heartbeat is late by more than `threshold`
+    seconds. The stall report with the duration and the sampled call paths
+    (the most frequent first) is written to `report_dir` when the stall is
+    detected, and rewritten when it ends.
+    """
+
+    def __init__(self, report_dir, name, threshold=0.5, sample_interval=0.05,
+                 parent=None):
+        super(StallWatchdog, self).__init__(parent)
+        self.report_dir = pathlib.Path(report_dir)
+        self.name = name
+        self.threshold = threshold
+        self.sample_interval = sample_interval
+        self._gui_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop = threading.Event()
+
+        self._heartbeat = QTimer(self)
+        self._heartbeat.setInterval(int(HEARTBEAT_INTERVAL * 1000))
+        self._heartbeat.timeout.connect(self._beat)
+        self._thread = threading.Thread(target=self._watch, daemon=True)
+
+    def start(self):
+        self._last_beat = time.monotonic()
+        self._heartbeat.start()
+        self._thread.start()
+
+    def stop(self):
+        self._heartbeat.stop()
+        self._stop.set()
+
+    def _beat(self):
+        self._last_beat = time.monotonic()
+
+    def _sample(self):
+        frame = sys._current_frames().get(self._gui_thread_id)
+        if frame is None:
+            return None
+        return format_call_path(frame)
+
+    def _watch(self):
+        while not self._stop.wait(self.sample_interval):
+            last_beat = self._last_beat
+            late = time.monotonic() - last_beat - HEARTBEAT_INTERVAL
+            if late < self.threshold:
+                continue
+
+            started = time.time() - late
+            samples = Counter()
+            report_path = self.report_dir / (
+                f"{self.name}-stall-"
+                f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(started))}"
+                ".txt"
+            )
+            qInfo(f"GUI thread stalled for {late:.3f}s, see {report_path}\n")
+
+            def sample():
+                call_path = self._sample()
+                if call_path is not None:
+                    samples[call_path] += 1
+
+            sample()
+            # the app might never recover, write what is known now
+            self._write_report(report_path, started, late, samples, False)
+            while self._last_beat == last_beat and not self._stop.wait(
+                self.sample_interval
+            ):
+                sample()
+            end = self._last_beat
+            if end == last_beat:
+                end = time.monotonic()
+            duration = end - last_beat - HEARTBEAT_INTERVAL
+            self._write_report(report_path, started, duration, samples, True)
+
+    def _write_report(self, report_path, started, duration, samples,
+                      finished):
+        total = sum(samples.values())
+        lines = [
+            f"Stall of the GUI thread at "
+            f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(started))}",
+            f"Duration: {duration:.3f}s"
+            + ("" if finished else " (still stalled)"),
+            f"Samples: {total}, every {self.sample_interval}s",
+        ]
+        for call_path, count in samples.most_common():
+            lines.append("")
+            lines.append(f"{count}/{total} samples:")
+            lines.append(call_path.rstrip())
+        try:
+            self.report_dir.mkdir(parents=True, exist_ok=True)
+            with open(report_path, "w") as f:
+                f.write("\n".join(lines) + "\n")
+        except OSError as e:
+            qInfo(f"Can not write stall report {report_path}: {e}\n")
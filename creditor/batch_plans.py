@@ -0,0 +1,247 @@
+# Copyright (c) 2020-2021 Rugged Bytes IT-Services GmbH
+# Distributed under the MIT software license, see the accompanying
+# file COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+import csv
+import json
+import pathlib
+from typing import List
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from common import CLIProcessPool
+
+PLAN_FIELDS = (
+    "principal_asset",
+    "principal_amount",
+    "collateral_asset",
+    "collateral_amount",
+    "total_steps",
+    "total_periods",
+    "rate_due",
+    "rate_early",
+    "rates_late",
+    "rate_collateral_penalty",
+    "num_blocks_in_period",
+)
+
+INDEX_NAME = "index.json"
+
+
+def read_manifest(manifest_path):
+    """
+    Read the plan parameters from the manifest. The manifest is either
+    a CSV file with the header that names the fields, or a JSON file with
+    a list of objects (or an object with such a list under "plans" key).
+    The plans are named by their rows if they have no name, the names
+    must be unique since they are the names of the plan files. The rows
+    with names that are not plain file names fail when they are checked.
+    """
+    path = pathlib.Path(manifest_path)
+    with open(path, newline="") as f:
+        if path.suffix.lower() == ".json":
+            rows = json.load(f)
+            if isinstance(rows, dict):
+                rows = rows.get("plans", [])
+        else:
+            rows = list(csv.DictReader(f))
+
+    if not isinstance(rows, list):
+        raise ValueError("manifest must contain a list of plans")
+
+    rows_of_name = {}
+    for num, row in enumerate(rows, 1):
+        if isinstance(row, dict):
+            name = plan_name(row, num)
+            rows_of_name.setdefault(name, []).append(str(num))
+    duplicates = [
+        f"{name} (rows {', '.join(nums)})"
+        for name, nums in rows_of_name.items() if len(nums) > 1
+    ]
+    if duplicates:
+        raise ValueError(f"duplicate plan names: {'; '.join(duplicates)}")
+
+    return rows
+
+
+def plan_name(row, num):
+    return str(row.get("name") or f"plan_{num}")
+
+
+def check_plan_name(name):
+    """The name is the stem of the files in the output directory"""
+    if name.startswith(".") or any(sep in name for sep in "/\\\0") or \
+            name != name.strip():
+        raise ValueError(f"plan name {name!r} is not a plain file name")
+
+
+def check_plan_row(row, num):
+    if not isinstance(row, dict):
+        raise ValueError("plan parameters must be an object")
+
+    check_plan_name(plan_name(row, num))
+
+    for field in PLAN_FIELDS:
+        if row.get(field) in (None, ""):
+            raise ValueError(f"{field} not exists in row {num}")
+
+    rates_late = row["rates_late"]
+    if isinstance(rates_late, str):
+        rates_late = [rl.strip() for rl in rates_late.split(",")]
+
+    params = dict(row)
+    params["rates_late"] = [str(rl) for rl in rates_late if str(rl)]
+    params.setdefault("collateral_amount_unconditionally_forfeited", 1)
+    params["name"] = plan_name(row, num)
+    return params
+
+
+def make_plan_args(rpc_param, params, plan_file, info_file):
+    args: List = [
+        "make",
+        "-r",
+        rpc_param,
+    ]
+    args.extend(
+        (
+            "--principal-asset",
+            params["principal_asset"],
+            "--principal-amount",
+            params["principal_amount"],
+            "--collateral-asset",
+            params["collateral_asset"],
+            "--collateral-amount",
+            params["collateral_amount"],
+            "--collateral-amount-unconditionally-forfeited",
+            params.get("collateral_amount_unconditionally_forfeited", 1),
+            "--total-steps",
+            params["total_steps"],
+            "--total-periods",
+            params["total_periods"],
+            "--rate-due",
+            params["rate_due"],
+            "--rate-early",
+            params["rate_early"],
+            "--num-blocks-in-period",
+            params["num_blocks_in_period"],
+        )
+    )
+    args.append("--rates-late")
+    args.append(",".join(str(rl) for rl in params["rates_late"]))
+    args.extend(
+        (
+            "--rate-collateral-penalty",
+            params["rate_collateral_penalty"],
+            "--output-plan",
+            plan_file,
+            "--output-info",
+            info_file,
+        )
+    )
+    return args
+
+
+class BatchPlanCreator(QObject):
+    """
+    Creates `.plan`/`.{suffix}` pair for every row of the manifest,
+    running several CLI processes in parallel. When all rows are processed,
+    the summary is written to `index.json` in the output directory.
+    `finished` is emitted with its path, and the error if it could not be
+    written.
+    """
+
+    progress = pyqtSignal(int, int)
+    row_failed = pyqtSignal(int, str)
+    finished = pyqtSignal(str, str)
+
+    def __init__(self, cli, rpc_param, suffix, asset_resolver,
+                 max_jobs=None, parent=None):
+        super(BatchPlanCreator, self).__init__(parent)
+        self._cli = cli
+        self._rpc_param = rpc_param
+        self._suffix = suffix
+        self._asset_resolver = asset_resolver
+        self._pool = CLIProcessPool(max_jobs, self)
+        self._pool.job_finished.connect(self._plan_done)
+        self._results = []
+        self._done = 0
+
+    def start(self, rows, output_dir, network):
+        self._output_dir = pathlib.Path(output_dir)
+        self._results = []
+        self._done = 0
+        self._total = len(rows)
+        self._index_written = False
+
+        for num, row in enumerate(rows, 1):
+            try:
+                params = check_plan_row(row, num)
+            except ValueError as e:
+                self._add_result(num, None, str(e))
+                continue
+
+            for field in ("principal_asset", "collateral_asset"):
+                params[field] = self._asset_resolver(str(params[field]))
+
+            plan_file = self._output_dir / f"{params['name']}.plan"
+            info_file = self._output_dir / f"{params['name']}.{self._suffix}"
+            result = {
+                "row": num,
+                "name": params["name"],
+                "plan": str(plan_file),
+                "info": str(info_file),
+            }
+            if plan_file.exists():
+                self._add_result(num, result, "plan file already exists")
+                continue
+
+            args = make_plan_args(
+                self._rpc_param, params, plan_file, info_file
+            )
+            args.extend(["--network", network])
+            self._pool.submit(self._cli, args, result)
+
+        if self._done == self._total:
+            self._write_index()
+
+    def _plan_done(self, result, status_int, output, error):
+        self._add_result(
+            result["row"], result, error.strip() if status_int else None
+        )
+        if self._done == self._total:
+            self._write_index()
+
+    def _add_result(self, num, result, error):
+        if result is None:
+            result = {"row": num}
+        result["status"] = "failed" if error else "ok"
+        if error:
+            result["error"] = error
+            self.row_failed.emit(num, error)
+        self._results.append(result)
+        self._done += 1
+        self.progress.emit(self._done, self._total)
+
+    def _write_index(self):
+        if self._index_written:
+            return
+        self._index_written = True
+        index_path = self._output_dir / INDEX_NAME
+        self._results.sort(key=lambda result: result["row"])
+        try:
+            with open(index_path, "w") as f:
+                json.dump(
+                    {
+                        "total": self._total,
+                        "failed": sum(
+                            1 for r in self._results if r["status"] != "ok"
+                        ),
+                        "plans": self._results,
+                    },
+                    f,
+                    indent=4,
+                )
+        except OSError as e:
+            self.finished.emit(str(index_path), f"{e}")
+        else:
+            self.finished.emit(str(index_path), "")
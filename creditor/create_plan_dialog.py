@@ -2,14 +2,46 @@
 # Distributed under the MIT software license, see the accompanying
 # file COPYING or http://www.opensource.org/licenses/mit-license.php.
 
+from PyQt5.QtCore import QThread, pyqtSignal
 from PyQt5.QtWidgets import (
     QDialog, QLayout, QHBoxLayout, QLabel, QDoubleSpinBox
 )
 
 from common import LoaderUI, clear_layout
+from common.file_cache import load_plan_data
+from common.portfolio import load_flat_plan
+from common.simulation import simulate_plans
 from PyQt5 import QtCore
 
 
+class SimulationThread(QThread):
+    """Simulates the repayment paths of the plan file"""
+
+    simulated = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, plan_file, num_paths, pay, early, jobs=None,
+                 parent=None):
+        super(SimulationThread, self).__init__(parent)
+        self._plan_file = plan_file
+        self._num_paths = num_paths
+        self._pay = pay
+        self._early = early
+        self._jobs = jobs
+
+    def run(self):
+        try:
+            # the plan is temporary, so it is not kept in the plan cache
+            flat = load_flat_plan(self._plan_file, load_plan_data)
+            result, = simulate_plans(
+                [flat], self._num_paths, self._pay, self._early, self._jobs
+            )
+        except Exception as e:
+            self.failed.emit(f"{e}")
+        else:
+            self.simulated.emit(result)
+
+
 class CreatePlanDialog(QDialog, LoaderUI):
     def __init__(self):
         super(CreatePlanDialog, self).__init__()
@@ -60,3 +92,28 @@ class CreatePlanDialog(QDialog, LoaderUI):
             LateRatedoubleSpinBox.setProperty("value", value)
             layout.addWidget(LateRatedoubleSpinBox)
             self.late_layout.addLayout(layout)
+
+    def plan_params(self, app):
+        """The parameters of the plan for `make_plan_args()`"""
+        loan_asset = self.LoanAssetcomboBox.currentText().split(":")[0]
+        collateral_asset = self.CollateralAssetcomboBox.currentText().split(
+            ":"
+        )[0]
+        rates_late = []
+        for idx in range(self.late_layout.count()):
+            wgt = self.late_layout.itemAt(idx).itemAt(1).widget()
+            rates_late.append(f"{wgt.value()}")
+        return {
+            "principal_asset": app.get_asset_by_name(loan_asset),
+            "principal_amount": self.LoanAmountspinBox.value(),
+            "collateral_asset": app.get_asset_by_name(collateral_asset),
+            "collateral_amount": self.CollateralAmountspinBox.value(),
+            "total_steps": self.TotalStepsspinBox.value(),
+            "total_periods": self.TotalPeriodsspinBox.value(),
+            "rate_due": f"{self.BaseRatedoubleSpinBox.value()}",
+            "rate_early": f"{self.EarlyRatedoubleSpinBox.value()}",
+            "rates_late": rates_late,
+            "rate_collateral_penalty":
+                f"{self.PenaltyRatedoubleSpinBox.value()}",
+            "num_blocks_in_period": self.NumBlocksspinBox.value(),
+        }
@@ -2,27 +2,51 @@
 # Distributed under the MIT software license, see the accompanying
 # file COPYING or http://www.opensource.org/licenses/mit-license.php.
 
+import csv
 import pathlib
 import sys
+import tempfile
 from typing import List
 
-from PyQt5.QtCore import pyqtSlot
-from PyQt5.QtWidgets import QApplication, QFileDialog
+from PyQt5.QtCore import Qt, pyqtSlot
+from PyQt5.QtWidgets import (
+    QApplication,
+    QFileDialog,
+    QMessageBox,
+    QProgressDialog,
+)
 
-from cli.cli_common import load_data_with_checking_hash
 from common import (
+    CLIProcessPool,
     CommonMainWindow,
     LoaderUI,
+    PipelineStep,
+    add_jobs_panel,
+    add_stats_panel,
     cached_property,
+    contract_data_cache,
+    get_app,
 )
+from common.consolidation import add_consolidate_action
+from common.simulation import format_result
 
-from .create_plan_dialog import CreatePlanDialog
+from .batch_plans import BatchPlanCreator, make_plan_args, read_manifest
+from .create_plan_dialog import CreatePlanDialog, SimulationThread
+from .portfolio_panel import add_portfolio_panel
 
 
 class MainWindow(CommonMainWindow, LoaderUI):
+    pipeline_steps = (
+        PipelineStep("sign", ("plan", "cdata"), ("csignature",)),
+    )
+
     def __init__(self):
         super(MainWindow, self).__init__()
         self.setupUi(__file__)
+        self.stats_panel = add_stats_panel(self)
+        self.jobs_panel = add_jobs_panel(self)
+        self.portfolio_panel = add_portfolio_panel(self)
+        add_consolidate_action(self)
         self.sign_save.connect(self.sign_contract)
         self.contract_data_changed.connect(self.change_data)
 
@@ -32,19 +56,20 @@ class MainWindow(CommonMainWindow, LoaderUI):
 
     @cached_property
     def creditor_cli(self):
-        app = QApplication.instance()
+        app = get_app(self)
         if getattr(sys, "frozen", False):
             return f"{app.path}/cli/creditor_cli"
         return f"{app.path}/cli/creditor_cli.py"
 
     @pyqtSlot(name="on_MakePlanButton_clicked")
     def show_create_plan_dialog(self):
-        app = QApplication.instance()
+        app = get_app(self)
         assets_creditor = set(app.assetlabels.keys())
         assets_debtor = set(app.assetlabels.keys())
         dlg = CreatePlanDialog()
         dlg.LoanAssetcomboBox.addItems(assets_creditor)
         dlg.CollateralAssetcomboBox.addItems(assets_debtor)
+        dlg.SimulateButton.clicked.connect(lambda: self.simulate_plan(dlg))
         dlg.exec()
         if dlg.result():
             filePlan, _ = QFileDialog.getSaveFileName(
@@ -61,73 +86,142 @@ class MainWindow(CommonMainWindow, LoaderUI):
             suffix = f"{app.suffix}info"
             fileInfo = f"{file_path}/{file_name}.{suffix}"
 
-            loan_amount = dlg.LoanAmountspinBox.value()
-            loan_asset = dlg.LoanAssetcomboBox.currentText().split(":")[0]
-            loan_asset = app.get_asset_by_name(loan_asset)
-            collateral_amount = dlg.CollateralAmountspinBox.value()
-            collateral_asset = dlg.CollateralAssetcomboBox.currentText().split(
-                ":"
-            )[0]
-            collateral_asset = app.get_asset_by_name(collateral_asset)
-            total_steps = dlg.TotalStepsspinBox.value()
-            total_periods = dlg.TotalPeriodsspinBox.value()
-            rate_due = f"{dlg.BaseRatedoubleSpinBox.value()}"
-            rate_early = f"{dlg.EarlyRatedoubleSpinBox.value()}"
-
-            rates_late = []
-            for idx in range(dlg.late_layout.count()):
-                wgt = dlg.late_layout.itemAt(idx).itemAt(1).widget()
-                rates_late.append(f"{wgt.value()}")
-
-            rate_collateral_penalty = f"{dlg.PenaltyRatedoubleSpinBox.value()}"
-            num_blocks = dlg.NumBlocksspinBox.value()
-            args: List = [
-                "make",
-                "-r",
-                self.rpc_param,
-            ]
-            args.extend(
-                (
-                    "--principal-asset",
-                    loan_asset,
-                    "--principal-amount",
-                    loan_amount,
-                    "--collateral-asset",
-                    collateral_asset,
-                    "--collateral-amount",
-                    collateral_amount,
-                    "--collateral-amount-unconditionally-forfeited",
-                    "1",
-                    "--total-steps",
-                    total_steps,
-                    "--total-periods",
-                    total_periods,
-                    "--rate-due",
-                    rate_due,
-                    "--rate-early",
-                    rate_early,
-                    "--num-blocks-in-period",
-                    num_blocks,
-                )
-            )
-            args.append("--rates-late")
-            args.append(",".join(str(rl) for rl in rates_late))
-            args.extend(
-                (
-                    "--rate-collateral-penalty",
-                    rate_collateral_penalty,
-                    "--output-plan",
-                    filePlan,
-                    "--output-info",
-                    fileInfo,
-                )
-            )
+            params = dlg.plan_params(app)
+            args = make_plan_args(self.rpc_param, params, filePlan, fileInfo)
             self.call(
                 self.creditor_cli, args, "Plan was created",
                 lambda: self.update_plan_info(f"{filePlan}")
             )
 
-    def sign_contract(self, sign_path):
+    def simulate_plan(self, dlg):
+        """
+        Make the plan of the dialog in a temporary directory and simulate
+        its repayment paths with the probabilities of the dialog
+        """
+        app = get_app(self)
+        pay = dlg.PayProbdoubleSpinBox.value()
+        early = dlg.EarlyProbdoubleSpinBox.value()
+        if pay + early > 1:
+            QMessageBox.critical(
+                dlg, "Simulation",
+                "The payment probabilities add up to more than 1",
+            )
+            return
+
+        tmp_dir = tempfile.TemporaryDirectory()
+        plan_file = pathlib.Path(tmp_dir.name) / "simulated.plan"
+        args = make_plan_args(
+            self.rpc_param, dlg.plan_params(app), plan_file,
+            plan_file.with_suffix(f".{app.suffix}info"),
+        )
+        args.extend(["--network", self.blockchain_network])
+        dlg.SimulateButton.setEnabled(False)
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+
+        def finish(message=None, result=None):
+            QApplication.restoreOverrideCursor()
+            dlg.SimulateButton.setEnabled(True)
+            tmp_dir.cleanup()
+            if message is not None:
+                QMessageBox.critical(dlg, "Simulation", message)
+            else:
+                QMessageBox.information(
+                    dlg, "Simulation",
+                    f"Payment probability {pay}, early {early}\n\n"
+                    + "\n".join(format_result(result)),
+                )
+
+        def plan_made(_, status_int, output, error):
+            pool.deleteLater()
+            if status_int:
+                finish(error)
+                return
+            thread = SimulationThread(
+                str(plan_file),
+                int(app.settings.value("simulation/paths", 1000000)),
+                pay,
+                early,
+                int(app.settings.value("simulation/jobs", 0)) or None,
+                parent=self,
+            )
+            thread.simulated.connect(lambda result: finish(result=result))
+            thread.failed.connect(finish)
+            thread.finished.connect(thread.deleteLater)
+            thread.start()
+
+        pool = CLIProcessPool(1, self)
+        pool.job_finished.connect(plan_made)
+        pool.submit(self.creditor_cli, args)
+
+    @pyqtSlot(name="on_actionBatchPlans_triggered")
+    def create_plans_from_manifest(self):
+        app = get_app(self)
+        manifest, _ = QFileDialog.getOpenFileName(
+            self, "Open Plans Manifest", str(app.path),
+            filter="*.csv *.json",
+        )
+        if not manifest:
+            return
+
+        try:
+            rows = read_manifest(manifest)
+        except (OSError, ValueError, csv.Error) as e:
+            QMessageBox.critical(self, "Manifest Error", f"Error: {e}")
+            return
+
+        output_dir = QFileDialog.getExistingDirectory(
+            self, "Save Plans", str(pathlib.Path(manifest).parent),
+        )
+        if not output_dir:
+            return
+
+        progress = QProgressDialog(
+            "Creating plans...", None, 0, len(rows), self
+        )
+        progress.setWindowModality(Qt.WindowModal)
+        progress.show()
+
+        creator = BatchPlanCreator(
+            self.creditor_cli,
+            self.rpc_param,
+            f"{app.suffix}info",
+            app.get_asset_by_name,
+            parent=self,
+        )
+        failures = []
+
+        def batch_finished(index_path, index_error):
+            progress.close()
+            creator.deleteLater()
+            num_created = len(rows) - len(failures)
+            self.statusbar.showMessage(
+                f"{num_created} of {len(rows)} plans were created", 5000
+            )
+            if index_error:
+                summary = f"Summary was not written: {index_error}"
+            else:
+                summary = f"Summary: {index_path}"
+            if failures or index_error:
+                QMessageBox.warning(
+                    self,
+                    "Batch Plans",
+                    "\n".join(failures) + f"\n\n{summary}",
+                )
+            else:
+                QMessageBox.information(
+                    self,
+                    "Batch Plans",
+                    f"{num_created} plans were created\n\n{summary}",
+                )
+
+        creator.progress.connect(lambda done, _: progress.setValue(done))
+        creator.row_failed.connect(
+            lambda num, error: failures.append(f"row {num}: {error}")
+        )
+        creator.finished.connect(batch_finished)
+        creator.start(rows, output_dir, self.blockchain_network)
+
+    def sign_args(self, plan_path, contract_data, sign_path):
         args: List = [
             "sign",
             "-r",
@@ -136,20 +230,39 @@ class MainWindow(CommonMainWindow, LoaderUI):
         args.extend(
             (
                 "--plan",
-                self._plan_path,
+                plan_path,
                 "--data",
-                self._contract_data,
+                contract_data,
                 "-o",
                 sign_path,
             )
         )
+        return args
+
+    def sign_contract(self, sign_path):
+        args = self.sign_args(self._plan_path, self._contract_data, sign_path)
         self.call(
             self.creditor_cli,
             args,
             "Contract was signed",
-            lambda: self.plan.signButton.setEnabled(False),
+            lambda button=self.plan.signButton: button.setEnabled(False),
+            key=self._plan_path,
         )
 
+    def run_pipeline_step(self, plan_file, step_name):
+        if step_name == "sign":
+            plan = pathlib.Path(plan_file)
+            if not self.validate_pipeline_data(
+                plan_file, step_name, plan.with_suffix(".cdata")
+            ):
+                return
+            args = self.sign_args(
+                plan_file,
+                plan.with_suffix(".cdata"),
+                plan.with_suffix(".csignature"),
+            )
+            self.pipeline_call(self.creditor_cli, args, plan_file, step_name)
+
     @pyqtSlot(name="on_RevokeButton_clicked")
     def revoke_window(self):
         args: List = [
@@ -161,7 +274,10 @@ class MainWindow(CommonMainWindow, LoaderUI):
             ("--plan", self._plan_path, "--data", self._contract_data,
                 "--force",)
         )
-        self.call(self.creditor_cli, args, "The window was revoked")
+        self.call(
+            self.creditor_cli, args, "The window was revoked",
+            key=self._plan_path,
+        )
 
     @pyqtSlot(name="on_GrabButton_clicked")
     def grab_collateral(self):
@@ -174,23 +290,60 @@ class MainWindow(CommonMainWindow, LoaderUI):
             ("--plan", self._plan_path, "--data", self._contract_data,
                 "--force",)
         )
-        self.call(self.creditor_cli, args, "The collateral was grabbed")
+        self.call(
+            self.creditor_cli, args, "The collateral was grabbed",
+            key=self._plan_path,
+        )
 
-    @pyqtSlot(name="on_SpendButton_clicked")
-    def spend_coins(self):
+    def getpayment_args(self, plan_path, contract_data):
         args: List = [
             "getpayment",
             "-r",
             self.rpc_param,
         ]
         args.extend(
-            ("--plan", self._plan_path, "--data", self._contract_data,
-                "--force",)
+            ("--plan", plan_path, "--data", contract_data, "--force",)
         )
-        self.call(self.creditor_cli, args, "The payment was spent")
+        return args
+
+    @pyqtSlot(name="on_SpendButton_clicked")
+    def spend_coins(self):
+        args = self.getpayment_args(self._plan_path, self._contract_data)
+        self.call(
+            self.creditor_cli, args, "The payment was spent",
+            key=self._plan_path,
+        )
+
+    @pyqtSlot(name="on_actionGetPayments_triggered")
+    def spend_coins_of_plans(self):
+        """Get the payments of several contracts, each in its own job"""
+        app = get_app(self)
+        plan_files, _ = QFileDialog.getOpenFileNames(
+            self, "Get Payments of Plans", str(app.path), filter="*.plan",
+        )
+        missing = []
+        for plan_file in plan_files:
+            data_file = pathlib.Path(plan_file).with_suffix(".cdata")
+            if not data_file.exists():
+                missing.append(pathlib.Path(plan_file).name)
+                continue
+            args = self.getpayment_args(plan_file, str(data_file))
+            self.call(
+                self.creditor_cli, args,
+                f"The payment of {data_file.stem} was spent",
+                key=plan_file,
+                notify=False,
+            )
+        if plan_files:
+            self.jobs_panel.show()
+        if missing:
+            QMessageBox.warning(
+                self, "Get Payments",
+                "No contract data for:\n" + "\n".join(missing),
+            )
 
     def validate_contract_data(self, fileName):
-        creditor_data = load_data_with_checking_hash(fileName)
+        creditor_data = contract_data_cache.get(fileName)
         creditor_fields = (
             "tx",
             "shared-blinding-xkey",
@@ -0,0 +1,164 @@
+# Copyright (c) 2020-2021 Rugged Bytes IT-Services GmbH
+# Distributed under the MIT software license, see the accompanying
+# file COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+import time
+
+from PyQt5.QtCore import Qt, pyqtSlot
+from PyQt5.QtWidgets import (
+    QDockWidget,
+    QFileDialog,
+    QHBoxLayout,
+    QLabel,
+    QPushButton,
+    QSpinBox,
+    QTableWidget,
+    QTableWidgetItem,
+    QVBoxLayout,
+    QWidget,
+)
+
+from common import get_app, get_short_name
+from common.portfolio import Portfolio, scan_contracts
+
+
+class PortfolioPanel(QDockWidget):
+    """
+    The payments expected from all the contracts in the plans directory,
+    and the collateral at risk, per window of blocks. The stages of the
+    contracts are the ones found when each was last open in the window,
+    the panel says how many are known at all.
+    """
+
+    def __init__(self, parent=None):
+        super(PortfolioPanel, self).__init__("Portfolio", parent)
+        self.setObjectName("portfolioPanel")
+        app = get_app(self)
+        self._plans_dir = app.settings.value("portfolio/plans_dir")
+        self._portfolio = Portfolio()
+
+        widget = QWidget(self)
+        vbox = QVBoxLayout(widget)
+        hbox = QHBoxLayout()
+        self.dir_button = QPushButton(
+            self._plans_dir or "Plans directory...", widget
+        )
+        self.dir_button.clicked.connect(self.choose_plans_dir)
+        hbox.addWidget(self.dir_button)
+        hbox.addStretch()
+        hbox.addWidget(QLabel("Window, blocks:", widget))
+        self.window_blocks = QSpinBox(widget)
+        self.window_blocks.setRange(1, 100000)
+        self.window_blocks.setValue(
+            int(app.settings.value("portfolio/window_blocks", 10))
+        )
+        hbox.addWidget(self.window_blocks)
+        hbox.addWidget(QLabel("Windows:", widget))
+        self.num_windows = QSpinBox(widget)
+        self.num_windows.setRange(1, 1000)
+        self.num_windows.setValue(
+            int(app.settings.value("portfolio/windows", 12))
+        )
+        hbox.addWidget(self.num_windows)
+        vbox.addLayout(hbox)
+        self.summary = QLabel(widget)
+        self.summary.setToolTip(
+            "The current stage of a contract is updated only while it is"
+            " open in the window, the other contracts are projected from"
+            " the stage found when they were last open, or from their first"
+            " stage if they were never open"
+        )
+        vbox.addWidget(self.summary)
+        self.table = QTableWidget(0, 0, widget)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        vbox.addWidget(self.table)
+        self.setWidget(widget)
+
+        self.window_blocks.valueChanged.connect(self.change_windows)
+        self.num_windows.valueChanged.connect(self.change_windows)
+        self.visibilityChanged.connect(lambda visible: self.refresh())
+        app.block_monitor.block_high_updated.connect(self.refresh)
+
+    def choose_plans_dir(self):
+        app = get_app(self)
+        plans_dir = QFileDialog.getExistingDirectory(
+            self, "Open Plans Directory", self._plans_dir or str(app.path),
+        )
+        if not plans_dir:
+            return
+        self._plans_dir = plans_dir
+        app.settings.setValue("portfolio/plans_dir", plans_dir)
+        self.dir_button.setText(plans_dir)
+        self.refresh()
+
+    def change_windows(self):
+        app = get_app(self)
+        app.settings.setValue(
+            "portfolio/window_blocks", self.window_blocks.value()
+        )
+        app.settings.setValue("portfolio/windows", self.num_windows.value())
+        self.refresh()
+
+    @pyqtSlot()
+    @pyqtSlot(int)
+    def refresh(self, block=None):
+        if not self.isVisible() or not self._plans_dir:
+            return
+        app = get_app(self)
+        current_block = app.block_monitor.current_block
+        if current_block is None:
+            return
+
+        start = time.perf_counter()
+        self._portfolio.set_contracts(scan_contracts(self._plans_dir))
+        self._portfolio.set_positions(app.contract_store.contract_positions())
+        projection = self._portfolio.project(
+            current_block, self.window_blocks.value(), self.num_windows.value()
+        )
+        elapsed = time.perf_counter() - start
+        num_untracked = len(self._portfolio) - self._portfolio.num_tracked
+        self.summary.setText(
+            f"{projection.num_contracts} open of {len(self._portfolio)}"
+            f" contracts at block {current_block},"
+            f" projected in {elapsed * 1000:.0f} ms\n"
+            f"The stages are as of when each contract was last open in the"
+            f" window, {num_untracked} were never tracked and are taken to"
+            f" be at their first stage"
+        )
+        self.show_projection(projection)
+
+    def show_projection(self, projection):
+        app = get_app(self)
+        columns = ["Blocks"]
+        columns.extend(
+            f"Inflow {get_short_name(app, asset)}"
+            for asset in projection.principal_assets
+        )
+        columns.extend(
+            f"At risk {get_short_name(app, asset)}"
+            for asset in projection.collateral_assets
+        )
+        num_windows = projection.inflows.shape[1]
+        self.table.setColumnCount(len(columns))
+        self.table.setHorizontalHeaderLabels(columns)
+        self.table.setRowCount(num_windows)
+        for window in range(num_windows):
+            first = projection.first_block + window * projection.window_blocks
+            last = first + projection.window_blocks - 1
+            values = [f"{first}-{last}"]
+            values.extend(f"{v}" for v in projection.inflows[:, window])
+            values.extend(f"{v}" for v in projection.at_risk[:, window])
+            for column, value in enumerate(values):
+                item = QTableWidgetItem(value)
+                if column:
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                self.table.setItem(window, column, item)
+
+
+def add_portfolio_panel(window):
+    panel = PortfolioPanel(window)
+    window.addDockWidget(Qt.BottomDockWidgetArea, panel)
+    panel.hide()
+    window.menuPlans.addSeparator()
+    window.menuPlans.addAction(panel.toggleViewAction())
+    return panel
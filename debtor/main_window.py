@@ -2,20 +2,36 @@
 # Distributed under the MIT software license, see the accompanying
 # file COPYING or http://www.opensource.org/licenses/mit-license.php.
 
+import pathlib
 import sys
 
 from PyQt5.QtCore import pyqtSlot
-from PyQt5.QtWidgets import QApplication
 
-from cli.cli_common import load_data_with_checking_hash
-
-from common import CommonMainWindow, LoaderUI, cached_property
+from common import (
+    CommonMainWindow,
+    LoaderUI,
+    PipelineStep,
+    add_jobs_panel,
+    add_stats_panel,
+    cached_property,
+    contract_data_cache,
+    get_app,
+)
+from common.consolidation import add_consolidate_action
 
 
 class MainWindow(CommonMainWindow, LoaderUI):
+    pipeline_steps = (
+        PipelineStep("accept", ("plan",), ("dinfo",)),
+        PipelineStep("sign", ("plan", "ddata"), ("dsignature",)),
+    )
+
     def __init__(self):
         super(MainWindow, self).__init__()
         self.setupUi(__file__)
+        self.stats_panel = add_stats_panel(self)
+        self.jobs_panel = add_jobs_panel(self)
+        add_consolidate_action(self)
         self.plan_changed.connect(self.do_if_plan_changed)
         self.sign_save.connect(self.sign_contract)
         self.stage_found.connect(self.do_if_stage_found)
@@ -23,7 +39,7 @@ class MainWindow(CommonMainWindow, LoaderUI):
 
     @cached_property
     def debtor_cli(self):
-        app = QApplication.instance()
+        app = get_app(self)
         if getattr(sys, "frozen", False):
             return f"{app.path}/cli/debtor_cli"
         return f"{app.path}/cli/debtor_cli.py"
@@ -46,15 +62,36 @@ class MainWindow(CommonMainWindow, LoaderUI):
 
     @property
     def std_args(self):
+        return self.contract_args(self._plan_path, self._contract_data)
+
+    def contract_args(self, plan_path, contract_data):
         return [
             "-r",
             self.rpc_param,
             "--plan",
-            self._plan_path,
+            plan_path,
             "--data",
-            self._contract_data,
+            contract_data,
         ]
 
+    def run_pipeline_step(self, plan_file, step_name):
+        plan = pathlib.Path(plan_file)
+        args = self.contract_args(plan_file, plan.with_suffix(".ddata"))
+        if step_name == "accept":
+            if self.created_before_watching(plan):
+                # only the plans that appear while watching are accepted
+                return
+            args = ["accept", *args[:-2], "-o", plan.with_suffix(".dinfo")]
+        elif step_name == "sign":
+            if not self.validate_pipeline_data(
+                plan_file, step_name, plan.with_suffix(".ddata")
+            ):
+                return
+            args = ["sign", *args, "-o", plan.with_suffix(".dsignature")]
+        else:
+            return
+        self.pipeline_call(self.debtor_cli, args, plan_file, step_name)
+
     @pyqtSlot(name="on_getCollateral_clicked")
     def return_collateral(self):
         self.call(
@@ -62,6 +99,7 @@ class MainWindow(CommonMainWindow, LoaderUI):
             ["getcollaterall", *self.std_args, "--force"],
             "collateral was returned",
             lambda: self.getCollateral.setEnabled(False),
+            key=self._plan_path,
         )
 
     @pyqtSlot(name="on_regbutton_clicked")
@@ -70,6 +108,7 @@ class MainWindow(CommonMainWindow, LoaderUI):
             self.debtor_cli,
             ["paydebt", *self.std_args, "--force"],
             "debt was partially returned",
+            key=self._plan_path,
         )
 
     @pyqtSlot(name="on_earlybutton_clicked")
@@ -78,17 +117,19 @@ class MainWindow(CommonMainWindow, LoaderUI):
             self.debtor_cli,
             ["paydebt", *self.std_args, "--full", "--force"],
             "debt was fully returned",
+            key=self._plan_path,
         )
 
     @pyqtSlot(name="on_acceptbutton_clicked")
     def accept_plan(self):
-        app = QApplication.instance()
+        app = get_app(self)
         fileinfo = self.get_filename(f"{app.suffix}info")
         self.call(
             self.debtor_cli,
             ["accept", *self.std_args[:-2], "-o", fileinfo],
             "Plan was accepted",
             lambda: self.acceptbutton.setEnabled(False),
+            key=self._plan_path,
         )
 
     def sign_contract(self, sign_path):
@@ -96,11 +137,12 @@ class MainWindow(CommonMainWindow, LoaderUI):
             self.debtor_cli,
             ["sign", *self.std_args, "-o", sign_path],
             "Contract was signed",
-            lambda: self.plan.signButton.setEnabled(False),
+            lambda button=self.plan.signButton: button.setEnabled(False),
+            key=self._plan_path,
         )
 
     def validate_contract_data(self, fileName):
-        debtor_data = load_data_with_checking_hash(fileName)
+        debtor_data = contract_data_cache.get(fileName)
         debtor_fields = (
             "tx",
             "shared-blinding-xkey",
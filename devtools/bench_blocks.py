@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2020-2021 Rugged Bytes IT-Services GmbH
+# Distributed under the MIT software license, see the accompanying
+# file COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+"""
+Compares the ways to read the spent outpoints from the last blocks of the
+chain: verbose `getblock <hash> 2` JSON, serialized `getblock <hash> 0`
+parsed in place, and the REST `.bin` block if `--rest-url` is given.
+Prints the bytes transferred and the fetch and parse time per block.
+"""
+
+import argparse
+import json
+import pathlib
+import sys
+import time
+
+from bitcointx.rpc import RPCCaller
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.absolute()))
+
+from common.raw_block import RawBlockSource, parse_block  # noqa: E402
+from common.spend_index import block_from_json  # noqa: E402
+
+
+def bench_json(rpc, hashes):
+    size = fetch = parse = 0
+    for height, block_hash in hashes:
+        start = time.perf_counter()
+        # the JSON is decoded while fetching
+        block = rpc.getblock(block_hash, 2)
+        fetch += time.perf_counter() - start
+        # the size of the JSON the node has sent
+        size += len(json.dumps(block, default=str))
+        start = time.perf_counter()
+        block_from_json(height, block_hash, block)
+        parse += time.perf_counter() - start
+    return size, fetch, parse
+
+
+def bench_raw(source, hashes):
+    size = fetch = parse = 0
+    for height, block_hash in hashes:
+        start = time.perf_counter()
+        raw = source.get_raw_block(block_hash)
+        fetch += time.perf_counter() - start
+        size += len(raw)
+        start = time.perf_counter()
+        parse_block(raw, height, block_hash)
+        parse += time.perf_counter() - start
+    return size, fetch, parse
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("conf_file")
+    parser.add_argument("-n", "--blocks", type=int, default=100)
+    parser.add_argument("--rest-url", default=None,
+                        help="http://host:port of the node started with -rest")
+    args = parser.parse_args()
+
+    rpc = RPCCaller(conf_file=args.conf_file)
+    tip = rpc.getblockcount()
+    heights = range(max(0, tip - args.blocks + 1), tip + 1)
+    hashes = [(height, rpc.getblockhash(height)) for height in heights]
+
+    results = {
+        "json": bench_json(rpc, hashes),
+        # the hex string sent by the node is twice the size of the block
+        "raw": bench_raw(RawBlockSource(rpc), hashes),
+    }
+    results["raw"] = (results["raw"][0] * 2, *results["raw"][1:])
+    if args.rest_url:
+        results["rest"] = bench_raw(
+            RawBlockSource(rpc, args.rest_url), hashes
+        )
+
+    print(f"{len(hashes)} blocks")
+    print(f"{'':6}{'bytes/block':>14}{'fetch ms/block':>16}"
+          f"{'parse ms/block':>16}")
+    for name, (size, fetch, parse) in results.items():
+        print(f"{name:6}{size / len(hashes):>14.0f}"
+              f"{fetch * 1000 / len(hashes):>16.3f}"
+              f"{parse * 1000 / len(hashes):>16.3f}")
+
+
+if __name__ == "__main__":
+    main()
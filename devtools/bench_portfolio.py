@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2020-2021 Rugged Bytes IT-Services GmbH
+# Distributed under the MIT software license, see the accompanying
+# file COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+"""
+Measures the portfolio projection of the Creditor with many contracts. The
+plans of the directory are reused for the given number of contracts, with
+random start blocks and current stages, then the time to concatenate the
+flattened plans, to update the stages and to project is printed.
+"""
+
+import argparse
+import pathlib
+import random
+import sys
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.absolute()))
+
+from common.portfolio import Portfolio, flat_plan_cache  # noqa: E402
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("plans_dir")
+    parser.add_argument("-n", "--contracts", type=int, default=5000)
+    parser.add_argument("-b", "--window-blocks", type=int, default=10)
+    parser.add_argument("-w", "--windows", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    plan_files = sorted(pathlib.Path(args.plans_dir).glob("*.plan"))
+    if not plan_files:
+        sys.exit(f"no plans in {args.plans_dir}")
+    flats, elapsed = timed(
+        lambda: [flat_plan_cache.get(plan_file) for plan_file in plan_files]
+    )
+    print(f"flattened {len(flats)} plans in {elapsed * 1000:.1f} ms")
+
+    contracts = {}
+    positions = {}
+    for num in range(args.contracts):
+        flat = rng.choice(flats)
+        contracts[f"{num}"] = (flat, rng.randrange(1000))
+        positions[f"{num}"] = (rng.randrange(len(flat.period)), False)
+
+    portfolio = Portfolio()
+    _, elapsed = timed(portfolio.set_contracts, contracts)
+    print(f"concatenated in {elapsed * 1000:.1f} ms")
+    _, elapsed = timed(portfolio.set_positions, positions)
+    print(f"updated the stages in {elapsed * 1000:.1f} ms")
+    projection, elapsed = timed(
+        portfolio.project, 1000, args.window_blocks, args.windows
+    )
+    print(f"projected {projection.num_contracts} contracts in"
+          f" {elapsed * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
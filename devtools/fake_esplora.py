@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2020-2021 Rugged Bytes IT-Services GmbH
+# Distributed under the MIT software license, see the accompanying
+# file COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+"""
+Serves the part of the Esplora REST API used by the chain backend from
+a JSON file, to try the GUI programs or the backend by hand without
+Esplora, e.g. to see a spent, an unconfirmed or an unspent output:
+
+    {
+        "tip_height": 120,
+        "txs": {"<txid>": {"hex": "<tx hex>", "block_height": 105}},
+        "outspends": {"<txid>": {"<vout>": {"txid": "<spending txid>",
+                                            "vin": 0, "block_height": 110}}}
+    }
+
+The outputs missing from "outspends" are unspent. The file is read on
+every request, so it can be edited while the server runs.
+"""
+
+import argparse
+import json
+import re
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROUTES = (
+    (re.compile(r"/blocks/tip/height"), "tip_height"),
+    (re.compile(r"/tx/([0-9a-f]{64})/hex"), "tx_hex"),
+    (re.compile(r"/tx/([0-9a-f]{64})/outspend/(\d+)"), "outspend"),
+    (re.compile(r"/tx/([0-9a-f]{64})"), "tx"),
+)
+
+
+def status(height):
+    if height is None:
+        return {"confirmed": False}
+    return {"confirmed": True, "block_height": height}
+
+
+class FakeEsploraHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        path = self.path
+        if path.startswith(self.server.prefix):
+            path = path[len(self.server.prefix):]
+        with open(self.server.data_file) as f:
+            data = json.load(f)
+        for pattern, name in ROUTES:
+            match = pattern.fullmatch(path)
+            if match:
+                result = getattr(self, name)(data, *match.groups())
+                break
+        else:
+            result = None
+
+        if result is None:
+            self.send_reply(404, "Not Found", "text/plain")
+        elif isinstance(result, str):
+            self.send_reply(200, result, "text/plain")
+        else:
+            self.send_reply(200, json.dumps(result), "application/json")
+
+    def send_reply(self, code, body, content_type):
+        body = body.encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def tip_height(self, data):
+        return str(data["tip_height"])
+
+    def tx_hex(self, data, txid):
+        tx = data["txs"].get(txid)
+        return tx["hex"] if tx is not None else None
+
+    def tx(self, data, txid):
+        tx = data["txs"].get(txid)
+        if tx is None:
+            return None
+        return {"txid": txid, "status": status(tx.get("block_height"))}
+
+    def outspend(self, data, txid, vout):
+        spend = data.get("outspends", {}).get(txid, {}).get(vout)
+        if spend is None:
+            return {"spent": False}
+        return {
+            "spent": True,
+            "txid": spend["txid"],
+            "vin": spend["vin"],
+            "status": status(spend.get("block_height")),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("data_file")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=3002)
+    parser.add_argument("--prefix", default="/api",
+                        help="path prefix of the API")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), FakeEsploraHandler)
+    server.data_file = args.data_file
+    server.prefix = args.prefix
+    print(f"Serving {args.data_file} on http://{args.host}:{args.port}"
+          f"{args.prefix}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2020-2021 Rugged Bytes IT-Services GmbH
+# Distributed under the MIT software license, see the accompanying
+# file COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+"""
+Compares the four GUI programs started as separate processes (as in
+gui_progs.sh) with all the roles in one loanhost.py process. Each setup
+runs for the given time, then the resident memory of its processes and
+the RPC calls per second they made after the warm-up are printed. The
+calls are counted from the stats the programs export every 2 seconds.
+"""
+
+import argparse
+import json
+import os
+import pathlib
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = pathlib.Path(__file__).parent.parent.absolute()
+
+SETUPS = {
+    "processes": [
+        [f"{ROOT}/{name}GUI.py"]
+        for name in ("creditor", "debtor", "facilitator", "miner")
+    ],
+    "host": [[f"{ROOT}/loanhost.py"]],
+}
+
+
+def rss_kb(pid):
+    """VmRSS of the process and its children"""
+    total = 0
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                total += int(line.split()[1])
+    children = pathlib.Path(f"/proc/{pid}/task/{pid}/children")
+    if children.exists():
+        for child in children.read_text().split():
+            try:
+                total += rss_kb(int(child))
+            except (OSError, ValueError):
+                pass
+    return total
+
+
+def rpc_calls(stats_dir):
+    total = 0
+    for stats_file in pathlib.Path(stats_dir).glob("*.json"):
+        try:
+            stats = json.loads(stats_file.read_text())
+        except (OSError, ValueError):
+            continue
+        total += sum(s["count"] for s in stats if s["kind"] == "rpc")
+    return total
+
+
+def measure(commands, seconds, warmup):
+    with tempfile.TemporaryDirectory() as stats_dir:
+        env = dict(
+            os.environ, LOANS_STATS_EXPORT=f"{stats_dir}/{{pid}}.json"
+        )
+        processes = [
+            subprocess.Popen([sys.executable, *command], cwd=ROOT, env=env)
+            for command in commands
+        ]
+        try:
+            time.sleep(warmup)
+            start, start_calls = time.time(), rpc_calls(stats_dir)
+            time.sleep(seconds)
+            rss = sum(rss_kb(p.pid) for p in processes)
+            elapsed = time.time() - start
+            calls = rpc_calls(stats_dir) - start_calls
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.wait()
+    return rss, calls / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-t", "--seconds", type=int, default=60,
+                        help="the time to count the RPC calls for")
+    parser.add_argument("-w", "--warmup", type=int, default=15,
+                        help="the time for the programs to start")
+    args = parser.parse_args()
+
+    print(f"{'':10}{'RSS MiB':>10}{'RPC calls/s':>14}")
+    for name, commands in SETUPS.items():
+        rss, rate = measure(commands, args.seconds, args.warmup)
+        print(f"{name:10}{rss / 1024:>10.1f}{rate:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2020-2021 Rugged Bytes IT-Services GmbH
+# Distributed under the MIT software license, see the accompanying
+# file COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+"""
+Measures the memory the tracked contracts take, with the steps kept as the
+deserialized transactions and as the slim TrackedStep records. The steps
+are read from the contract store of a role, for example
+creditor_contracts.sqlite.
+"""
+
+import argparse
+import pathlib
+import sys
+import tracemalloc
+
+from bitcointx import ChainParams
+from bitcointx.core import CTransaction, x
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.absolute()))
+
+from common.contract_store import ContractStore, TrackedStep  # noqa: E402
+
+
+def traced_size(make):
+    """The memory taken by what `make` returns"""
+    start = tracemalloc.get_traced_memory()[0]
+    result = make()
+    size = tracemalloc.get_traced_memory()[0] - start
+    del result
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("store_file")
+    parser.add_argument("--network", default="elements")
+    args = parser.parse_args()
+
+    store = ContractStore(args.store_file)
+    contract_ids = store.contract_ids()
+    tracemalloc.start()
+    total_full = total_slim = num_steps = 0
+    print(f"{'contract':18}{'steps':>6}{'full KiB':>10}{'slim KiB':>10}")
+    with ChainParams(args.network):
+        for contract_id in contract_ids:
+            steps = store.load(contract_id).steps
+            if not steps:
+                continue
+            txs = [CTransaction.deserialize(x(step.tx)) for step in steps]
+
+            full = traced_size(
+                lambda: [
+                    CTransaction.deserialize(x(step.tx)) for step in steps
+                ]
+            )
+            slim = traced_size(
+                lambda: [
+                    TrackedStep.from_tx(tx, step.block_num)
+                    for tx, step in zip(txs, steps)
+                ]
+            )
+            total_full += full
+            total_slim += slim
+            num_steps += len(steps)
+            print(f"{contract_id[:16]:18}{len(steps):>6}"
+                  f"{full / 1024:>10.1f}{slim / 1024:>10.1f}")
+
+    if not num_steps:
+        print("no stored steps")
+        return
+    num_contracts = len(contract_ids)
+    print(f"per contract: {total_full / num_contracts / 1024:.1f} KiB full,"
+          f" {total_slim / num_contracts / 1024:.1f} KiB slim")
+    print(f"per step: {total_full / num_steps:.0f} B full,"
+          f" {total_slim / num_steps:.0f} B slim")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+# Copyright (c) 2020-2021 Rugged Bytes IT-Services GmbH
+# Distributed under the MIT software license, see the accompanying
+# file COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+from pathlib import Path
+from typing import List
+
+from PyQt5.QtCore import pyqtSlot
+from PyQt5.QtWidgets import (
+    QDialog,
+    QFileDialog,
+    QTableWidgetItem,
+)
+
+from common import CLIProcessPool, LoaderUI, get_app
+
+from .get_contract_start_delay import GetContractStartDelay
+
+MAKE_COLUMN = 1
+SIGN_COLUMN = 2
+
+MAKE_INPUTS = ("cinfo", "dinfo")
+SIGN_INPUTS = ("tx", "csignature", "dsignature")
+
+
+def get_filename(plan_file, suffix):
+    plan = Path(plan_file)
+    file_name = plan.stem
+    file_path = plan.parent.absolute()
+    file = f"{file_path}/{file_name}.{suffix}"
+    return file
+
+
+def make_contract_args(rpc_param, plan_file, contract_start_delay, network):
+    args: List = [
+        "make",
+        "-r",
+        rpc_param,
+        "--plan",
+        plan_file,
+        "-l",
+        get_filename(plan_file, "cinfo"),
+        "-c",
+        get_filename(plan_file, "dinfo"),
+        "--output-creditor",
+        get_filename(plan_file, "cdata"),
+        "--output-debtor",
+        get_filename(plan_file, "ddata"),
+        "--output-tx",
+        get_filename(plan_file, "tx"),
+        "--contract-start-delay",
+        contract_start_delay,
+        "--network",
+        network
+    ]
+    return args
+
+
+def sign_contract_args(rpc_param, contract_tx_file, network):
+    args: List = [
+        "sign",
+        "-r",
+        rpc_param,
+        "--tx",
+        contract_tx_file,
+        "-c",
+        get_filename(contract_tx_file, "csignature"),
+        "-d",
+        get_filename(contract_tx_file, "dsignature"),
+        "-o",
+        get_filename(contract_tx_file, "stx"),
+        "--network",
+        network
+    ]
+    return args
+
+
+def missing_inputs(plan_file, suffixes):
+    return [
+        suffix for suffix in suffixes
+        if not Path(get_filename(plan_file, suffix)).exists()
+    ]
+
+
+class BatchContractsDialog(QDialog, LoaderUI):
+    """
+    Creates and signs contract transactions for many plans at once.
+    The CLI processes are run in parallel, the failed ones are retried,
+    and the status of each step is shown in the table.
+    """
+
+    def __init__(self, facilitator_cli, network, fee_pool, parent=None):
+        super(BatchContractsDialog, self).__init__(parent)
+        self.setupUi(__file__)
+        self._cli = facilitator_cli
+        self._network = network
+        self._fee_pool = fee_pool
+        self._plans = []
+        self._status = {}
+        self._pool = CLIProcessPool(parent=self)
+        self._pool.job_started.connect(self.job_started)
+        self._pool.job_retrying.connect(self.job_retrying)
+        self._pool.job_finished.connect(self.job_finished)
+        self.maxJobsspinBox.setValue(self._pool.max_jobs)
+        self.maxJobsspinBox.valueChanged.connect(self._pool.set_max_jobs)
+
+    @pyqtSlot(name="on_addPlansButton_clicked")
+    def add_plans(self):
+        app = get_app(self)
+        plan_files, _ = QFileDialog.getOpenFileNames(
+            self, "Open Plans", str(app.path), filter="*.plan",
+        )
+        self.add_plan_files(plan_files)
+
+    @pyqtSlot(name="on_addDirectoryButton_clicked")
+    def add_directory(self):
+        app = get_app(self)
+        plans_dir = QFileDialog.getExistingDirectory(
+            self, "Open Plans Directory", str(app.path),
+        )
+        if plans_dir:
+            self.add_plan_files(
+                str(plan) for plan in sorted(Path(plans_dir).glob("*.plan"))
+            )
+
+    def add_plan_files(self, plan_files):
+        for plan_file in plan_files:
+            plan_file = str(Path(plan_file).absolute())
+            if plan_file in self._plans:
+                continue
+            row = len(self._plans)
+            self._plans.append(plan_file)
+            self.contractsTable.insertRow(row)
+            self.contractsTable.setItem(
+                row, 0, QTableWidgetItem(Path(plan_file).stem)
+            )
+            self.set_status(row, MAKE_COLUMN, "")
+            self.set_status(row, SIGN_COLUMN, "")
+        self.contractsTable.resizeColumnToContents(0)
+
+    def set_status(self, row, column, status, details=None):
+        self._status[(row, column)] = status
+        item = QTableWidgetItem(status)
+        item.setToolTip(details if details else status)
+        self.contractsTable.setItem(row, column, item)
+
+    def is_busy(self, row, column):
+        return self._status[(row, column)] in ("queued", "running", "done")
+
+    @pyqtSlot(name="on_makeButton_clicked")
+    def make_contracts(self):
+        rows = [
+            row for row in range(len(self._plans))
+            if not self.is_busy(row, MAKE_COLUMN)
+        ]
+        if not rows:
+            return
+
+        dlg = GetContractStartDelay()
+        dlg.exec()
+        if not dlg.result():
+            return
+        contract_start_delay = dlg.ContractStartDelay.value()
+
+        app = get_app(self)
+        for row in rows:
+            plan_file = self._plans[row]
+            missing = missing_inputs(plan_file, MAKE_INPUTS)
+            if missing:
+                self.set_status(
+                    row, MAKE_COLUMN, f"missing {', '.join(missing)}"
+                )
+                continue
+            self.set_status(row, MAKE_COLUMN, "queued")
+            self._pool.submit(
+                self._cli,
+                make_contract_args(
+                    app.rpc_param, plan_file, contract_start_delay,
+                    self._network
+                ),
+                (row, MAKE_COLUMN),
+                self.retriesspinBox.value(),
+            )
+
+    @pyqtSlot(name="on_signButton_clicked")
+    def sign_contracts(self):
+        app = get_app(self)
+        for row, plan_file in enumerate(self._plans):
+            if self.is_busy(row, SIGN_COLUMN):
+                continue
+            missing = missing_inputs(plan_file, SIGN_INPUTS)
+            if missing:
+                self.set_status(
+                    row, SIGN_COLUMN, f"missing {', '.join(missing)}"
+                )
+                continue
+            self.set_status(row, SIGN_COLUMN, "queued")
+            # all the signings go through the fee pool
+            self._fee_pool.sign(
+                self._cli,
+                sign_contract_args(
+                    app.rpc_param, get_filename(plan_file, "tx"),
+                    self._network
+                ),
+                Path(plan_file).stem,
+                lambda status_int, output, error, row=row: self.job_finished(
+                    (row, SIGN_COLUMN), status_int, output, error
+                ),
+                lambda row=row: self.set_status(row, SIGN_COLUMN, "running"),
+            )
+
+    def job_started(self, tag):
+        row, column = tag
+        self.set_status(row, column, "running")
+
+    def job_retrying(self, tag, error):
+        row, column = tag
+        self.set_status(row, column, "retrying", error)
+
+    def job_finished(self, tag, status_int, output, error):
+        row, column = tag
+        if status_int:
+            lines = error.strip().splitlines()
+            self.set_status(
+                row, column, f"failed: {lines[-1] if lines else ''}", error
+            )
+        else:
+            self.set_status(row, column, "done", output)
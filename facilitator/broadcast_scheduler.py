@@ -0,0 +1,87 @@
+# Copyright (c) 2020-2021 Rugged Bytes IT-Services GmbH
+# Distributed under the MIT software license, see the accompanying
+# file COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+import heapq
+from pathlib import Path
+
+from bitcointx import ChainParams
+from bitcointx.core import CTransaction, x
+from PyQt5.QtCore import QObject, pyqtSignal
+
+# nLockTime values below this are block heights, above are unix timestamps
+LOCKTIME_THRESHOLD = 500000000
+
+
+def read_locktime(tx_str, network):
+    with ChainParams(network):
+        tx = CTransaction.deserialize(x(tx_str))
+    return tx.nLockTime
+
+
+class BroadcastScheduler(QObject):
+    """
+    Keeps signed transactions ordered by their locktime height, and sends
+    every transaction that became final as soon as the new block height is
+    reported with `check()`
+    """
+
+    changed = pyqtSignal()
+    sent = pyqtSignal(str, str)
+    failed = pyqtSignal(str, str)
+
+    def __init__(self, rpc, network, parent=None):
+        super(BroadcastScheduler, self).__init__(parent)
+        self._rpc = rpc
+        self._network = network
+        self._heap = []
+        self._block_height = None
+
+    def __len__(self):
+        return len(self._heap)
+
+    def entries(self):
+        return sorted((locktime, path) for locktime, path, _ in self._heap)
+
+    def add(self, signed_tx_file):
+        signed_tx_file = str(Path(signed_tx_file).absolute())
+        if any(path == signed_tx_file for _, path, _ in self._heap):
+            return
+        with open(signed_tx_file) as file:
+            tx_str = file.read().strip()
+
+        locktime = read_locktime(tx_str, self._network)
+        if locktime >= LOCKTIME_THRESHOLD:
+            raise ValueError("only block height locktime is supported")
+
+        heapq.heappush(self._heap, (locktime, signed_tx_file, tx_str))
+        self.changed.emit()
+        if self._block_height is not None:
+            self.check(self._block_height)
+
+    def check(self, block_height):
+        self._block_height = block_height
+        # The transaction is final in the next block if its locktime
+        # is less than the height of that block
+        ready = []
+        while self._heap and self._heap[0][0] <= block_height:
+            ready.append(heapq.heappop(self._heap))
+
+        if not ready:
+            return
+
+        for locktime, signed_tx_file, tx_str in ready:
+            try:
+                txid = self._rpc.sendrawtransaction(tx_str)
+            except Exception as e:
+                if "non-final" in str(e):
+                    # the node has not seen the block yet, try on the next one
+                    heapq.heappush(
+                        self._heap, (block_height + 1, signed_tx_file, tx_str)
+                    )
+                else:
+                    self.failed.emit(signed_tx_file, f"{e}")
+                continue
+            self.sent.emit(signed_tx_file, f"{txid}")
+
+        self.changed.emit()
@@ -0,0 +1,327 @@
+# Copyright (c) 2020-2021 Rugged Bytes IT-Services GmbH
+# Distributed under the MIT software license, see the accompanying
+# file COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+import json
+import re
+from collections import deque
+from decimal import Decimal
+from pathlib import Path
+
+from bitcointx.rpc import JSONRPCError
+from PyQt5.QtCore import QObject, QThread, QTimer, pyqtSignal, qInfo
+
+from common import CLIProcessPool
+
+# the CLI tool announces the fee UTXO it locked as txid:vout
+OUTPOINT_RE = re.compile(r"\b([0-9a-fA-F]{64}):(\d+)\b")
+
+
+def outpoint_dict(outpoint):
+    txid, vout = outpoint.split(":")
+    return {"txid": txid, "vout": int(vout)}
+
+
+def split_outputs(rpc, count, amount):
+    """
+    Send `count` outputs of `amount` L-BTC to new addresses of the wallet
+    in one transaction and lock them, returns their outpoints
+    """
+    addresses = [rpc.getnewaddress() for _ in range(count)]
+    scripts = {
+        rpc.getaddressinfo(address)["scriptPubKey"] for address in addresses
+    }
+    txid = rpc.sendmany("", {address: amount for address in addresses})
+    tx = rpc.getrawtransaction(txid, True)
+    outpoints = [
+        f"{txid}:{vout['n']}" for vout in tx["vout"]
+        if vout["scriptPubKey"].get("hex") in scripts
+    ]
+    rpc.lockunspent(False, [outpoint_dict(o) for o in outpoints])
+    return outpoints
+
+
+class SplitThread(QThread):
+    """Splits the fee outputs with its own connection to the node"""
+
+    split = pyqtSignal(list)
+    failed = pyqtSignal(str)
+
+    def __init__(self, make_rpc, count, amount, parent=None):
+        super(SplitThread, self).__init__(parent)
+        self._make_rpc = make_rpc
+        self._count = count
+        self._amount = amount
+
+    def run(self):
+        try:
+            self.split.emit(
+                split_outputs(self._make_rpc(), self._count, self._amount)
+            )
+        except Exception as e:
+            self.failed.emit(f"{e}")
+
+
+class Signing:
+    """A run of the CLI tool signing a contract transaction"""
+
+    def __init__(self, program, args, contract, finished, started):
+        self.program = program
+        self.args = args
+        self.contract = contract
+        self.finished = finished
+        self.started = started
+        self.outpoint = None
+
+
+class FeePool(QObject):
+    """
+    L-BTC outputs of the same amount for the fees of the contract
+    transactions, split off in one transaction and kept locked in the
+    wallet. All the signings of the window are run through the pool, up to
+    `max_signings` at the same time, and every signing unlocks its own
+    output. The CLI tool chooses the fee input itself, so the next signing
+    is started only when the wallet has locked the fee input of the last
+    one. When less than `min_free` outputs are left, the pool is split
+    again up to `size` in the background. Without the pool the signings
+    are started at once.
+    """
+
+    changed = pyqtSignal()
+    failed = pyqtSignal(str)
+
+    def __init__(self, rpc, make_rpc, path, size, amount, min_free,
+                 max_signings, parent=None):
+        super(FeePool, self).__init__(parent)
+        self._rpc = rpc
+        self._make_rpc = make_rpc
+        self._path = Path(path)
+        self._thread = None
+        # outpoint: the contract it is reserved for, None if it is free
+        self._outputs = {}
+        if self._path.exists():
+            with open(self._path) as file:
+                self._outputs = json.load(file)["outputs"]
+        self.configure(size, amount, min_free)
+        self.max_signings = max(1, max_signings)
+        self._queue = deque()
+        self._running = set()
+        # the signing whose CLI tool has not locked its fee input yet, and
+        # the outputs that were locked when it started
+        self._choosing = None
+        self._locked_before = set()
+        # the fee inputs announced by the signings: the contract of each
+        self._claimed = {}
+        self._signings = CLIProcessPool(self.max_signings, self)
+        self._signings.job_finished.connect(self._signing_done)
+        self._choice_timer = QTimer(self)
+        self._choice_timer.setInterval(250)
+        self._choice_timer.timeout.connect(self._check_choice)
+
+    def configure(self, size, amount, min_free):
+        self.size = size
+        self.amount = Decimal(amount)
+        self.min_free = min(min_free, size)
+
+    @property
+    def enabled(self):
+        return self.size > 0 or bool(self._outputs)
+
+    @property
+    def splitting(self):
+        return self._thread is not None
+
+    @property
+    def num_signings(self):
+        return len(self._running)
+
+    def free(self):
+        return [o for o, contract in self._outputs.items() if contract is None]
+
+    def reserved(self):
+        return {
+            contract: o for o, contract in self._outputs.items()
+            if contract is not None
+        }
+
+    def _save(self):
+        with open(self._path, "w") as file:
+            json.dump({"outputs": self._outputs}, file, indent=1)
+        self.changed.emit()
+
+    def _locked(self):
+        return {
+            f"{u['txid']}:{u['vout']}" for u in self._rpc.listlockunspent()
+        }
+
+    def sync(self):
+        """
+        Forget the outputs spent meanwhile and lock the others again, the
+        node does not keep the locks when it restarts. The reservations of
+        the signings that did not finish are dropped.
+        """
+        if not self._outputs:
+            return
+        locked = self._locked()
+        outputs = {}
+        for outpoint in self._outputs:
+            txid, vout = outpoint.split(":")
+            if self._rpc.gettxout(txid, int(vout), True) is not None:
+                outputs[outpoint] = None
+        unlocked = [outpoint_dict(o) for o in outputs if o not in locked]
+        if unlocked:
+            self._rpc.lockunspent(False, unlocked)
+        self._outputs = outputs
+        self._save()
+
+    def replenish(self, force=False):
+        """
+        Split new outputs up to `size` if there are less than `min_free`,
+        or less than `size` when `force` is set
+        """
+        missing = self.size - len(self.free())
+        if self.splitting or missing <= 0:
+            return
+        if not force and len(self.free()) >= self.min_free:
+            return
+        qInfo(f"Fee pool: splitting {missing} outputs of {self.amount}\n")
+        self._thread = SplitThread(self._make_rpc, missing, self.amount, self)
+        self._thread.split.connect(self._split_done)
+        self._thread.failed.connect(self.failed)
+        self._thread.finished.connect(self._thread_finished)
+        self._thread.start()
+        self.changed.emit()
+
+    def _split_done(self, outpoints):
+        for outpoint in outpoints:
+            self._outputs[outpoint] = None
+        # locked by the pool, not by the CLI tool
+        self._locked_before.update(outpoints)
+        self._save()
+
+    def _thread_finished(self):
+        self._thread.deleteLater()
+        self._thread = None
+        self.changed.emit()
+
+    def sign(self, program, args, contract, finished, started=None):
+        """
+        Run the CLI tool signing the contract, `finished` is called with
+        the exit status, the output and the errors of the tool, `started`
+        when it starts. Failed runs are not repeated, the signing is not
+        idempotent: the fee input it chose stays locked.
+        """
+        self._queue.append(Signing(program, args, contract, finished, started))
+        self._start_next()
+
+    def _start_next(self):
+        while (
+            self._queue and self._choosing is None
+            and len(self._running) < self.max_signings
+        ):
+            signing = self._queue.popleft()
+            if not self.enabled:
+                # nothing to reserve, the fee inputs are not waited for
+                self._running.add(signing)
+                if signing.started is not None:
+                    signing.started()
+                self._signings.submit(signing.program, signing.args, signing)
+                self.changed.emit()
+                continue
+            try:
+                signing.outpoint = self._reserve(signing.contract)
+                self._locked_before = self._locked()
+            except JSONRPCError as e:
+                try:
+                    self._release(signing)
+                except JSONRPCError:
+                    pass
+                signing.finished(-1, "", f"Fee pool: {e}")
+                continue
+            self._choosing = signing
+            self._running.add(signing)
+            self._choice_timer.start()
+            if signing.started is not None:
+                signing.started()
+            self._signings.submit(signing.program, signing.args, signing)
+            self.changed.emit()
+
+    def _reserve(self, contract):
+        """
+        Unlock a free output for the signing of the contract, returns its
+        outpoint, or None if the pool is empty and the CLI tool chooses
+        from the other coins of the wallet
+        """
+        free = self.free()
+        if not free:
+            self.replenish()
+            return None
+        outpoint = free[0]
+        self._rpc.lockunspent(True, [outpoint_dict(outpoint)])
+        self._outputs[outpoint] = contract
+        self._save()
+        self.replenish()
+        return outpoint
+
+    def _check_choice(self):
+        """The next signing starts when the fee input of the last is locked"""
+        try:
+            locked = self._locked()
+        except JSONRPCError:
+            return
+        if locked - self._locked_before:
+            self._choice_done()
+
+    def _choice_done(self):
+        self._choosing = None
+        self._choice_timer.stop()
+        self._start_next()
+
+    def _signing_done(self, signing, status_int, output, error):
+        self._running.discard(signing)
+        fee_inputs = {
+            f"{txid.lower()}:{vout}"
+            for txid, vout in OUTPOINT_RE.findall(output)
+        }
+        taken = {
+            o: self._claimed[o] for o in fee_inputs
+            if self._claimed.get(o, signing.contract) != signing.contract
+        }
+        if not status_int and taken:
+            status_int = 1
+            error = "".join(
+                f"the fee input {o} is used by the contract {contract}\n"
+                for o, contract in taken.items()
+            )
+        elif not status_int:
+            for outpoint in fee_inputs:
+                self._claimed[outpoint] = signing.contract
+                self._outputs.pop(outpoint, None)
+        try:
+            self._release(signing)
+        except JSONRPCError as e:
+            status_int = status_int or 1
+            error += f"Fee pool: {e}\n"
+        if signing is self._choosing:
+            self._choosing = None
+            self._choice_timer.stop()
+        signing.finished(status_int, output, error)
+        self._start_next()
+        self.changed.emit()
+
+    def _release(self, signing):
+        """Lock the reserved output again if the signing did not use it"""
+        outpoint, signing.outpoint = signing.outpoint, None
+        if outpoint is None or outpoint not in self._outputs:
+            return
+        try:
+            self._rpc.lockunspent(False, [outpoint_dict(outpoint)])
+        except JSONRPCError:
+            # spent or locked by something else
+            del self._outputs[outpoint]
+            raise
+        else:
+            self._outputs[outpoint] = None
+            self._locked_before.add(outpoint)
+        finally:
+            self._save()
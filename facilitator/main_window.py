@@ -3,32 +3,64 @@
 # file COPYING or http://www.opensource.org/licenses/mit-license.php.
 
 import sys
+import time
+from decimal import Decimal
 from pathlib import Path
-from typing import List
 
 from PyQt5 import QtCore
-from PyQt5.QtCore import QProcess, Qt, QTimer, qInfo
-from PyQt5.QtWidgets import QApplication, QFileDialog, QMainWindow, QMessageBox
+from PyQt5.QtCore import QProcess, Qt, QThread, pyqtSlot, qInfo
+from PyQt5.QtWidgets import (
+    QApplication,
+    QFileDialog,
+    QInputDialog,
+    QLabel,
+    QMainWindow,
+    QMessageBox,
+)
 
-from common import LoaderUI
+from common import (
+    GuiRPCCaller,
+    LoaderUI,
+    PipelineStep,
+    PlansPipelineMixin,
+    add_stats_panel,
+    cached_property,
+    call_stats,
+    cli_command_name,
+    get_app,
+    write_setup_metrics,
+)
 
+from .batch_contracts import (
+    BatchContractsDialog,
+    make_contract_args,
+    sign_contract_args,
+)
+from .broadcast_scheduler import BroadcastScheduler
+from .fee_pool import FeePool
 from .get_contract_start_delay import GetContractStartDelay
 
 
-class MainWindow(QMainWindow, LoaderUI):
+class MainWindow(QMainWindow, LoaderUI, PlansPipelineMixin):
+    pipeline_steps = (
+        PipelineStep("make", ("plan", "cinfo", "dinfo"), ("tx",)),
+        PipelineStep("sign", ("tx", "csignature", "dsignature"), ("stx",)),
+        PipelineStep("send", ("stx",), ()),
+    )
+
     def __init__(self):
         super(MainWindow, self).__init__()
         self.setupUi(__file__)
+        self.stats_panel = add_stats_panel(self)
         self.CreateCotractButton.clicked.connect(self.create_contract)
 
         self.SignButton.clicked.connect(self.sign_contract)
         self.SendButton.clicked.connect(self.send_contract)
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update_block_high)
-        self.timer.setInterval(1000)
-        self.timer.start()
+        self._batch_dialog = None
+        self._block_high = None
+        self.init_pipeline()
 
-        app = QApplication.instance()
+        app = get_app(self)
 
         self.blockchain_network = app.common_settings.value(
             "blockchain_network")
@@ -38,17 +70,185 @@ class MainWindow(QMainWindow, LoaderUI):
             app.common_settings.setValue("blockchain_network",
                                          self.blockchain_network)
 
-    def update_block_high(self):
+        self.scheduler = BroadcastScheduler(
+            app.rpc, self.blockchain_network, self
+        )
+        self.scheduler.changed.connect(self.update_schedule_list)
+        self.scheduler.sent.connect(self.scheduled_tx_sent)
+        self.scheduler.failed.connect(self.scheduled_tx_failed)
+        self.scheduleDock.hide()
+
+        size = app.settings.value("fee_pool/size", 0, type=int)
+        self.fee_pool = FeePool(
+            app.rpc,
+            lambda: GuiRPCCaller(**app.rpc_kwargs),
+            app.path / f"{app.config_name.lower()}_fee_pool.json",
+            size,
+            app.settings.value("fee_pool/output_amount", "0.0001"),
+            app.settings.value("fee_pool/min_free", size // 2, type=int),
+            app.settings.value(
+                "fee_pool/max_signings", QThread.idealThreadCount(), type=int
+            ),
+            self,
+        )
+        self.fee_pool_label = QLabel(self)
+        self.statusbar.addPermanentWidget(self.fee_pool_label)
+        self.fee_pool.changed.connect(self.update_fee_pool)
+        self.fee_pool.failed.connect(self.fee_pool_failed)
+        try:
+            self.fee_pool.sync()
+        except Exception as e:
+            self.fee_pool_failed(f"{e}")
+        self.update_fee_pool()
+
+        app.block_monitor.block_high_updated.connect(self.update_block_high)
+        self.update_block_high(app.rpc.getblockcount())
+
+    @cached_property
+    def facilitator_cli(self):
+        app = get_app(self)
+        if getattr(sys, "frozen", False):
+            return f"{app.path}/cli/facilitator_cli"
+        return f"{app.path}/cli/facilitator_cli.py"
+
+    @pyqtSlot(name="on_actionBatchContracts_triggered")
+    def show_batch_contracts(self):
+        if self._batch_dialog is None:
+            self._batch_dialog = BatchContractsDialog(
+                self.facilitator_cli, self.blockchain_network, self.fee_pool,
+                self
+            )
+        self._batch_dialog.show()
+        self._batch_dialog.raise_()
+
+    def run_pipeline_step(self, plan_file, step_name):
+        app = get_app(self)
+        plan = Path(plan_file)
+        if step_name == "make":
+            contract_start_delay = app.settings.value(
+                "pipeline/contract_start_delay", 10, type=int
+            )
+            args = make_contract_args(
+                app.rpc_param, plan_file, contract_start_delay,
+                self.blockchain_network
+            )
+        elif step_name == "sign":
+            # all the signings go through the fee pool
+            self.fee_pool.sign(
+                self.facilitator_cli,
+                sign_contract_args(
+                    app.rpc_param, plan.with_suffix(".tx"),
+                    self.blockchain_network
+                ),
+                plan.stem,
+                lambda status_int, output, error: self.pipeline_step_done(
+                    (plan_file, step_name), status_int, output, error
+                ),
+            )
+            return
+        elif step_name == "send":
+            signed_tx_file = plan.with_suffix(".stx")
+            if self.created_before_watching(signed_tx_file):
+                # signed before the watching started, probably already sent
+                return
+            setup_time = write_setup_metrics(plan.parent, plan.stem)
+            qInfo(f"{plan.stem}: contract setup took {setup_time} s\n")
+            try:
+                self.scheduler.add(signed_tx_file)
+            except Exception as e:
+                qInfo(f"{plan.stem}: send failed: {e}\n")
+            return
+        else:
+            return
+        # the arguments already include --network
+        self.pipeline_pool.submit(
+            self.facilitator_cli, args, (plan_file, step_name)
+        )
+
+    @pyqtSlot(name="on_actionFeePool_triggered")
+    def configure_fee_pool(self):
+        app = get_app(self)
+        size, ok = QInputDialog.getInt(
+            self, "Fee Pool", "Number of fee outputs (0 to stop splitting):",
+            self.fee_pool.size, 0, 1000,
+        )
+        if not ok:
+            return
+        amount, ok = QInputDialog.getDouble(
+            self, "Fee Pool", "Amount of every output:",
+            float(self.fee_pool.amount), 0.00000001, 1, 8,
+        )
+        if not ok:
+            return
+        amount = f"{Decimal(amount):.8f}"
+        min_free = app.settings.value("fee_pool/min_free", size // 2, type=int)
+        app.settings.setValue("fee_pool/size", size)
+        app.settings.setValue("fee_pool/output_amount", amount)
+        self.fee_pool.configure(size, amount, min_free)
+        self.fee_pool.replenish(force=True)
+        self.update_fee_pool()
+
+    def update_fee_pool(self):
+        self.fee_pool_label.setVisible(self.fee_pool.enabled)
+        self.fee_pool_label.setText(
+            f"Fee pool: {len(self.fee_pool.free())} free,"
+            f" {len(self.fee_pool.reserved())} reserved,"
+            f" {self.fee_pool.num_signings} signing"
+            + (", splitting" if self.fee_pool.splitting else "")
+        )
+
+    def fee_pool_failed(self, error):
+        qInfo(f"Fee pool: {error}\n")
+        self.statusbar.showMessage(f"Fee pool: {error}", 10000)
+
+    @pyqtSlot(int)
+    def update_block_high(self, block_high):
         _translate = QtCore.QCoreApplication.translate
-        app = QApplication.instance()
-        block_high = app.rpc.getblockcount()
         self.blockhigh.setText(
             _translate("MainWindow", "Current block: ") + f"{block_high}"
         )
-        self.timer.start()
+        if block_high != self._block_high:
+            self._block_high = block_high
+            self.scheduler.check(block_high)
+            self.fee_pool.replenish()
+
+    @pyqtSlot(name="on_actionScheduleSend_triggered")
+    def schedule_send(self):
+        app = get_app(self)
+        signed_tx_files, _ = QFileDialog.getOpenFileNames(
+            self, "Open Signed Tx", str(app.path), filter="*.stx",
+        )
+        for signed_tx_file in signed_tx_files:
+            try:
+                self.scheduler.add(signed_tx_file)
+            except Exception as e:
+                QMessageBox.critical(
+                    self, "Schedule Error",
+                    f"{Path(signed_tx_file).name} was not scheduled: {e}"
+                )
+
+    def update_schedule_list(self):
+        self.scheduleList.clear()
+        for locktime, signed_tx_file in self.scheduler.entries():
+            self.scheduleList.addItem(
+                f"{Path(signed_tx_file).name}: block {locktime}"
+            )
+        self.scheduleDock.setVisible(len(self.scheduler) > 0)
+
+    def scheduled_tx_sent(self, signed_tx_file, txid):
+        qInfo(f"{signed_tx_file} was sent: {txid}\n")
+        self.statusbar.showMessage(
+            f"{Path(signed_tx_file).name} was sent", 5000
+        )
+
+    def scheduled_tx_failed(self, signed_tx_file, error):
+        QMessageBox.critical(
+            self, "Send Error",
+            f"{Path(signed_tx_file).name} was not sent: {error}"
+        )
 
     def create_contract(self):
-        app = QApplication.instance()
+        app = get_app(self)
         plan_file, _ = QFileDialog.getOpenFileName(
             self, "Open Plan", str(app.path), filter="*.plan",
         )
@@ -62,37 +262,22 @@ class MainWindow(QMainWindow, LoaderUI):
         if dlg.result():
             contract_start_delay = dlg.ContractStartDelay.value()
 
-            creditor_file = self.get_filename(plan_file, "cinfo")
-            debtor_file = self.get_filename(plan_file, "dinfo")
-            filecreditor = self.get_filename(plan_file, "cdata")
-            filedebtor = self.get_filename(plan_file, "ddata")
-            filetxdata = self.get_filename(plan_file, "tx")
-            args: List = [
-                "make",
-                "-r",
-                app.rpc_param,
-                "--plan",
-                plan_file,
-                "-l",
-                creditor_file,
-                "-c",
-                debtor_file,
-                "--output-creditor",
-                filecreditor,
-                "--output-debtor",
-                filedebtor,
-                "--output-tx",
-                filetxdata,
-                "--contract-start-delay",
-                contract_start_delay,
-                "--network",
+            args = make_contract_args(
+                app.rpc_param, plan_file, contract_start_delay,
                 blockchain_network
-            ]
+            )
             process = QProcess(self)
             QApplication.setOverrideCursor(Qt.WaitCursor)
+            started = time.perf_counter()
 
             def contract_created(status_int, status):
                 QApplication.restoreOverrideCursor()
+                call_stats.observe(
+                    "cli",
+                    cli_command_name(self.facilitator_cli, args),
+                    time.perf_counter() - started,
+                    status_int == 0,
+                )
                 if status_int:
                     result = \
                         process.readAllStandardError().data().decode("utf-8")
@@ -110,16 +295,11 @@ class MainWindow(QMainWindow, LoaderUI):
 
             args = [str(arg) for arg in args]
             process.finished.connect(contract_created)
-            if getattr(sys, "frozen", False):
-                facilitator_cli = f"{app.path}/cli/facilitator_cli"
-            else:
-                facilitator_cli = f"{app.path}/cli/facilitator_cli.py"
-
-            qInfo(f"CLI: {facilitator_cli} {' '.join(args)}\n")
-            process.start(facilitator_cli, args)
+            qInfo(f"CLI: {self.facilitator_cli} {' '.join(args)}\n")
+            process.start(self.facilitator_cli, args)
 
     def sign_contract(self):
-        app = QApplication.instance()
+        app = get_app(self)
         contract_tx_file, _ = QFileDialog.getOpenFileName(
             self, "Open Contract Tx", str(app.path), filter="*.tx",
         )
@@ -128,35 +308,16 @@ class MainWindow(QMainWindow, LoaderUI):
 
         blockchain_network = app.common_settings.value("blockchain_network")
 
-        creditor_sign_file = self.get_filename(contract_tx_file, "csignature")
-        debtor_sign_file = self.get_filename(contract_tx_file, "dsignature")
-        filetx = self.get_filename(contract_tx_file, "stx")
-        args: List = [
-            "sign",
-            "-r",
-            app.rpc_param,
-            "--tx",
-            contract_tx_file,
-            "-c",
-            creditor_sign_file,
-            "-d",
-            debtor_sign_file,
-            "-o",
-            filetx,
-            "--network",
-            blockchain_network
-        ]
-        process = QProcess(self)
+        args = sign_contract_args(
+            app.rpc_param, contract_tx_file, blockchain_network
+        )
         QApplication.setOverrideCursor(Qt.WaitCursor)
 
-        def contract_signed(status_int, status):
+        def contract_signed(status_int, output, error):
             QApplication.restoreOverrideCursor()
             if status_int:
-                result = process.readAllStandardError().data().decode("utf-8")
-                QMessageBox.critical(self, "Error", result)
+                QMessageBox.critical(self, "Error", error)
             else:
-                output = \
-                    process.readAllStandardOutput().data().decode("utf-8")
                 self.statusbar.showMessage(
                     f"Contract transaction was signed", 5000)
                 QMessageBox.information(
@@ -165,18 +326,13 @@ class MainWindow(QMainWindow, LoaderUI):
                     f"{output}\n",
                 )
 
-        args = [str(arg) for arg in args]
-        process.finished.connect(contract_signed)
-        if getattr(sys, "frozen", False):
-            facilitator_cli = f"{app.path}/cli/facilitator_cli"
-        else:
-            facilitator_cli = f"{app.path}/cli/facilitator_cli.py"
-
-        qInfo(f"CLI: {facilitator_cli} {' '.join(args)}\n")
-        process.start(facilitator_cli, args)
+        self.fee_pool.sign(
+            self.facilitator_cli, args, Path(contract_tx_file).stem,
+            contract_signed,
+        )
 
     def send_contract(self):
-        app = QApplication.instance()
+        app = get_app(self)
         signed_tx_file, _ = QFileDialog.getOpenFileName(
             self, "Open Signed Tx", str(app.path), filter="*.stx",
         )
@@ -197,10 +353,3 @@ class MainWindow(QMainWindow, LoaderUI):
         QMessageBox.information(
             self, "Info", "contract transaction was sent",
         )
-
-    def get_filename(self, plan_file, suffix):
-        plan = Path(plan_file)
-        file_name = plan.stem
-        file_path = plan.parent.absolute()
-        file = f"{file_path}/{file_name}.{suffix}"
-        return file
@@ -4,8 +4,8 @@
 # Distributed under the MIT software license, see the accompanying
 # file COPYING or http://www.opensource.org/licenses/mit-license.php.
 
+import argparse
 import os
-import sys
 
 import elementstx  # noqa
 from bitcointx import select_chain_params
@@ -36,27 +36,81 @@ def get_random_addr():
     return addr
 
 
-select_chain_params(sys.argv[1])
+def asset_names(count):
+    for num in range(count):
+        if num < len(ASSET_NAMES):
+            yield ASSET_NAMES[num]
+        else:
+            yield f"ASSET{num + 1}"
 
-rpc1 = RPCCaller(conf_file=sys.argv[2])
-rpc2 = RPCCaller(conf_file=sys.argv[3])
 
-for asset_name in ASSET_NAMES:
-    issued = rpc1.issueasset(satoshi_to_coins(1_000_000), 0)
+def issue_batch(rpc1, rpc2, names, amount, share):
+    """
+    Issue the assets and send the share of each of them to the second
+    wallet with a single transaction, then mine one block for the batch
+    """
+    issued = [(name, rpc1.issueasset(satoshi_to_coins(amount), 0))
+              for name in names]
+
+    amount_to_send = int(amount * share)
+    if amount_to_send:
+        amounts = {}
+        output_assets = {}
+        for _, issue in issued:
+            addr = rpc2.getnewaddress()
+            amounts[addr] = satoshi_to_coins(amount_to_send)
+            output_assets[addr] = issue["asset"]
+        rpc1.sendmany(
+            "",
+            amounts,
+            0,
+            "",
+            [],
+            False,
+            1,
+            "CONSERVATIVE",
+            output_assets,
+        )
+    rpc1.generatetoaddress(1, str(get_random_addr()))
+    return [(name, issue["asset"]) for name, issue in issued]
 
-    print(f"-assetdir={issued['asset']}:{asset_name} ", end='')
 
-    rpc1.sendtoaddress(
-        rpc2.getnewaddress(),
-        satoshi_to_coins(500_000),
-        "",
-        "",
-        False,
-        False,
-        1,
-        "CONSERVATIVE",
-        issued["asset"],
+def main():
+    parser = argparse.ArgumentParser(
+        description="Issue the mock assets and share them between wallets"
     )
-    rpc1.generatetoaddress(1, str(get_random_addr()))
+    parser.add_argument("chain")
+    parser.add_argument("conf_file1")
+    parser.add_argument("conf_file2")
+    parser.add_argument("-n", "--count", type=int, default=len(ASSET_NAMES),
+                        help="number of assets to issue")
+    parser.add_argument("--amount", type=int, default=1_000_000,
+                        help="amount of each asset, in satoshi")
+    parser.add_argument("--share", type=float, default=0.5,
+                        help="part of each asset sent to the second wallet")
+    # unconfirmed issuances form a chain of transactions spending the fee
+    # change, keep it below the default mempool limit of 25 ancestors
+    parser.add_argument("--batch-size", type=int, default=20,
+                        help="number of assets issued per block")
+    args = parser.parse_args()
+
+    select_chain_params(args.chain)
+
+    rpc1 = RPCCaller(conf_file=args.conf_file1)
+    rpc2 = RPCCaller(conf_file=args.conf_file2)
+
+    names = list(asset_names(args.count))
+    issued = []
+    for idx in range(0, len(names), args.batch_size):
+        issued.extend(
+            issue_batch(
+                rpc1, rpc2, names[idx:idx + args.batch_size],
+                args.amount, args.share
+            )
+        )
+
+    print(" ".join(f"-assetdir={asset}:{name}" for name, asset in issued))
+
 
-print()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2020-2021 Rugged Bytes IT-Services GmbH
+# Distributed under the MIT software license, see the accompanying
+# file COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+"""
+Opens the windows of the given roles in one process. The roles that use
+the same node share one RPC connection and poll it only once.
+"""
+
+import argparse
+from sys import exit
+
+import creditor
+import debtor
+import facilitator
+import miner
+from common import LoanHost
+from creditorGUI import CreditorApp
+from debtorGUI import DebtorApp
+from facilitatorGUI import FacilitatorApp
+from minerGUI import MinerApp
+
+ROLES = {
+    "creditor": (CreditorApp, creditor),
+    "debtor": (DebtorApp, debtor),
+    "facilitator": (FacilitatorApp, facilitator),
+    "miner": (MinerApp, miner),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "roles", nargs="*", metavar="role",
+        help=f"{', '.join(ROLES)}, all by default",
+    )
+    args = parser.parse_args()
+    for name in args.roles:
+        if name not in ROLES:
+            parser.error(f"unknown role {name}")
+
+    app = LoanHost()
+    for name in dict.fromkeys(args.roles or ROLES):
+        app_class, package = ROLES[name]
+        app.add_role(
+            app_class, package.MainWindow, conf_file=package.conf_file
+        )
+    return app.exec_()
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,87 @@
+# Copyright (c) 2020-2021 Rugged Bytes IT-Services GmbH
+# Distributed under the MIT software license, see the accompanying
+# file COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+import pathlib
+
+from common.contract_store import ContractStore
+from common.portfolio import contract_key_cache, flat_plan_cache
+
+CONTRACT_DATA_SUFFIXES = (".cdata", ".ddata")
+
+
+def contract_timeouts(plan_file, start_block, position=None):
+    """
+    The block height where the payment window of the current stage of the
+    contract ends, `position` is the stage as stored in the contract store.
+    All the heights where a window ends if the stage is not known.
+    """
+    flat = flat_plan_cache.get(plan_file)
+    periods = (
+        set(flat.period.tolist()) if position is None
+        else {int(flat.period[position])}
+    )
+    return sorted(
+        start_block + period * flat.num_blocks_in_period
+        for period in periods
+    )
+
+
+def tracked_positions(store_paths):
+    """
+    The `contract_positions()` of the contract stores that exist. The stage
+    is taken from the first store that has one, the contract is finished
+    if any of them says so.
+    """
+    positions = {}
+    for path in store_paths:
+        if not pathlib.Path(path).exists():
+            continue
+        store = ContractStore(path)
+        try:
+            stored = store.contract_positions()
+        finally:
+            store.close()
+        for contract_id, (position, finished) in stored.items():
+            known, known_finished = positions.get(contract_id, (None, False))
+            positions[contract_id] = (
+                position if known is None else known,
+                finished or known_finished,
+            )
+    return positions
+
+
+def contract_deadlines(plans_dir, store_paths=()):
+    """
+    The timeouts for the open contracts in the directory, the contract is
+    the plan with the contract data of the Creditor or the Debtor next to
+    it. The finished contracts are left out, the contracts that were never
+    tracked have all their timeouts.
+    """
+    positions = tracked_positions(store_paths)
+    deadlines = []
+    for plan_file in pathlib.Path(plans_dir).glob("*.plan"):
+        for suffix in CONTRACT_DATA_SUFFIXES:
+            data_file = plan_file.with_suffix(suffix)
+            if data_file.exists():
+                break
+        else:
+            continue
+        try:
+            contract_id, start_block = contract_key_cache.get(data_file)
+            position, finished = positions.get(contract_id, (None, False))
+            if finished:
+                continue
+            deadlines.extend(
+                contract_timeouts(plan_file, start_block, position)
+            )
+        except Exception:
+            continue
+    return sorted(deadlines)
+
+
+def next_deadline(plans_dir, block_height, store_paths=()):
+    for deadline in contract_deadlines(plans_dir, store_paths):
+        if deadline >= block_height:
+            return deadline
+    return None
@@ -3,16 +3,28 @@
 # file COPYING or http://www.opensource.org/licenses/mit-license.php.
 
 import os
+from itertools import cycle
 
 from bitcointx import ChainParams
 from bitcointx.core.key import CKey
+from bitcointx.rpc import JSONRPCError
 from bitcointx.wallet import P2WPKHCoinAddress
 from elementstx.wallet import CCoinConfidentialAddress
 from PyQt5 import QtCore
 from PyQt5.QtCore import QTimer, pyqtSlot
-from PyQt5.QtWidgets import QApplication, QMainWindow
+from PyQt5.QtWidgets import (
+    QFileDialog,
+    QMainWindow,
+    QMessageBox,
+)
 
-from common import LoaderUI
+from common import LoaderUI, add_stats_panel, get_app
+
+from .deadlines import next_deadline
+
+# the blocks are mined this many at a time, the window is not blocked
+# while many are mined
+MINE_CHUNK = 10
 
 
 def _get_random_addr():
@@ -25,9 +37,27 @@ def _get_random_addr():
     return addr
 
 
-def generate_block(rpc):
-    """Generate one block"""
-    return rpc.generatetoaddress(1, str(_get_random_addr()))
+class AddressPool:
+    """Random addresses for the coinbase outputs, generated in advance"""
+
+    def __init__(self, size=16):
+        self.size = size
+        self._addrs = None
+
+    def get(self):
+        if self._addrs is None:
+            self._addrs = cycle(
+                [str(_get_random_addr()) for _ in range(self.size)]
+            )
+        return next(self._addrs)
+
+
+address_pool = AddressPool()
+
+
+def generate_block(rpc, num_blocks=1):
+    """Generate `num_blocks` blocks with one call"""
+    return rpc.generatetoaddress(num_blocks, address_pool.get())
 
 
 class BlockGenerator(QTimer):
@@ -36,7 +66,7 @@ class BlockGenerator(QTimer):
         self.setInterval(4000)
 
     def timerEvent(self, event):
-        app = QApplication.instance()
+        app = get_app(self)
         generate_block(app.rpc)
 
 
@@ -44,20 +74,87 @@ class MainWindow(QMainWindow, LoaderUI):
     def __init__(self):
         super(MainWindow, self).__init__()
         self.setupUi(__file__)
+        self.stats_panel = add_stats_panel(self)
         self.generator = BlockGenerator(self)
-        self.timer = QTimer(self)
-        self.timer.timeout.connect(self.update_block_high)
-        self.timer.setInterval(1000)
-        self.timer.start()
-
-    def update_block_high(self):
+        self._blocks_left = 0
+        self._mine_timer = QTimer(self)
+        self._mine_timer.setInterval(0)
+        self._mine_timer.timeout.connect(self.mine_chunk)
+        app = get_app(self)
+        app.block_monitor.block_high_updated.connect(self.update_block_high)
+        self.update_block_high(app.rpc.getblockcount())
+
+    @pyqtSlot(int)
+    def update_block_high(self, block_high):
         _translate = QtCore.QCoreApplication.translate
-        app = QApplication.instance()
-        block_high = app.rpc.getblockcount()
         self.blockhigh.setText(
             _translate("MainWindow", "Current block: ") + f"{block_high}"
         )
 
+    def mine(self, num_blocks):
+        """Mine the blocks in chunks, replaces the blocks left to mine"""
+        self._blocks_left = max(num_blocks, 0)
+        self._mine_timer.start()
+
+    def mine_chunk(self):
+        app = get_app(self)
+        num_blocks = min(self._blocks_left, MINE_CHUNK)
+        try:
+            if num_blocks > 0:
+                generate_block(app.rpc, num_blocks)
+            block_high = app.rpc.getblockcount()
+        except JSONRPCError as e:
+            self._blocks_left = 0
+            self._mine_timer.stop()
+            self.statusbar.showMessage(f"Mining failed: {e}", 5000)
+            return
+        self._blocks_left -= num_blocks
+        self.update_block_high(block_high)
+        if self._blocks_left > 0:
+            self.statusbar.showMessage(
+                f"Mined up to block {block_high},"
+                f" {self._blocks_left} blocks left"
+            )
+            return
+        self._mine_timer.stop()
+        self.statusbar.showMessage(f"Mined up to block {block_high}", 5000)
+
+    @pyqtSlot(name="on_mineButton_clicked")
+    def mine_blocks(self):
+        self.mine(self.num_blocks.value())
+
+    @pyqtSlot(name="on_mineToButton_clicked")
+    def mine_to_height(self):
+        app = get_app(self)
+        self.mine(self.target_height.value() - app.rpc.getblockcount())
+
+    @pyqtSlot(name="on_nextDeadlineButton_clicked")
+    def mine_to_next_deadline(self):
+        app = get_app(self)
+        plans_dir = app.settings.value("plans_dir")
+        if not plans_dir or not os.path.isdir(plans_dir):
+            plans_dir = QFileDialog.getExistingDirectory(
+                self, "Open Plans Directory", str(app.path),
+            )
+            if not plans_dir:
+                return
+            app.settings.setValue("plans_dir", plans_dir)
+
+        block_high = app.rpc.getblockcount()
+        store_paths = [
+            app.path / f"{name}_contracts.sqlite"
+            for name in ("creditor", "debtor")
+        ]
+        deadline = next_deadline(plans_dir, block_high, store_paths)
+        if deadline is None:
+            QMessageBox.information(
+                self, "Info", f"No contract deadlines in {plans_dir}"
+            )
+            return
+        # the payment window is over in the block after the timeout
+        self.target_height.setValue(deadline + 1)
+        self.mine(deadline + 1 - block_high)
+
     @pyqtSlot(int, name="on_autogen_stateChanged")
     def change_generator(self, status):
         if status:
@@ -67,6 +164,7 @@ class MainWindow(QMainWindow, LoaderUI):
 
     def closeEvent(self, event):
         self.generator.stop()
+        self._mine_timer.stop()
 
     @pyqtSlot(int, name="on_mine_period_valueChanged")
     def update_mining_config(self, value):
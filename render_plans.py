@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2020-2021 Rugged Bytes IT-Services GmbH
+# Distributed under the MIT software license, see the accompanying
+# file COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+"""
+Renders the stage diagrams of all the .plan files in the directory to
+SVG and PNG files, without opening any window.
+"""
+
+import argparse
+import os
+import pathlib
+import sys
+
+from common.plan_diagram import FORMATS, render_plans
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("plans_dir")
+    parser.add_argument("-o", "--out-dir", default=None,
+                        help="where to write the diagrams, plans_dir by "
+                        "default")
+    parser.add_argument("-f", "--format", action="append",
+                        choices=FORMATS, default=None,
+                        help="svg and png by default")
+    parser.add_argument("-s", "--scale", type=int, default=1,
+                        help="scale of the PNG images")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="number of rendering processes")
+    args = parser.parse_args()
+
+    plan_files = sorted(pathlib.Path(args.plans_dir).glob("*.plan"))
+    out_dir = pathlib.Path(args.out_dir or args.plans_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    failed = 0
+    for plan_file, written, error in render_plans(
+        plan_files, out_dir, tuple(args.format or FORMATS), args.scale,
+        args.jobs,
+    ):
+        if error is not None:
+            failed += 1
+            print(f"{plan_file.name}: {error}", file=sys.stderr)
+        else:
+            print(f"{plan_file.name}: {', '.join(written)}")
+    print(f"{len(plan_files) - failed} of {len(plan_files)} plans rendered")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,503 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2020-2021 Rugged Bytes IT-Services GmbH
+# Distributed under the MIT software license, see the accompanying
+# file COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+"""
+Runs many loan contracts through their whole lifecycle at once with the CLI
+tools: the plan is made, accepted, the contract transaction is created,
+signed and sent, and then the debtor pays, pays early or is late, the
+creditor revokes the payment windows, spends the payments and grabs
+the collateral, while the blocks are being mined in the background.
+Meanwhile the tracker follows the contracts on the chain as the GUI does.
+The latency of every CLI command, the steps found by the tracker and their
+delay from the block being mined are measured, and the summary is printed
+as JSON at the end.
+"""
+
+import argparse
+import json
+import pathlib
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from bitcointx import ChainParams
+from bitcointx.core import b2lx
+from bitcointx.rpc import JSONRPCError, RPCCaller
+from cli.lib.constants import CONTRACT_COLLATERAL_INP_INDEX
+from cli.lib.rpc_utils import track_tx_by_prevouts
+from cli.lib.types import DataLookupError
+
+from common.chain_backend import ChainBackendError, EsploraBackend, RPCBackend
+from common.demo_config import link_to_esplora
+from common.file_cache import plan_cache
+
+APP_PATH = pathlib.Path(__file__).parent.absolute()
+
+
+class Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latency = defaultdict(list)
+        self._failed = defaultdict(int)
+        self.outcomes = defaultdict(int)
+
+    def record(self, name, seconds, ok):
+        with self._lock:
+            self._latency[name].append(seconds)
+            if not ok:
+                self._failed[name] += 1
+
+    def add_outcome(self, outcome):
+        with self._lock:
+            self.outcomes[outcome] += 1
+
+    def summary(self):
+        result = {}
+        for name, latency in sorted(self._latency.items()):
+            latency = sorted(latency)
+            if len(latency) > 1:
+                quantiles = statistics.quantiles(
+                    latency, n=100, method="inclusive"
+                )
+                p50, p90, p99 = quantiles[49], quantiles[89], quantiles[98]
+            else:
+                p50 = p90 = p99 = latency[0]
+            result[name] = {
+                "count": len(latency),
+                "failed": self._failed[name],
+                "p50": round(p50, 3),
+                "p90": round(p90, 3),
+                "p99": round(p99, 3),
+                "max": round(latency[-1], 3),
+            }
+        return result
+
+
+class TrackedContract:
+    def __init__(self, txid, block_height):
+        self.txid = txid
+        self.block_height = block_height
+        self.outputs = None
+        self.checked = set()
+
+
+class Tracker:
+    """
+    Follows the contracts the way the GUI does: the chain backend tells which
+    outputs of the last step were spent, and the next step is the transaction
+    spending one of them with the collateral input. For every step found the
+    delay from its block being mined is recorded.
+    """
+
+    def __init__(self, scenario):
+        self._scenario = scenario
+        self._lock = threading.Lock()
+        self._contracts = {}
+        self._mined_at = {}
+        self.steps = 0
+
+    def mined(self, block_height):
+        with self._lock:
+            self._mined_at[block_height] = time.monotonic()
+
+    def follow(self, name, txid, block_height):
+        with self._lock:
+            self._contracts[name] = TrackedContract(txid, block_height)
+
+    def make_backend(self, rpc):
+        args = self._scenario.args
+        if args.chain_backend == "esplora":
+            return EsploraBackend(args.esplora_api)
+        return RPCBackend(rpc)
+
+    def run(self, stop):
+        rpc = self._scenario.rpc("creditor")
+        backend = self.make_backend(rpc)
+        while not stop.wait(self._scenario.args.track_interval):
+            self.poll(backend, rpc)
+        # the steps of the last blocks
+        self.poll(backend, rpc)
+
+    def poll(self, backend, rpc):
+        start = time.monotonic()
+        with self._lock:
+            contracts = list(self._contracts.values())
+        ok = True
+        try:
+            tip = rpc.getblockcount()
+            with ChainParams(self._scenario.args.network):
+                for contract in contracts:
+                    while self.find_next_step(contract, backend, rpc, tip):
+                        pass
+        except (JSONRPCError, ChainBackendError, DataLookupError) as e:
+            print(f"tracker: {e}", file=sys.stderr)
+            ok = False
+        self._scenario.stats.record(
+            "tracker poll", time.monotonic() - start, ok
+        )
+
+    def find_next_step(self, contract, backend, rpc, tip):
+        """Returns True if the step after the last one was found"""
+        if contract.outputs is None:
+            blockhash = rpc.getblockhash(contract.block_height)
+            tx = rpc.getrawtransaction(contract.txid, True, blockhash)
+            contract.outputs = [
+                n for n, txout in enumerate(tx["vout"])
+                if txout["scriptPubKey"]["hex"]
+            ]
+        for n in contract.outputs:
+            if n in contract.checked:
+                continue
+            outspend = backend.get_outspend(contract.txid, n)
+            if not outspend.spent:
+                continue
+            if outspend.vin is not None and \
+                    outspend.vin != CONTRACT_COLLATERAL_INP_INDEX:
+                contract.checked.add(n)
+                continue
+            from_block = contract.block_height
+            to_block = tip
+            if outspend.block_height is not None:
+                from_block = to_block = outspend.block_height
+            spender = track_tx_by_prevouts(
+                contract.txid,
+                rpc,
+                prev_txout_index=n,
+                from_block=from_block,
+                to_block=to_block
+            )
+            if not spender:
+                # spent in a block after `tip`
+                continue
+            contract.checked.add(n)
+            if len(spender.vin) <= CONTRACT_COLLATERAL_INP_INDEX:
+                continue
+            prevout = spender.vin[CONTRACT_COLLATERAL_INP_INDEX].prevout
+            if b2lx(prevout.hash) != contract.txid or prevout.n != n:
+                continue
+
+            found = time.monotonic()
+            with self._lock:
+                self.steps += 1
+                mined_at = self._mined_at.get(spender.block_num)
+            if mined_at is not None:
+                self._scenario.stats.record(
+                    "tracker detection", found - mined_at, True
+                )
+            contract.txid = b2lx(spender.GetTxid())
+            contract.block_height = spender.block_num
+            contract.outputs = None
+            contract.checked = set()
+            return True
+        return False
+
+
+class Scenario:
+    def __init__(self, args):
+        self.args = args
+        self.stats = Stats()
+        self.tracker = Tracker(self)
+        self._local = threading.local()
+        self.assetlabels = self.rpc("creditor").dumpassetlabels()
+        self.principal_asset = self.asset(args.principal_asset)
+        self.collateral_asset = self.asset(args.collateral_asset)
+        self.workdir = pathlib.Path(args.workdir).absolute()
+        self.workdir.mkdir(parents=True, exist_ok=True)
+        self._stop_mining = threading.Event()
+
+    def rpc(self, role):
+        """RPCCaller is not thread-safe, every thread gets its own"""
+        if not hasattr(self._local, role):
+            conf = (
+                self.args.creditor_conf if role == "creditor"
+                else self.args.debtor_conf
+            )
+            setattr(self._local, role, RPCCaller(conf_file=conf))
+        return getattr(self._local, role)
+
+    def asset(self, label):
+        asset = self.assetlabels.get(label)
+        if asset is None:
+            raise RuntimeError(
+                f"Asset label {label} is not known to the creditor's node,"
+                f" the labels are: {', '.join(self.assetlabels)}"
+            )
+        return asset
+
+    def cli(self, role, command, *args):
+        conf = (
+            self.args.creditor_conf if role == "creditor"
+            else self.args.debtor_conf
+        )
+        cmd = [
+            str(pathlib.Path(self.args.cli_dir) / f"{role}_cli.py"),
+            command,
+            "-r",
+            conf,
+            *[str(arg) for arg in args],
+            "--network",
+            self.args.network,
+        ]
+        start = time.monotonic()
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        ok = result.returncode == 0
+        self.stats.record(
+            f"{role} {command}", time.monotonic() - start, ok
+        )
+        if not ok:
+            raise RuntimeError(f"{' '.join(cmd)}: {result.stderr.strip()}")
+        return result.stdout
+
+    def retry(self, func, *args, timeout=None):
+        deadline = time.monotonic() + (timeout or self.args.max_wait)
+        while True:
+            try:
+                return func(*args)
+            except (RuntimeError, JSONRPCError):
+                if time.monotonic() > deadline:
+                    raise
+            time.sleep(self.args.mine_interval)
+
+    def mine(self):
+        rpc = self.rpc("creditor")
+        addr = rpc.getnewaddress()
+        while not self._stop_mining.wait(self.args.mine_interval):
+            rpc.generatetoaddress(1, addr)
+            self.tracker.mined(rpc.getblockcount())
+
+    def make_plan(self, name, rng):
+        total_periods = rng.randint(2, self.args.max_periods)
+        num_lates = rng.randint(1, 3)
+        plan = self.workdir / f"{name}.plan"
+        self.cli(
+            "creditor", "make",
+            "--principal-asset", self.principal_asset,
+            "--principal-amount", rng.randint(10_000, 100_000),
+            "--collateral-asset", self.collateral_asset,
+            "--collateral-amount", rng.randint(1_000, 10_000),
+            "--collateral-amount-unconditionally-forfeited", 1,
+            "--total-steps", total_periods + num_lates,
+            "--total-periods", total_periods,
+            "--rate-due", "2.0",
+            "--rate-early", "0.1",
+            "--num-blocks-in-period", self.args.num_blocks_in_period,
+            "--rates-late", ",".join(["5.5"] * num_lates),
+            "--rate-collateral-penalty", "1.0",
+            "--output-plan", plan,
+            "--output-info", plan.with_suffix(".cinfo"),
+        )
+        return plan
+
+    def setup_contract(self, plan):
+        self.cli(
+            "debtor", "accept", "--plan", plan,
+            "-o", plan.with_suffix(".dinfo"),
+        )
+        self.cli(
+            "facilitator", "make",
+            "--plan", plan,
+            "-l", plan.with_suffix(".cinfo"),
+            "-c", plan.with_suffix(".dinfo"),
+            "--output-creditor", plan.with_suffix(".cdata"),
+            "--output-debtor", plan.with_suffix(".ddata"),
+            "--output-tx", plan.with_suffix(".tx"),
+            "--contract-start-delay", 1,
+        )
+        self.cli(
+            "creditor", "sign", "--plan", plan,
+            "--data", plan.with_suffix(".cdata"),
+            "-o", plan.with_suffix(".csignature"),
+        )
+        self.cli(
+            "debtor", "sign", "--plan", plan,
+            "--data", plan.with_suffix(".ddata"),
+            "-o", plan.with_suffix(".dsignature"),
+        )
+        self.cli(
+            "facilitator", "sign",
+            "--tx", plan.with_suffix(".tx"),
+            "-c", plan.with_suffix(".csignature"),
+            "-d", plan.with_suffix(".dsignature"),
+            "-o", plan.with_suffix(".stx"),
+        )
+        with open(plan.with_suffix(".stx")) as f:
+            signed_tx = f.read().strip()
+
+        def send():
+            start = time.monotonic()
+            try:
+                txid = self.rpc("debtor").sendrawtransaction(signed_tx)
+            except JSONRPCError:
+                self.stats.record(
+                    "sendrawtransaction", time.monotonic() - start, False
+                )
+                raise
+            self.stats.record(
+                "sendrawtransaction", time.monotonic() - start, True
+            )
+            return txid
+
+        def wait_confirmed(txid):
+            # the fee input is from the debtor's wallet
+            tx = self.rpc("debtor").gettransaction(txid)
+            if tx["confirmations"] < 1:
+                raise RuntimeError(f"{txid} is not confirmed")
+            return tx
+
+        sent = time.monotonic()
+        tx = self.retry(wait_confirmed, self.retry(send))
+        self.stats.record("confirmation", time.monotonic() - sent, True)
+        return tx["txid"], tx["blockhash"]
+
+    def run_lifecycle(self, plan, rng):
+        """
+        The contract is followed through the stages of the plan: the debt is
+        repaid with the payment of the last lateral stage, and the revoke on
+        the last vertical stage grabs the collateral, only after these the
+        Debtor can get the rest of the collateral back
+        """
+        repayment_plan = plan_cache.get(plan).to_repayment_plan()
+        vstage = repayment_plan.first_lateral_stage.vertical_stages[0]
+        data = ("--plan", plan, "--data")
+        creditor_data = (*data, plan.with_suffix(".cdata"), "--force")
+        debtor_data = (*data, plan.with_suffix(".ddata"), "--force")
+
+        while True:
+            choice = rng.random()
+            if choice < self.args.p_early:
+                self.retry(
+                    self.cli, "debtor", "paydebt", *debtor_data, "--full"
+                )
+                self.retry(self.cli, "creditor", "getpayment", *creditor_data)
+                return "early"
+            if choice < self.args.p_early + self.args.p_pay:
+                try:
+                    self.cli("debtor", "paydebt", *debtor_data)
+                except RuntimeError:
+                    # the window was missed
+                    pass
+                else:
+                    self.retry(
+                        self.cli, "creditor", "getpayment", *creditor_data
+                    )
+                    if vstage.next_lateral_stage is None:
+                        return "repaid"
+                    vstage = vstage.next_lateral_stage.vertical_stages[0]
+                    continue
+            # debtor is late, the creditor revokes the window after timeout
+            self.retry(self.cli, "creditor", "revokewindow", *creditor_data)
+            lstage = vstage.parent_lateral_stage
+            if vstage.index_m + 1 < len(lstage.vertical_stages):
+                vstage = lstage.vertical_stages[vstage.index_m + 1]
+                continue
+            # on the last vertical stage the revoke grabs the collateral
+            self.retry(self.cli, "debtor", "getcollaterall", *debtor_data)
+            return "default"
+
+    def run_contract(self, num):
+        name = f"scenario_{num}"
+        rng = random.Random(
+            None if self.args.seed is None else f"{self.args.seed}-{num}"
+        )
+        start = time.monotonic()
+        try:
+            plan = self.make_plan(name, rng)
+            txid, blockhash = self.setup_contract(plan)
+            block_height = self.rpc("debtor").getblockheader(blockhash)[
+                "height"
+            ]
+            self.tracker.follow(name, txid, block_height)
+            self.stats.record("setup", time.monotonic() - start, True)
+            outcome = self.run_lifecycle(plan, rng)
+        except (RuntimeError, JSONRPCError) as e:
+            print(f"{name}: {e}", file=sys.stderr)
+            outcome = "failed"
+        self.stats.record(
+            "lifecycle", time.monotonic() - start, outcome != "failed"
+        )
+        self.stats.add_outcome(outcome)
+
+    def run(self):
+        miner = threading.Thread(target=self.mine, daemon=True)
+        miner.start()
+        tracker = threading.Thread(
+            target=self.tracker.run, args=(self._stop_mining,), daemon=True
+        )
+        tracker.start()
+        start = time.monotonic()
+        try:
+            with ThreadPoolExecutor(max_workers=self.args.jobs) as executor:
+                list(executor.map(self.run_contract, range(self.args.num)))
+        finally:
+            self._stop_mining.set()
+        tracker.join()
+        elapsed = time.monotonic() - start
+        return {
+            "contracts": self.args.num,
+            "elapsed": round(elapsed, 3),
+            "contracts_per_minute": round(self.args.num * 60 / elapsed, 3),
+            "outcomes": dict(self.stats.outcomes),
+            "tracked_steps": self.tracker.steps,
+            "tracked_steps_per_second": round(self.tracker.steps / elapsed, 3),
+            "commands": self.stats.summary(),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--num", type=int, default=10,
+                        help="number of contracts")
+    parser.add_argument("-j", "--jobs", type=int, default=4,
+                        help="number of contracts run concurrently")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--workdir", default=str(APP_PATH / "scenario"))
+    parser.add_argument("--cli-dir", default=str(APP_PATH / "cli"))
+    parser.add_argument("--network", default="elements")
+    parser.add_argument("--creditor-conf",
+                        default="/root/elementsdir1/elements.conf")
+    parser.add_argument("--debtor-conf",
+                        default="/root/elementsdir2/elements.conf")
+    parser.add_argument("--principal-asset", default="USD")
+    parser.add_argument("--collateral-asset", default="GOLD")
+    parser.add_argument("--max-periods", type=int, default=4)
+    parser.add_argument("--num-blocks-in-period", type=int, default=5)
+    parser.add_argument("--mine-interval", type=float, default=2.0,
+                        help="seconds between the mined blocks")
+    parser.add_argument("--track-interval", type=float, default=1.0,
+                        help="seconds between the tracker polls")
+    parser.add_argument("--chain-backend", choices=("rpc", "esplora"),
+                        default="rpc",
+                        help="how the tracker finds the spent outputs")
+    parser.add_argument("--esplora-api", default=f"{link_to_esplora}/api")
+    parser.add_argument("--max-wait", type=float, default=300.0,
+                        help="seconds to wait for the action to be possible")
+    parser.add_argument("--p-pay", type=float, default=0.6,
+                        help="probability of regular payment in the period")
+    parser.add_argument("--p-early", type=float, default=0.1,
+                        help="probability of early repayment in the period")
+    parser.add_argument("-o", "--output", default=None,
+                        help="file for the JSON summary")
+    args = parser.parse_args()
+
+    try:
+        scenario = Scenario(args)
+    except (RuntimeError, JSONRPCError) as e:
+        sys.exit(f"{e}")
+    summary = scenario.run()
+    summary_json = json.dumps(summary, indent=4)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(summary_json)
+    print(summary_json)
+
+
+if __name__ == "__main__":
+    main()
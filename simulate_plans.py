@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2020-2021 Rugged Bytes IT-Services GmbH
+# Distributed under the MIT software license, see the accompanying
+# file COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+"""
+Simulates the repayment paths of the plans: in every period the Debtor
+pays, pays the whole debt early or is late with the given probabilities.
+Prints the share of the outcomes, the distribution of the yield of the
+Creditor and of the collateral the Debtor loses for every plan.
+"""
+
+import argparse
+import json
+import os
+import pathlib
+import sys
+
+from common.portfolio import flat_plan_cache
+from common.simulation import OUTCOMES, format_result, mean, simulate_plans
+
+
+def probabilities(value):
+    """Comma separated probabilities for the periods from the first"""
+    try:
+        result = [float(p) for p in value.split(",")]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a probability list: {value}")
+    if any(p < 0 or p > 1 for p in result):
+        raise argparse.ArgumentTypeError(f"not a probability list: {value}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("plans", nargs="+",
+                        help=".plan files or directories with them")
+    parser.add_argument("-n", "--paths", type=int, default=1000000,
+                        help="number of paths per plan")
+    parser.add_argument("--pay", type=probabilities, default=[0.9],
+                        help="probability of the regular payment in each "
+                        "period, the last one is used for the rest")
+    parser.add_argument("--early", type=probabilities, default=[0.02],
+                        help="probability of the early full payment in "
+                        "each period")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="number of simulating processes")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", default=None,
+                        help="write the results to the file as JSON")
+    args = parser.parse_args()
+
+    plan_files = []
+    for name in args.plans:
+        path = pathlib.Path(name)
+        if path.is_dir():
+            plan_files.extend(sorted(path.glob("*.plan")))
+        else:
+            plan_files.append(path)
+    if not plan_files:
+        parser.error("no plans")
+    for pay, early in zip(args.pay, args.early):
+        if pay + early > 1:
+            parser.error("the payment probabilities add up to more than 1")
+
+    flats = [flat_plan_cache.get(plan_file) for plan_file in plan_files]
+    results = simulate_plans(
+        flats, args.paths, args.pay, args.early, args.jobs, args.seed
+    )
+    summary = []
+    for plan_file, flat, result in zip(plan_files, flats, results):
+        print(f"{plan_file.name}:")
+        for line in format_result(result):
+            print(f"  {line}")
+        summary.append({
+            "plan": str(plan_file),
+            "paths": result.num_paths,
+            "outcomes": {o: float(result.outcomes[o]) for o in OUTCOMES},
+            "mean_periods": float(result.mean_periods),
+            "creditor_yield": {
+                "values": result.creditor_yield.values.tolist(),
+                "probabilities":
+                    result.creditor_yield.probabilities.tolist(),
+            },
+            "collateral_loss": {
+                "values": result.collateral_loss.values.tolist(),
+                "probabilities":
+                    result.collateral_loss.probabilities.tolist(),
+            },
+        })
+
+    if len(results) > 1:
+        principal = sum(flat.principal_amount for flat in flats)
+        expected = sum(
+            flat.principal_amount * mean(result.creditor_yield)
+            for flat, result in zip(flats, results)
+        )
+        defaults = sum(result.outcomes["default"] for result in results)
+        print(f"portfolio of {len(results)} plans: yield"
+              f" {expected / principal * 100:.2f} %, expected defaults"
+              f" {defaults:.2f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())